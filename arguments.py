@@ -1,16 +1,50 @@
 import argparse as ap
 import utilities as util
+from greyscott_patterns import ALL_PATTERNS
 
 
 executable_groups = {
-    "create_dataset.py": ["simulation", "batch", "output", "multiprocess"],
-    "visualize_dataset.py": ["visualize"]
+    "create_dataset.py": ["simulation", "batch", "output", "multiprocess", "recovery", "cache", "profile", "monitor"],
+    "visualize_dataset.py": ["visualize", "multiprocess"],
+    "compute_statistics.py": ["statistics", "multiprocess"],
+    "benchmark_greyscott.py": ["benchmark"]
 }
 
 
 def parse_tuple(value):
     return tuple(map(int, value.strip("()").split(",")))
 
+def parse_patterns(value):
+    patterns = [p.strip().lower() for p in value.split(",") if p.strip()]
+    unknown = [p for p in patterns if p not in ALL_PATTERNS]
+    if not patterns or unknown:
+        raise ap.ArgumentTypeError(f"invalid patterns '{value}'; choose from {','.join(ALL_PATTERNS)}")
+    return patterns
+
+def parse_levels(value):
+    levels = sorted(set(parse_tuple(value)))
+    if not levels or any(level < 2 or level & (level - 1) for level in levels):
+        raise ap.ArgumentTypeError(f"invalid levels '{value}'; expected comma separated powers of 2, e.g. '2,4,8'")
+    return levels
+
+def parse_resolutions(value):
+    resolutions = sorted(set(parse_tuple(value)), reverse=True)
+    if not resolutions or any(resolution < 1 for resolution in resolutions):
+        raise ap.ArgumentTypeError(f"invalid resolutions '{value}'; expected comma separated grid lengths, e.g. '256,128,64'")
+    return resolutions
+
+def parse_int_list(value):
+    return sorted(set(parse_tuple(value)))
+
+def parse_choices(choices):
+    def parse(value):
+        selected = [v.strip().lower() for v in value.split(",") if v.strip()]
+        unknown = [v for v in selected if v not in choices]
+        if not selected or unknown:
+            raise ap.ArgumentTypeError(f"invalid values '{value}'; choose from {','.join(choices)}")
+        return selected
+    return parse
+
 def parse_save_states(s: str | None):
     if not isinstance(s, str):
         return None
@@ -110,6 +144,25 @@ def add_simulation_group(parser):
     group.add_argument('--patch-prob', dest='patch_prob', type=float, default=0.5,
         help="Probability of placing each patch (default: 0.5)")
     
+    group.add_argument('--diagnostics', dest='diagnostics', action='store_true',
+        help="Record per-iteration mean, min and max of U and V, V mass, L2 change and active fraction to 'metric' | default: false")
+
+    group.add_argument('--spectral-features', dest='spectral_features', action='store_true',
+        help="Add the radial power spectrum, dominant wavelength, spot count and anisotropy of the final V to 'metric' | default: false")
+
+    group.add_argument('--health-check-every', dest='health_check_every', type=int, default=None,
+        help="Iterations between checks that stop runs early once they diverge (NaN/Inf) or die out (V ≈ 0) | default: None (only the final state)")
+
+    group.add_argument('--unhealthy', dest='unhealthy', type=str, default='keep', choices=['keep', 'exclude', 'resample'],
+        help="What to do with diverged or dead runs, tagged by 'status' in meta:\n"
+            "   keep           - save them as they are\n"
+            "   exclude        - leave them out of the dataset\n"
+            "   resample       - rerun the seed with new initial fields and parameters, excluded after MAX_RESAMPLES\n"
+            "default: keep")
+
+    group.add_argument('--max-resamples', dest='max_resamples', type=int, default=3,
+        help="New attempts per seed with --unhealthy resample | default: 3")
+
     # group.add_argument('--tolerance', dest='tolerance', type=float, default=1e-4,
     #                         help="Tolerance value for determining simulation convergence. | default: 1e-4")
 
@@ -128,6 +181,169 @@ def check_simulation_args(args):
     if not (1 <= args.patch_radius <= grid_radius):
         raise ap.ArgumentError(None, f"PATCH_RADIUS must be an INT inclusively between [1, {grid_radius}]")
 
+    if args.health_check_every is not None and not (1 <= args.health_check_every <= args.max_iterations):
+        raise ap.ArgumentError(None, f"HEALTH_CHECK_EVERY must be an INT between [1, MAX_ITERATIONS]")
+
+    if not (0 <= args.max_resamples <= 100):
+        raise ap.ArgumentError(None, f"MAX_RESAMPLES must be an INT between [0, 100]")
+
+
+def add_recovery_group(parser):
+    group = parser.add_argument_group("recovery options")
+    group.add_argument('--resume', dest='resume', action='store_true',
+        help="Continue an interrupted run from the worker manifests and checkpoints it left behind | default: false")
+
+    group.add_argument('--checkpoint-every', dest='checkpoint_every', type=int, default=None,
+        help="Iterations between mid-simulation checkpoints of U, V and saved states | default: None (off)")
+
+
+def check_recovery_args(args):
+    if args.checkpoint_every is not None and not (0 < args.checkpoint_every < args.max_iterations):
+        raise ap.ArgumentError(None, f"CHECKPOINT_EVERY must be an INT between [1, {args.max_iterations - 1}]")
+
+
+def add_cache_group(parser):
+    group = parser.add_argument_group("simulation cache options")
+    group.add_argument('--cache-dir', dest='cache_dir', type=str, default=None,
+        help="Folder of a simulation cache shared across runs, exact hits skip simulating and longer runs\n"
+            "continue from the furthest cached state | default: None (off)")
+
+    group.add_argument('--cache-size', dest='cache_size', type=float, default=10.0,
+        help="Size in GiB the simulation cache is trimmed to, least recently used entries first | default: 10")
+
+
+def check_cache_args(args):
+    if args.cache_dir is not None and util.os_path.exists(args.cache_dir) and not util.os_path.isdir(args.cache_dir):
+        raise ap.ArgumentError(None, f"CACHE_DIR '{args.cache_dir}' exists but is not a directory.")
+
+    if not (0 < args.cache_size <= 1e6):
+        raise ap.ArgumentError(None, f"CACHE_SIZE must be a FLOAT between (0, 1e6] GiB")
+
+
+def add_profile_group(parser):
+    group = parser.add_argument_group("profiling options")
+    group.add_argument('--profile', dest='profile', action='store_true',
+        help="Time each phase per worker and write throughput and phase shares to profile_*.json\n"
+            "next to the global statistics | default: false")
+
+    group.add_argument('--profile-dump', dest='profile_dump', action='store_true',
+        help="Also write a cProfile dump per worker to the output folder, requires --profile | default: false")
+
+
+def check_profile_args(args):
+    if args.profile_dump and not args.profile:
+        raise ap.ArgumentError(None, "PROFILE_DUMP requires --profile")
+
+
+def add_monitor_group(parser):
+    group = parser.add_argument_group("progress monitoring options")
+    group.add_argument('--progress-every', dest='progress_every', type=float, default=60.0,
+        help="Seconds between progress reports with the aggregate rate and ETA of all tasks, 0 turns them off | default: 60")
+
+    group.add_argument('--status-file', dest='status_file', type=str, default=None,
+        help="JSON file rewritten atomically with every progress report, for local monitoring to poll | default: None (off)")
+
+
+def check_monitor_args(args):
+    if not (0 <= args.progress_every <= 86400):
+        raise ap.ArgumentError(None, f"PROGRESS_EVERY must be a FLOAT between [0, 86400] seconds")
+
+    if args.status_file is not None:
+        status_folder = util.os_path.dirname(util.os_path.abspath(args.status_file))
+        if not util.os_path.isdir(status_folder):
+            raise ap.ArgumentError(None, f"STATUS_FILE folder '{status_folder}' does not exist.")
+
+
+def add_benchmark_group(parser):
+    group = parser.add_argument_group("benchmark options")
+    group.add_argument('--levels', dest='levels', type=parse_choices(["micro", "io", "e2e"]), default=["micro", "io", "e2e"],
+        help="Comma separated benchmark levels: 'micro' solver steps, 'io' HDF5 save/read/combine, 'e2e' create_dataset runs | default: all")
+
+    group.add_argument('--repeats', dest='repeats', type=int, default=5,
+        help="Timings per benchmark, the best is compared | default: 5")
+
+    group.add_argument('--grid-lengths', dest='grid_lengths', type=parse_int_list, default=[64, 128, 256, 512],
+        help="Comma separated grid lengths of the micro benchmarks | default: 64,128,256,512")
+
+    group.add_argument('--batch-sizes', dest='batch_sizes', type=parse_int_list, default=[1, 8],
+        help="Comma separated numbers of fields stepped per timing in the micro benchmarks | default: 1,8")
+
+    group.add_argument('--dtypes', dest='dtypes', type=parse_choices(["float32", "float64"]), default=["float32", "float64"],
+        help="Comma separated field dtypes of the micro benchmarks | default: float32,float64")
+
+    group.add_argument('--record-counts', dest='record_counts', type=parse_int_list, default=[8, 32],
+        help="Comma separated records per file of the I/O benchmarks | default: 8,32")
+
+    group.add_argument('--layouts', dest='layouts', type=parse_choices(util.FRAME_ENCODINGS), default=list(util.FRAME_ENCODINGS),
+        help=f"Comma separated frame encodings of the I/O benchmarks | default: {','.join(util.FRAME_ENCODINGS)}")
+
+    group.add_argument('--e2e-tasks', dest='e2e_tasks', type=parse_int_list, default=[1, 2],
+        help="Comma separated --ntasks values of the end-to-end benchmarks | default: 1,2")
+
+    group.add_argument('--e2e-seed-steps', dest='e2e_seed_steps', type=parse_int_list, default=[1, 4],
+        help="Comma separated --seed-step values of the end-to-end benchmarks | default: 1,4")
+
+    group.add_argument('--output-file', dest='output_file', type=str, default=None,
+        help="JSON file the results are written to | default: benchmark_<timestamp>.json")
+
+    group.add_argument('--baseline', dest='baseline_file', type=str, default=None,
+        help="Results JSON to compare against, regressions make the run fail | default: None (no comparison)")
+
+    group.add_argument('--results', dest='results_file', type=str, default=None,
+        help="Compare this results JSON with --baseline instead of running the benchmarks | default: None")
+
+    group.add_argument('--threshold', dest='threshold', type=float, default=0.10,
+        help="Relative slowdown of the best time that counts as a regression | default: 0.10")
+
+
+def check_benchmark_args(args):
+    if not (1 <= args.repeats <= 1000):
+        raise ap.ArgumentError(None, f"REPEATS must be an INT between [1, 1000]")
+
+    if any(length < 4 for length in args.grid_lengths) or any(size < 1 for size in args.batch_sizes):
+        raise ap.ArgumentError(None, f"GRID_LENGTHS must be >= 4 and BATCH_SIZES >= 1")
+
+    if any(count < 1 for count in args.record_counts) or any(step < 1 for step in args.e2e_seed_steps):
+        raise ap.ArgumentError(None, f"RECORD_COUNTS and E2E_SEED_STEPS must be >= 1")
+
+    running_e2e = "e2e" in args.levels and args.results_file is None
+    if running_e2e and any(not (1 <= tasks <= util.cpu_count()) for tasks in args.e2e_tasks):
+        raise ap.ArgumentError(None, f"E2E_TASKS must be INTs between [1, {util.cpu_count()}]")
+
+    for name, file_path in [("BASELINE", args.baseline_file), ("RESULTS", args.results_file)]:
+        if file_path is not None and not util.os_path.isfile(file_path):
+            raise ap.ArgumentError(None, f"{name} '{file_path}' does not exist.")
+
+    if args.results_file is not None and args.baseline_file is None:
+        raise ap.ArgumentError(None, "RESULTS requires --baseline to compare with")
+
+    if not (0 < args.threshold < 10):
+        raise ap.ArgumentError(None, f"THRESHOLD must be a FLOAT between (0, 10)")
+
+
+def add_statistics_group(parser):
+    group = parser.add_argument_group('statistics options')
+
+    group.add_argument('--data-file', dest='data_file', type=str, required=True,
+        help="Path to the input HDF5 dataset to compute global statistics for")
+
+    group.add_argument('--chunk-size', dest='chunk_size', type=int, default=100,
+        help="Number of records read and reduced at a time per task | default: 100")
+
+    group.add_argument('--histogram-bins', dest='histogram_bins', type=int, default=0,
+        help="Fixed bins over [0, 1] for image histograms and approximate percentiles | default: 0 (off)")
+
+
+def check_statistics_args(args):
+    if not util.os_path.exists(args.data_file):
+        raise FileNotFoundError(f"data_file '{args.data_file}' does not exist")
+
+    if not (1 <= args.chunk_size <= 1e6):
+        raise ap.ArgumentError(None, f"CHUNK_SIZE must be an INT between [1, 1e6]")
+
+    if not (0 <= args.histogram_bins <= 65536):
+        raise ap.ArgumentError(None, f"HISTOGRAM_BINS must be an INT between [0, 65536]")
+
 
 def add_visualize_group(parser):
     group = parser.add_argument_group('visualization options')
@@ -140,6 +356,12 @@ def add_visualize_group(parser):
     
     group.add_argument('--num-samples', dest='num_samples', type=int, default=5,
                             help="Number simulation samples to visualize | default: 1")
+
+    group.add_argument('--patterns', dest='patterns', type=parse_patterns, default=None,
+        help="Only sample records of these comma separated patterns, e.g. 'worms,spots' | default: all")
+
+    group.add_argument('--seed-range', dest='seed_range', type=parse_tuple, default=None,
+        help="Only sample records with a random seed in the inclusive range, e.g. '1000,2000' | default: all")
     
     group.add_argument('--output-folder', dest='output_folder', type=str, required=True,
         help="Directory where visualizations will be written (created if needed)")
@@ -153,9 +375,36 @@ def add_visualize_group(parser):
     group.add_argument('--gif-cmap', dest='gif_cmap', type=str, default='turbo',
         help="Colormap for gif plots (perceptually uniform preferred)  | default: 'turbo'")
 
+    group.add_argument('--gif-renderer', dest='gif_renderer', type=str, default='fast', choices=['fast', 'matplotlib'],
+        help="Renderer for gifs, 'fast' writes colormapped frames with Pillow, 'matplotlib' for publication quality | default: 'fast'")
+
     group.add_argument('--image-cmap', dest='image_cmap', type=str, default='RdYlBu',
         help="Colormap for static image plots (diverging preferred) | default: 'RdYlBu'")
 
+    group.add_argument('--level', dest='level', type=int, default=1,
+        help="Read the thumbnails of this downsampling level written with --thumbnail-levels | default: 1 (full resolution)")
+
+    group.add_argument('--resolution', dest='resolution', type=int, default=None,
+        help="Read the images coarsened to this grid length written with --output-resolutions | default: None (full resolution)")
+
+    group.add_argument('--montage', dest='montage', action='store_true',
+        help="Tile one image of every selected record into contact sheets instead of sampling records | default: False")
+
+    group.add_argument('--montage-key', dest='montage_key', type=str, default='v_state_final',
+        help="Image key tiled in the contact sheets, e.g. 'v_state_final', 'u_state_100' | default: 'v_state_final'")
+
+    group.add_argument('--montage-columns', dest='montage_columns', type=int, default=16,
+        help="Number of tiles per contact sheet row | default: 16")
+
+    group.add_argument('--montage-tiles', dest='montage_tiles', type=int, default=256,
+        help="Number of records read and tiled per contact sheet | default: 256")
+
+    group.add_argument('--montage-tile-size', dest='montage_tile_size', type=int, default=96,
+        help="Minimum side length of each tile in pixels | default: 96")
+
+    group.add_argument('--montage-label', dest='montage_label', type=str, default='pattern', choices=['pattern', 'seed', 'none'],
+        help="Annotate each tile with its pattern name, random seed or nothing | default: 'pattern'")
+
 
 def check_visualize_args(args):
 
@@ -167,6 +416,12 @@ def check_visualize_args(args):
     
     if not (1 <= args.random_seed <= 1e9):
         raise ap.ArgumentError(None, f"RANDOM_SEED must an INT between [1, 1e9]")
+
+    if args.seed_range is not None and (len(args.seed_range) != 2 or args.seed_range[0] > args.seed_range[1]):
+        raise ap.ArgumentError(None, f"SEED_RANGE must be two INTs 'MIN,MAX' with MIN <= MAX")
+
+    if args.level < 1 or args.level & (args.level - 1):
+        raise ap.ArgumentError(None, f"LEVEL must be 1 or a power of 2 written with --thumbnail-levels")
     
     if util.os_path.exists(args.output_folder) and not util.os_path.isdir(args.output_folder):
         raise ap.ArgumentError(None, f"OUTPUT_FOLDER '{args.output_folder}' exists but is not a directory.")
@@ -177,19 +432,29 @@ def check_visualize_args(args):
     if not (0 < args.gif_delay <= 60):
         raise ap.ArgumentError(None, f"GIF_DELAY must be an INT between [0, 60].")
     
-    mpl_colormaps = ','.join(util.plt.colormaps())
+    plt, _ = util.import_matplotlib()
+    mpl_colormaps = ','.join(plt.colormaps())
     if not isinstance(args.gif_cmap, str) or args.gif_cmap.strip() == "":
         raise ap.ArgumentError(None, "GIF_CMAP must be a matplotlib colormap string (e.g. 'turbo', 'inferno', 'viridis', etc.).")
     
-    elif args.gif_cmap not in util.plt.colormaps():
+    elif args.gif_cmap not in plt.colormaps():
         raise ap.ArgumentError(None, f"Invalid matplotlib colormap '{args.gif_cmap}'. Colormaps: {mpl_colormaps}") 
     
     if not isinstance(args.image_cmap, str) or args.image_cmap.strip() == "":
         raise ap.ArgumentError(None, "IMAGE_CMAP must be a matplotlib colormap string (e.g. 'seismic', 'RdYlBu', 'Spectral', etc.).")
     
-    elif args.image_cmap not in util.plt.colormaps():
+    elif args.image_cmap not in plt.colormaps():
         raise ap.ArgumentError(None, f"Invalid matplotlib colormap '{args.image_cmap}'. Colormaps: {mpl_colormaps}") 
 
+    if not (1 <= args.montage_columns <= args.montage_tiles):
+        raise ap.ArgumentError(None, f"MONTAGE_COLUMNS must be an INT between [1, MONTAGE_TILES].")
+
+    if not (1 <= args.montage_tiles <= 1e5):
+        raise ap.ArgumentError(None, f"MONTAGE_TILES must be an INT between [1, 1e5].")
+
+    if not (8 <= args.montage_tile_size <= 1024):
+        raise ap.ArgumentError(None, f"MONTAGE_TILE_SIZE must be an INT between [8, 1024].")
+
 
 
 def add_output_group(parser):
@@ -215,6 +480,39 @@ def add_output_group(parser):
             )
     )
 
+    group.add_argument('--histogram-bins', dest='histogram_bins', type=int, default=0,
+        help="Fixed bins over [0, 1] for image histograms and approximate percentiles in the global statistics | default: 0 (off)")
+
+    group.add_argument('--normalize', dest='normalize', type=str, default=None, choices=util.NORMALIZATION_MODES,
+        help="Also write a normalized copy of each image to 'image_normalized' with the global statistics of its key:\n"
+            "   minmax         - scaled to [0, 1] with the global min and max\n"
+            "   standard       - standardized with the global mean and std\n"
+            "default: None (off)")
+
+    group.add_argument('--thumbnail-levels', dest='thumbnail_levels', type=parse_levels, default=None,
+        help="Also write block mean downsampled images to 'image_thumbnail_<L>x' for each comma separated level, e.g. '2,4,8' | default: None (off)")
+
+    group.add_argument('--output-resolutions', dest='output_resolutions', type=parse_resolutions, default=None,
+        help="Simulate once at GRID_LENGTH and also write every state coarsened to each comma separated resolution\n"
+            "to 'image_<R>x<R>', e.g. '128,64' with --grid-length 256 | default: None (off)")
+
+    group.add_argument('--replay-every', dest='replay_every', type=int, default=None,
+        help="Also store U and V every REPLAY_EVERY iterations to 'replay', any step in between is re-simulated on read\n"
+            "with dataset_readers.ReplayStore, use with sparse --save-states, e.g. 'none' | default: None (off)")
+
+    group.add_argument('--frame-encoding', dest='frame_encoding', type=str, default='float32', choices=util.FRAME_ENCODINGS,
+        help="Storage of the intermediate states saved with --save-states:\n"
+            "   float32        - one float32 dataset per state\n"
+            "   delta16        - float32 keyframes and int16 quantized deltas to the previous state in 'image_encoded',\n"
+            "                    compressed one frame per chunk and decoded transparently by the readers\n"
+            "default: float32")
+
+    group.add_argument('--keyframe-every', dest='keyframe_every', type=int, default=util.DEFAULT_KEYFRAME_EVERY,
+        help=f"Intermediate states per keyframe with --frame-encoding delta16 | default: {util.DEFAULT_KEYFRAME_EVERY}")
+
+    group.add_argument('--extend', dest='extend', action='store_true',
+        help="Append only the seeds in [MIN_SEED, MAX_SEED] missing from the existing dataset in OUTPUT_FOLDER | default: false")
+
 
 def check_output_args(args, filename):
     if hasattr(args, 'output_path') and not util.os_path.exists(args.output_path):
@@ -226,6 +524,21 @@ def check_output_args(args, filename):
     if filename == 'create_dataset.py' and args.output_folder is None:
         raise ap.ArgumentError(None, f"OUTPUT_FOLDER '{args.output_folder}' is required for new dataset creation")
 
+    if hasattr(args, 'histogram_bins') and not (0 <= args.histogram_bins <= 65536):
+        raise ap.ArgumentError(None, f"HISTOGRAM_BINS must be an INT between [0, 65536]")
+
+    if getattr(args, 'thumbnail_levels', None) and any(args.grid_length % level for level in args.thumbnail_levels):
+        raise ap.ArgumentError(None, f"GRID_LENGTH {args.grid_length} must be divisible by every THUMBNAIL_LEVELS {args.thumbnail_levels}")
+
+    if hasattr(args, 'keyframe_every') and not (1 <= args.keyframe_every <= 4096):
+        raise ap.ArgumentError(None, f"KEYFRAME_EVERY must be an INT between [1, 4096]")
+
+    if getattr(args, 'replay_every', None) is not None and not (0 < args.replay_every < args.max_iterations):
+        raise ap.ArgumentError(None, f"REPLAY_EVERY must be an INT between [1, {args.max_iterations - 1}]")
+
+    if getattr(args, 'output_resolutions', None) and any(args.grid_length % resolution for resolution in args.output_resolutions):
+        raise ap.ArgumentError(None, f"Every OUTPUT_RESOLUTIONS {args.output_resolutions} must divide GRID_LENGTH {args.grid_length}")
+
 
 
 def check_args(parser, file_name):
@@ -237,6 +550,18 @@ def check_args(parser, file_name):
         check_batch_args(args)
     if "simulation" in executable_groups[file_name]:
         check_simulation_args(args)
+    if "recovery" in executable_groups[file_name]:
+        check_recovery_args(args)
+    if "cache" in executable_groups[file_name]:
+        check_cache_args(args)
+    if "profile" in executable_groups[file_name]:
+        check_profile_args(args)
+    if "monitor" in executable_groups[file_name]:
+        check_monitor_args(args)
+    if "benchmark" in executable_groups[file_name]:
+        check_benchmark_args(args)
+    if "statistics" in executable_groups[file_name]:
+        check_statistics_args(args)
     if "visualize" in executable_groups[file_name]:
         check_visualize_args(args)
     if "output" in executable_groups[file_name]:
@@ -256,6 +581,18 @@ def process_args(exe_file):
         add_batch_group(parser)
     if "simulation" in executable_groups[file_name]:
         add_simulation_group(parser)
+    if "recovery" in executable_groups[file_name]:
+        add_recovery_group(parser)
+    if "cache" in executable_groups[file_name]:
+        add_cache_group(parser)
+    if "profile" in executable_groups[file_name]:
+        add_profile_group(parser)
+    if "monitor" in executable_groups[file_name]:
+        add_monitor_group(parser)
+    if "benchmark" in executable_groups[file_name]:
+        add_benchmark_group(parser)
+    if "statistics" in executable_groups[file_name]:
+        add_statistics_group(parser)
     if "visualize" in executable_groups[file_name]:
         add_visualize_group(parser)
     if "output" in executable_groups[file_name]:
@@ -0,0 +1,321 @@
+from setup_logger import setup_logger, set_logger_level
+logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
+from arguments import process_args
+from utilities import *
+from greyscott_solvers import compute_laplacian, update_gray_scott
+from greyscott_patterns import GREY_SCOTT_PATTERNS
+from greyscott_simulation import run_grayscott_simulation
+from argparse import Namespace
+from datetime import datetime
+from platform import platform, python_version
+from shutil import copyfile
+from statistics import median
+from sys import exit
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable
+
+###############################################################################
+# Timing
+###############################################################################
+
+BENCHMARK_LEVELS = ["micro", "io", "e2e"]
+DEFAULT_THRESHOLD = 0.10
+
+def time_call(fn: Callable[[], Any], repeats: int = 5, number: int = 1, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """Time fn repeats times, each timing covers number calls after an optional untimed setup
+
+    Args:
+        fn (Callable[[], Any]): function to time
+        repeats (int, optional): number of timings. Defaults to 5.
+        number (int, optional): calls per timing. Defaults to 1.
+        setup (Optional[Callable[[], Any]], optional): called before each timing, e.g. to recreate inputs. Defaults to None.
+
+    Returns:
+        Dict[str, float]: 'best' and 'median' seconds per call and the number of 'repeats'
+    """
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((perf_counter() - start) / number)
+    return {'best': min(timings), 'median': median(timings), 'repeats': repeats}
+
+
+def machine_info() -> Dict[str, Any]:
+    """Return the interpreter, library versions and CPU count the results were measured with"""
+    return {
+        'platform': platform(),
+        'python': python_version(),
+        'numpy': np.__version__,
+        'h5py': h5py.__version__,
+        'cpu_count': cpu_count()
+    }
+
+###############################################################################
+# Micro benchmarks
+###############################################################################
+
+def benchmark_solver(
+    grid_lengths: List[int],
+    batch_sizes: List[int],
+    dtypes: List[str],
+    repeats: int = 5,
+    steps: int = 20
+) -> Dict[str, Dict[str, float]]:
+    """Time compute_laplacian and update_gray_scott per step for every grid length, batch size and dtype
+
+    The solver steps one field at a time, so a batch is stepped field by field like a worker does;
+    the float dtypes take the place of backends as numpy is the only one.
+
+    Args:
+        grid_lengths (List[int]): grid lengths in pixels
+        batch_sizes (List[int]): number of fields stepped per timing
+        dtypes (List[str]): field dtypes, e.g. 'float32' and 'float64'
+        repeats (int, optional): timings per case. Defaults to 5.
+        steps (int, optional): steps per timing. Defaults to 20.
+
+    Returns:
+        Dict[str, Dict[str, float]]: timings by benchmark name, with cell updates per second
+    """
+    params = next(iter(GREY_SCOTT_PATTERNS.values()))
+    rng = np.random.default_rng(0)
+    results = {}
+    for grid_length in grid_lengths:
+        for batch_size in batch_sizes:
+            for dtype in dtypes:
+                fields = [(rng.random((grid_length, grid_length)).astype(dtype),
+                           (0.25 * rng.random((grid_length, grid_length))).astype(dtype)) for _ in range(batch_size)]
+                cells = batch_size * grid_length * grid_length
+                case = f"grid={grid_length}/batch={batch_size}/dtype={dtype}"
+
+                def laplacian():
+                    for u, _ in fields:
+                        compute_laplacian(u)
+
+                def step():
+                    for u, v in fields:
+                        update_gray_scott(u, v, **params)
+
+                for name, fn in [("compute_laplacian", laplacian), ("update_gray_scott", step)]:
+                    timing = time_call(fn, repeats, steps)
+                    timing['cell_updates_per_second'] = cells / timing['best']
+                    results[f"micro/{name}/{case}"] = timing
+    return results
+
+###############################################################################
+# I/O benchmarks
+###############################################################################
+
+def benchmark_io(
+    record_counts: List[int],
+    layouts: List[str],
+    work_dir: str,
+    *,
+    grid_length: int = 64,
+    max_iterations: int = 100,
+    save_every: int = 10,
+    repeats: int = 3
+) -> Dict[str, Dict[str, float]]:
+    """Time save_to_hdf5, read_from_hdf5 and combine_hdf5_files for every record count and frame layout
+
+    Args:
+        record_counts (List[int]): records per file
+        layouts (List[str]): frame encodings, see FRAME_ENCODINGS
+        work_dir (str): scratch folder for the files
+        grid_length (int, optional): length of grid in pixels. Defaults to 64.
+        max_iterations (int, optional): iterations of each record. Defaults to 100.
+        save_every (int, optional): iterations between saved states. Defaults to 10.
+        repeats (int, optional): timings per case. Defaults to 3.
+
+    Returns:
+        Dict[str, Dict[str, float]]: timings by benchmark name, with records and bytes per second
+    """
+    sim_args = {'grid_length': grid_length, 'max_iterations': max_iterations, 'patch_radius': 4, 'save_states': [("interval", save_every)]}
+    records = [run_grayscott_simulation(seed, **sim_args) for seed in range(max(record_counts))]
+
+    results = {}
+    for num_records in record_counts:
+        for layout in layouts:
+            if layout == "delta16":
+                saved, compression = encode_record_frames(records[:num_records]), "gzip"
+            else:
+                saved, compression = records[:num_records], None
+            case = f"records={num_records}/layout={layout}"
+            data_file = os_path.join(work_dir, f"io_{num_records}_{layout}.hdf5")
+            parts = [os_path.join(work_dir, f"io_{num_records}_{layout}_part{i}.hdf5") for i in range(2)]
+            combined_file = os_path.join(work_dir, f"io_{num_records}_{layout}_combined.hdf5")
+
+            save = time_call(lambda: save_to_hdf5(saved, data_file, num_records, compression=compression), repeats,
+                             setup=lambda: remove_if_exists(data_file))
+            file_bytes = os_path.getsize(data_file)
+            read = time_call(lambda: read_from_hdf5(data_file, flatten=False), repeats)
+
+            # combining removes its inputs, so they are copied back before each timing
+            def copy_parts():
+                remove_if_exists(combined_file)
+                for part in parts:
+                    copyfile(data_file, part)
+            combine = time_call(lambda: combine_hdf5_files(parts, combined_file), repeats, setup=copy_parts)
+
+            for name, timing, num_bytes in [("save_to_hdf5", save, file_bytes), ("read_from_hdf5", read, file_bytes),
+                                            ("combine_hdf5_files", combine, 2 * file_bytes)]:
+                timing['records_per_second'] = num_records * (2 if name == "combine_hdf5_files" else 1) / timing['best']
+                timing['bytes_per_second'] = num_bytes / timing['best']
+                results[f"io/{name}/{case}"] = timing
+            for file_path in [data_file, combined_file, *parts]:
+                remove_if_exists(file_path)
+    return results
+
+###############################################################################
+# End-to-end benchmarks
+###############################################################################
+
+def benchmark_end_to_end(
+    task_counts: List[int],
+    seed_steps: List[int],
+    work_dir: str,
+    *,
+    num_seeds: int = 8,
+    grid_length: int = 64,
+    max_iterations: int = 500,
+    repeats: int = 1
+) -> Dict[str, Dict[str, float]]:
+    """Time whole create_dataset runs for every number of tasks and seed step
+
+    Args:
+        task_counts (List[int]): values of --ntasks
+        seed_steps (List[int]): values of --seed-step
+        work_dir (str): scratch folder for the datasets
+        num_seeds (int, optional): seeds per run. Defaults to 8.
+        grid_length (int, optional): length of grid in pixels. Defaults to 64.
+        max_iterations (int, optional): iterations of each record. Defaults to 500.
+        repeats (int, optional): timings per case. Defaults to 1.
+
+    Returns:
+        Dict[str, Dict[str, float]]: timings by benchmark name, with records and cell updates per second
+    """
+    from create_dataset import create_dataset
+
+    results = {}
+    for num_tasks in task_counts:
+        for seed_step in seed_steps:
+            output_folder = f"e2e_{num_tasks}_{seed_step}"
+            run_args = Namespace(
+                debug_on=False, num_tasks=num_tasks, min_seed=1, max_seed=num_seeds, seed_step=seed_step,
+                grid_length=grid_length, patch_radius=4, patch_prob=0.5, max_iterations=max_iterations,
+                save_states=[("interval", max(1, max_iterations // 10))], output_path=work_dir,
+                output_folder=output_folder, extend=False, progress_every=0
+            )
+            clear_folder = lambda: [remove_if_exists(f) for f in glob(os_path.join(work_dir, output_folder, "*"))]
+            timing = time_call(lambda: create_dataset(run_args), repeats, setup=clear_folder)
+            timing['records_per_second'] = num_seeds / timing['best']
+            timing['cell_updates_per_second'] = num_seeds * max_iterations * grid_length ** 2 / timing['best']
+            results[f"e2e/create_dataset/ntasks={num_tasks}/seed_step={seed_step}"] = timing
+            clear_folder()
+    return results
+
+###############################################################################
+# Baselines
+###############################################################################
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> Dict[str, List[Dict[str, Any]]]:
+    """Compare the best time per call of every benchmark in both result files
+
+    Args:
+        current (Dict[str, Any]): new results
+        baseline (Dict[str, Any]): results to compare against
+        threshold (float, optional): relative slowdown that counts as a regression. Defaults to 0.10.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: 'regressions', 'improvements' and 'unchanged' with the 'name',
+            both times and their 'ratio', plus the names 'missing' from either file
+    """
+    comparison = {'regressions': [], 'improvements': [], 'unchanged': [], 'missing': []}
+    current_results, baseline_results = current['results'], baseline['results']
+    for name in sorted(set(current_results) | set(baseline_results)):
+        if name not in current_results or name not in baseline_results:
+            comparison['missing'].append(name)
+            continue
+        ratio = current_results[name]['best'] / baseline_results[name]['best']
+        row = {'name': name, 'baseline': baseline_results[name]['best'], 'current': current_results[name]['best'], 'ratio': ratio}
+        if ratio > 1.0 + threshold:
+            comparison['regressions'].append(row)
+        elif ratio < 1.0 / (1.0 + threshold):
+            comparison['improvements'].append(row)
+        else:
+            comparison['unchanged'].append(row)
+    return comparison
+
+
+def log_comparison(comparison: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Log one line per compared benchmark, regressions as warnings"""
+    for kind in ['regressions', 'improvements', 'unchanged']:
+        for row in comparison[kind]:
+            message = f"{kind[:-1] if kind != 'unchanged' else kind:<11} {row['ratio']:6.2f}x  {row['baseline']:.3e}s → {row['current']:.3e}s  {row['name']}"
+            if kind == 'regressions':
+                logger.warning(message)
+            else:
+                logger.info(message)
+    if comparison['missing']:
+        logger.info(f"Only in one of the files: {', '.join(comparison['missing'])}")
+
+
+def run_benchmarks(args):
+    if args.debug_on:
+        set_logger_level(10)
+
+    levels = getattr(args, 'levels')
+    repeats = getattr(args, 'repeats')
+    results_file = getattr(args, 'results_file', None)
+    baseline_file = getattr(args, 'baseline_file', None)
+    output_file = getattr(args, 'output_file', None)
+    threshold = getattr(args, 'threshold', DEFAULT_THRESHOLD)
+
+    # compare existing results without running anything
+    if results_file is not None:
+        current = read_from_json(results_file)
+    else:
+        current = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': machine_info(),
+            'config': {key: value for key, value in vars(args).items() if key not in ('results_file', 'baseline_file', 'output_file')},
+            'results': {}
+        }
+        with TemporaryDirectory(prefix="greyscott_benchmark_") as work_dir:
+            if "micro" in levels:
+                logger.info("Running solver micro benchmarks")
+                current['results'].update(benchmark_solver(args.grid_lengths, args.batch_sizes, args.dtypes, repeats=repeats))
+            if "io" in levels:
+                logger.info("Running I/O benchmarks")
+                current['results'].update(benchmark_io(args.record_counts, args.layouts, work_dir, repeats=repeats))
+            if "e2e" in levels:
+                logger.info("Running end-to-end benchmarks")
+                current['results'].update(benchmark_end_to_end(args.e2e_tasks, args.e2e_seed_steps, work_dir))
+
+        output_file = output_file or f"benchmark_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        save_to_json(output_file, current)
+        logger.info(f"Saved {len(current['results'])} benchmark results → {output_file}")
+
+    if baseline_file is None:
+        return 0
+    comparison = compare_results(current, read_from_json(baseline_file), threshold)
+    log_comparison(comparison)
+    if comparison['regressions']:
+        logger.warning(f"{len(comparison['regressions'])} benchmark(s) regressed by more than {threshold:.0%} against {baseline_file}")
+    return len(comparison['regressions'])
+
+
+if __name__ == "__main__":
+    num_regressions = 0
+    try:
+        args = process_args(__file__)
+        num_regressions = run_benchmarks(args)
+    except Exception as e:
+        logger.error(e)
+    # exit code 1 lets CI fail on regressions
+    if num_regressions:
+        exit(1)
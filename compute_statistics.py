@@ -0,0 +1,91 @@
+from setup_logger import (setup_logger, set_logger_level, get_logger_level, start_log_listener,
+                          stop_log_listener, attach_log_queue)
+logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
+from arguments import process_args
+from utilities import *
+
+
+# persistent worker that pulls chunks of record numbers from the shared queue until it gets a stop sentinel,
+# only the image and metric groups of each record are read
+def process_record_chunks(data_file, task_queue, result_queue, histogram_bins=0, log_queue=None, log_level=logging.INFO):
+    if log_queue is not None:
+        attach_log_queue(log_queue, log_level)
+
+    worker_stats = {}
+    while True:
+        records = task_queue.get()
+        if records is None:
+            break
+        logger.debug("PID[%d]: computing statistics for records %d-%d", getpid(), records[0], records[-1])
+        record_chunk = read_from_hdf5(data_file, flatten=False, records=records, groups=['image', 'metric'])
+        worker_stats = merge_statistics(worker_stats, compute_local_stats(record_chunk, histogram_bins))
+
+    result_queue.put(worker_stats)
+
+
+# streams the records of an existing dataset through a pool of processes, one pass over the file
+def compute_dataset_statistics(data_file, num_workers=1, chunk_size=100, histogram_bins=0):
+    records = read_record_index(data_file)["record"]
+    record_chunks = [records[i:i + chunk_size].tolist() for i in range(0, len(records), chunk_size)]
+
+    task_queue = Queue()
+    result_queue = Queue()
+    for record_chunk in record_chunks:
+        task_queue.put(record_chunk)
+
+    num_workers = min(num_workers, len(record_chunks))
+    for _ in range(num_workers):
+        task_queue.put(None)
+
+    # children send their records to one listener in the parent
+    log_args = [start_log_listener(), get_logger_level()]
+    try:
+        procs_list = []
+        for i in range(num_workers):
+            p = Process(target=process_record_chunks, name=f"esp_statistics_p{i}", args=[data_file, task_queue, result_queue, histogram_bins, *log_args])
+            procs_list.append(p)
+            p.start()
+            logger.info(f"PID[{p.pid}]: child started computing statistics from the record chunk queue")
+
+        # results are read before joining, a child only exits once its result is consumed
+        stats_list = collect_worker_results(result_queue, procs_list)
+
+        for p in procs_list:
+            p.join()
+            logger.info(f"PID[{p.pid}]: child joined parent")
+    finally:
+        stop_log_listener()
+
+    if len(stats_list) < num_workers:
+        raise RuntimeError(f"{num_workers - len(stats_list)} statistics task(s) did not finish")
+
+    return reduce_statistics(stats_list)
+
+
+def compute_statistics(args):
+    if args.debug_on:
+        set_logger_level(10)
+
+    data_file = getattr(args, 'data_file')
+    req_cores = getattr(args, 'num_tasks')
+    chunk_size = getattr(args, 'chunk_size')
+    histogram_bins = getattr(args, 'histogram_bins')
+
+    logger.info(f"PID[{current_process().pid}]: parent process")
+    global_stats = compute_dataset_statistics(data_file, req_cores, chunk_size, histogram_bins)
+
+    # the final state of a run is at its last iteration
+    final_step = int(read_record_index(data_file)["total_iterations"].max())
+    global_stats = finalize_statistics(global_stats, final_step=final_step)
+
+    global_stats_file_path = get_statistics_file_path(data_file)
+    save_to_json(global_stats_file_path, global_stats)
+    logger.info(f"Saved global statistics → {global_stats_file_path}")
+
+
+if __name__ == "__main__":
+    try:
+        args = process_args(__file__)
+        compute_statistics(args)
+    except Exception as e:
+        logger.error(e)
@@ -1,58 +1,341 @@
-from setup_logger import setup_logger, set_logger_level
+from setup_logger import (setup_logger, set_logger_level, get_logger_level, start_log_listener,
+                          stop_log_listener, attach_log_queue, log_progress)
 logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
 from arguments import process_args
 from utilities import *
-from greyscott_simulation import generate_grayscott_maps
+from greyscott_simulation import generate_grayscott_maps, get_checkpoint_path
+from profiling import PhaseTimer, NULL_TIMER, build_profile_report, get_profile_file_path, get_worker_profile_path
+from telemetry import ProgressCounters, ProgressMonitor, NULL_PROGRESS, DEFAULT_PROGRESS_EVERY
+from os import rmdir
+from time import perf_counter
+import cProfile
 
-# processes function gets shape maps and saves to a file in chunks
-def process_image_maps(data_file, 
+# returns the manifest file that lists the completed seed chunks of a worker file
+def get_manifest_file_path(data_file):
+    return f"{data_file.rsplit('.', 1)[0]}_manifest.json"
+
+
+# returns the folder for mid-simulation checkpoints of a run, shared by its workers
+def get_checkpoint_dir(data_file):
+    return f"{data_file.rsplit('.', 1)[0]}_checkpoints"
+
+
+# returns the file a persistent worker appends the records of its seed chunks to
+def get_worker_file_path(run_file, worker):
+    return f"{run_file.rsplit('.', 1)[0]}_part{worker}.{DEFAULT_DATAFILE_EXT}"
+
+
+# lists the worker files of a run that have a manifest, also those of an interrupted run with more workers
+def list_worker_files(run_file):
+    manifest_paths = glob(get_manifest_file_path(get_worker_file_path(run_file, "*")))
+    return sorted(path.replace("_manifest.json", f".{DEFAULT_DATAFILE_EXT}") for path in manifest_paths)
+
+
+# reads the manifest of a worker file, a file without one has no completed chunks yet
+def read_worker_manifest(data_file):
+    manifest_path = get_manifest_file_path(data_file)
+    if not os_path.exists(manifest_path):
+        return {'chunks': [], 'statistics': {}}
+    return read_from_json(manifest_path)
+
+
+# returns the completed chunks of all worker files of a run in seed order,
+# each with the worker file and the first record number and count of its records there
+def list_completed_chunks(run_file):
+    chunks = [{**chunk, 'data_file': data_file} for data_file in list_worker_files(run_file)
+                for chunk in read_worker_manifest(data_file)['chunks']]
+    return sorted(chunks, key=lambda chunk: chunk['seed_range'][0])
+
+
+# returns the seeds the completed chunks of a run cover, kept and excluded ones, whatever seed step made the chunks
+def list_completed_seeds(run_file):
+    return {seed for chunk in list_completed_chunks(run_file)
+                for seed in range(chunk['seed_range'][0], chunk['seed_range'][1] + 1)}
+
+
+# returns the settings that have to match for the records of a resumed run to belong to the same dataset
+def get_run_config(simulation_kwargs, output_kwargs):
+    return {
+        'grid_length': simulation_kwargs['grid_length'],
+        'max_iterations': simulation_kwargs['max_iterations'],
+        'save_states': [list(state) for state in simulation_kwargs['save_states']],
+        'patch_radius': simulation_kwargs['patch_radius'],
+        'patch_prob': simulation_kwargs['patch_prob'],
+        'frame_encoding': output_kwargs.get('frame_encoding', "float32")
+    }
+
+
+# refuses to resume a run whose worker manifests were written with other settings
+def check_run_config(run_file, run_config):
+    for worker_file in list_worker_files(run_file):
+        manifest_config = read_worker_manifest(worker_file).get('config')
+        if manifest_config != run_config:
+            raise ValueError(f"Cannot resume, {get_manifest_file_path(worker_file)} was written with {manifest_config}, "
+                             f"this run uses {run_config}")
+
+
+# simulates one seed chunk and appends it to the worker file, the chunk is added to the manifest once it is saved
+def process_seed_chunk(data_file, 
                         seed_range, 
-                        seed_step, 
-                        shared_data, 
-                        shared_lock,
+                        manifest,
+                        checkpoint_dir=None,
+                        checkpoint_every=None,
+                        histogram_bins=0,
+                        thumbnail_levels=None,
+                        output_resolutions=None,
+                        frame_encoding="float32",
+                        keyframe_every=DEFAULT_KEYFRAME_EVERY,
+                        timer=None,
+                        progress=None,
+                        **kwargs):
+
+    timer = timer or NULL_TIMER
+    progress = progress or NULL_PROGRESS
+    checkpoint_dir = checkpoint_dir if checkpoint_every else None
+    if checkpoint_dir is not None:
+        makedirs(checkpoint_dir, exist_ok=True)
+
+    sim_results = generate_grayscott_maps(min_seed=seed_range[0], max_seed=seed_range[1], checkpoint_dir=checkpoint_dir, checkpoint_every=checkpoint_every, timer=timer, progress=progress, **kwargs)
+    # downsampled previews are computed while the full resolution states are still in memory
+    with timer.phase('frame_copies'):
+        if thumbnail_levels:
+            add_thumbnail_images(sim_results, thumbnail_levels)
+        if output_resolutions:
+            add_resolution_images(sim_results, output_resolutions)
+    # append the data chunk to the hdf5 file of the worker, statistics below still use the exact states
+    file_bytes = os_path.getsize(data_file) if os_path.exists(data_file) else 0
+    created_groups = []
+    with timer.phase('hdf5_write'):
+        if frame_encoding == "delta16":
+            saved_results, compression = encode_record_frames(sim_results, keyframe_every), "gzip"
+        else:
+            saved_results, compression = sim_results, None
+        if saved_results:
+            created_groups = save_to_hdf5(saved_results, data_file, len(saved_results), compression=compression)
+        if created_groups is None:
+            raise RuntimeError(f"Failed to save seeds {seed_range[0]}-{seed_range[1]} to {data_file}")
+    num_bytes = os_path.getsize(data_file) - file_bytes if os_path.exists(data_file) else 0
+    timer.count('records', len(sim_results))
+    timer.count('bytes_written', num_bytes)
+    progress.wrote(num_bytes)
+
+    # the global min and max for all scalers and images of this chunk
+    with timer.phase('statistics'):
+        local_stats = compute_local_stats(sim_results, histogram_bins)
+
+    # record the chunk as done only once its records are on disk, one save_to_hdf5 call numbers them consecutively
+    kept_seeds = {record['meta']['random_seed'] for record in sim_results}
+    manifest['chunks'].append({
+        'seed_range': list(seed_range),
+        'first_record': record_number(created_groups[0]) if created_groups else 0,
+        'num_records': len(created_groups),
+        'excluded_seeds': [seed for seed in range(seed_range[0], seed_range[1] + 1) if seed not in kept_seeds]
+    })
+    manifest['statistics'] = merge_statistics(manifest['statistics'], local_stats)
+    with timer.phase('json_save'):
+        save_to_json(get_manifest_file_path(data_file), manifest, atomic=True)
+
+    num_attempts = kwargs.get('max_resamples', 0) + 1
+    for seed in range(seed_range[0], seed_range[1] + 1):
+        for attempt in range(num_attempts):
+            remove_if_exists(get_checkpoint_path(checkpoint_dir, seed, attempt))
+
+    return local_stats
+
+
+# persistent worker that pulls seed chunks from the shared queue until it gets a stop sentinel,
+# all of its chunks are appended to one file listed in one manifest,
+# statistics and phase timings stay local to the worker and are sent to the parent once at the end
+def process_image_maps(data_file,
+                        task_queue, 
+                        result_queue,
+                        run_config=None,
+                        log_queue=None,
+                        log_level=logging.INFO,
+                        profile=False,
+                        profile_dir=None,
                         **kwargs):
 
-    remove_if_exists(data_file)
+    if log_queue is not None:
+        attach_log_queue(log_queue, log_level)
+
+    timer = PhaseTimer() if profile else None
+    profiler = cProfile.Profile() if profile_dir is not None else None
+    if profiler is not None:
+        profiler.enable()
+
+    # a resumed worker keeps appending to the file of the same worker of the interrupted run
+    manifest = read_worker_manifest(data_file)
+    manifest['config'] = run_config
+    worker_stats = {}
+    num_chunks = 0
+    while True:
+        seed_range = task_queue.get()
+        if seed_range is None:
+            break
+        logger.debug("PID[%d]: running simulations for seeds %d-%d", getpid(), seed_range[0], seed_range[1])
+        local_stats = process_seed_chunk(data_file, seed_range, manifest, timer=timer, **kwargs)
+        worker_stats = merge_statistics(worker_stats, local_stats)
+        num_chunks += 1
+        log_progress("PID[%d]: finished %d seed chunk(s), last seeds %d-%d", getpid(), num_chunks, seed_range[0], seed_range[1])
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(get_worker_profile_path(profile_dir, current_process().name))
+
+    result_queue.put((worker_stats, timer.as_dict() if timer is not None else None))
 
-    for sr in split_seed_range(seed_range, seed_step):
-        sim_results = generate_grayscott_maps(min_seed=sr[0], max_seed=sr[1], **kwargs)
-        # save the data chunk to the hdf5 file
-        save_to_hdf5(sim_results, data_file, seed_step)
 
-        # update the global min and max for all scalers and images
-        local_stats = compute_local_stats(sim_results)
-        update_shared_data(local_stats, shared_data, shared_lock)
+# removes the worker files, manifests and checkpoint folder of a run
+def remove_worker_files(run_file):
+    for worker_file in glob(get_worker_file_path(run_file, "*")):
+        remove_if_exists(worker_file)
+    for manifest_path in glob(get_manifest_file_path(get_worker_file_path(run_file, "*"))):
+        remove_if_exists(manifest_path)
+    checkpoint_dir = get_checkpoint_dir(run_file)
+    if os_path.isdir(checkpoint_dir) and not listdir(checkpoint_dir):
+        rmdir(checkpoint_dir)
 
-# combines all results files into one big file
-def gather_task_results(task_data_paths, final_file, seed_chunk):
+
+# combines the records of all worker files into one file in seed order, no matter which task(core) ran a chunk,
+# returns False if the file of a single worker was moved into place instead of copied
+def gather_task_results(run_file, final_file, append=False):
     cp_pid = current_process().pid
-    logger.info(f"PID[{cp_pid}]: Combining results files from each task into one file")
-    remove_if_exists(final_file)
-    combine_hdf5_files(task_data_paths, final_file, seed_chunk)
+    chunks = list_completed_chunks(run_file)
+    record_sources = [(chunk['data_file'], range(chunk['first_record'], chunk['first_record'] + chunk['num_records']))
+                        for chunk in chunks if chunk['num_records']]
+    logger.info(f"PID[{cp_pid}]: Combining {len(chunks)} seed chunks from each task into one file")
+
+    # a single worker that wrote exactly its chunks in seed order already holds the final file
+    worker_files = {data_file for data_file, _ in record_sources}
+    record_numbers = [r for _, records in record_sources for r in records]
+    copied = True
+    if not append and len(worker_files) == 1:
+        with h5py.File(*worker_files, 'r') as f:
+            copied = record_numbers != list(range(len(list_record_keys(f))))
+    if copied:
+        if not append:
+            remove_if_exists(final_file)
+        combine_hdf5_records(record_sources, final_file)
+    else:
+        replace(*worker_files, final_file)
+    add_excluded_seeds(final_file, [seed for chunk in chunks for seed in chunk.get('excluded_seeds', [])])
+    remove_worker_files(run_file)
     logger.info(f"PID[{cp_pid}]: Saved combined shape maps to: {final_file}")
+    return copied
+
+
+# finds the completed dataset in the output folder that an extend run appends to
+def find_existing_dataset(data_path, datafile_prefix):
+    pattern = re.compile(fr"{re.escape(datafile_prefix)}_(\d+)-(\d+)\.{DEFAULT_DATAFILE_EXT}$")
+    candidates = [file_path for file_path in glob(os_path.join(data_path, f"{datafile_prefix}_*.{DEFAULT_DATAFILE_EXT}"))
+                    if pattern.match(os_path.basename(file_path)) and os_path.exists(get_statistics_file_path(file_path))]
+    if len(candidates) != 1:
+        raise FileNotFoundError(f"Expected exactly one dataset '{datafile_prefix}_<MIN>-<MAX>.{DEFAULT_DATAFILE_EXT}' "
+                                f"with global statistics in '{data_path}' to extend, found: {candidates}")
+    return candidates[0]
+
+
+# appends the new task results and statistics to an existing dataset, renamed to <MIN>-<MAX> of its seeds
+# only if it holds or excluded every seed in that range, otherwise the name would claim seeds that are not in it
+def extend_dataset(existing_file, run_file, new_stats, data_path, datafile_prefix):
+    cp_pid = current_process().pid
+    logger.info(f"PID[{cp_pid}]: Appending results files from each task to {existing_file}")
+    gather_task_results(run_file, existing_file, append=True)
 
+    existing_stats_path = get_statistics_file_path(existing_file)
+    global_stats = merge_statistics(read_from_json(existing_stats_path), new_stats)
 
-# creates and runs each process
-def run_processes(task_data_paths, seed_range_per_task, seed_step, simulation_kwargs):
-    # shared data is to track global min and max for normalizing data 
+    seeds = read_record_index(existing_file)["random_seed"]
+    covered_seeds = np.union1d(seeds, read_excluded_seeds(existing_file))
+    final_file_path = existing_file
+    if covered_seeds.size == covered_seeds[-1] - covered_seeds[0] + 1:
+        final_file_path = f"{data_path}/{datafile_prefix}_{covered_seeds[0]}-{covered_seeds[-1]}.{DEFAULT_DATAFILE_EXT}"
+    else:
+        logger.info(f"PID[{cp_pid}]: Seeds {covered_seeds[0]}-{covered_seeds[-1]} have gaps, keeping the name {os_path.basename(existing_file)}")
+    if final_file_path != existing_file:
+        rename(existing_file, final_file_path)
+        remove_if_exists(existing_stats_path)
+    logger.info(f"PID[{cp_pid}]: Extended dataset now holds {len(seeds)} records: {final_file_path}")
+    return final_file_path, global_stats
+
+
+# creates one persistent process per core, chunks of seed_step seeds are handed out dynamically from a shared queue
+# and each process appends them to its own worker file of run_file
+def run_processes(run_file, seeds, seed_step, num_workers, simulation_kwargs, recovery_kwargs=None, output_kwargs=None, profile_kwargs=None, monitor_kwargs=None):
+    recovery_kwargs = dict(recovery_kwargs or {})
+    resume = recovery_kwargs.pop('resume', False)
+    recovery_kwargs['checkpoint_dir'] = get_checkpoint_dir(run_file)
+    run_config = get_run_config(simulation_kwargs, output_kwargs or {})
+    if resume:
+        check_run_config(run_file, run_config)
+    else:
+        remove_worker_files(run_file)
+
+    # statistics track global min and max for normalizing data 
     # this is useful for normalizing now or in the dataloader later
-    manager = Manager()
-    shared_data = manager.dict() 
-    shared_lock = Lock()
+    # completed chunks of an interrupted run only contribute their statistics,
+    # the remaining seeds are split again so a resume with another seed step does not simulate a seed twice
+    stats_list = [read_worker_manifest(worker_file)['statistics'] for worker_file in list_worker_files(run_file)]
+    completed_seeds = list_completed_seeds(run_file)
+    pending_seeds = [seed for seed in seeds if seed not in completed_seeds]
+    pending_chunks = split_seed_chunks(pending_seeds, seed_step)
+
+    if resume:
+        logger.info(f"Resuming run: {len(seeds) - len(pending_seeds)}/{len(seeds)} seeds already complete")
+
+    task_queue = Queue()
+    result_queue = Queue()
+    for seed_range in pending_chunks:
+        task_queue.put(seed_range)
+
+    num_workers = min(num_workers, len(pending_chunks))
+    for _ in range(num_workers):
+        task_queue.put(None)
 
-    procs_list = []
-    for i, (task_file, seed_range) in enumerate(zip(task_data_paths, seed_range_per_task)):
-        p_args = [task_file, seed_range, seed_step, shared_data, shared_lock]  # Pass shared dict to each process
-        p = Process(target=process_image_maps, name=f"esp_simulation_p{i}", args=p_args, kwargs=simulation_kwargs)
-        procs_list.append(p)
-        p.start()
-        logger.info(f"PID[{p.pid}]: child started running simulations for seeds {seed_range}")
+    # workers publish their progress to shared counters that a thread in the parent reports
+    monitor_kwargs = monitor_kwargs or {}
+    counters = ProgressCounters(num_workers)
+    monitor = ProgressMonitor(counters, len(pending_seeds), simulation_kwargs['max_iterations'],
+                              interval=monitor_kwargs.get('progress_every', DEFAULT_PROGRESS_EVERY),
+                              status_file=monitor_kwargs.get('status_file'))
 
-    for p in procs_list:
-        p.join()
-        logger.info(f"PID[{p.pid}]: child joined parent")
+    # children send their records to one listener in the parent
+    log_kwargs = {'log_queue': start_log_listener(), 'log_level': get_logger_level()}
+    monitor_state = 'failed'
+    try:
+        monitor.start()
+        procs_list = []
+        for i in range(num_workers):
+            p_args = [get_worker_file_path(run_file, i), task_queue, result_queue, run_config]
+            p = Process(target=process_image_maps, name=f"esp_simulation_p{i}", args=p_args,
+                        kwargs={**log_kwargs, 'progress': counters.worker(i), **simulation_kwargs, **recovery_kwargs,
+                                **(output_kwargs or {}), **(profile_kwargs or {})})
+            procs_list.append(p)
+            p.start()
+            logger.info(f"PID[{p.pid}]: child started running simulations from the seed chunk queue")
+
+        # results are read before joining, a child only exits once its result is consumed
+        worker_results = collect_worker_results(result_queue, procs_list)
+        stats_list.extend(worker_stats for worker_stats, _ in worker_results)
+        worker_timings = [timings for _, timings in worker_results if timings is not None]
+
+        for p in procs_list:
+            p.join()
+            logger.info(f"PID[{p.pid}]: child joined parent")
+        completed_seeds = list_completed_seeds(run_file)
+        failed_chunks = compress_seed_ranges([seed for seed in seeds if seed not in completed_seeds])
+        if not failed_chunks:
+            monitor_state = 'done'
+    finally:
+        monitor.stop(monitor_state)
+        stop_log_listener()
+
+    # keep worker files and manifests of a failed run so it can be resumed
+    if failed_chunks:
+        raise RuntimeError(f"{len(failed_chunks)} seed range(s) did not finish, rerun with --resume to continue: {failed_chunks}")
 
-    return dict(shared_data)
+    return reduce_statistics(stats_list), worker_timings
 
 
 
@@ -74,8 +357,31 @@ def create_dataset(args):
 
     max_iterations = getattr(args, 'max_iterations') 
     save_states = getattr(args, 'save_states', []) 
+    diagnostics = getattr(args, 'diagnostics', False)
+    spectral_features = getattr(args, 'spectral_features', False)
+    health_check_every = getattr(args, 'health_check_every', None)
+    unhealthy = getattr(args, 'unhealthy', 'keep')
+    max_resamples = getattr(args, 'max_resamples', 3)
+    replay_every = getattr(args, 'replay_every', None)
+    cache_dir = getattr(args, 'cache_dir', None)
+    cache_size = getattr(args, 'cache_size', 10.0)
+    extend = getattr(args, 'extend', False)
+    resume = getattr(args, 'resume', False)
+    checkpoint_every = getattr(args, 'checkpoint_every', None)
+    histogram_bins = getattr(args, 'histogram_bins', 0)
+    normalize = getattr(args, 'normalize', None)
+    thumbnail_levels = getattr(args, 'thumbnail_levels', None)
+    output_resolutions = getattr(args, 'output_resolutions', None)
+    frame_encoding = getattr(args, 'frame_encoding', 'float32')
+    keyframe_every = getattr(args, 'keyframe_every', DEFAULT_KEYFRAME_EVERY)
+    profile = getattr(args, 'profile', False)
+    profile_dump = getattr(args, 'profile_dump', False)
+    progress_every = getattr(args, 'progress_every', DEFAULT_PROGRESS_EVERY)
+    status_file = getattr(args, 'status_file', None)
 
-    total_seeds = (max_seed-min_seed+1)
+    start_time = perf_counter()
+    timer = PhaseTimer() if profile else NULL_TIMER
+    seeds = list(range(min_seed, max_seed + 1))
 
     # creates output folder and data file prefix
     output_folder_path = os_path.join(args.output_path, args.output_folder)
@@ -85,9 +391,20 @@ def create_dataset(args):
     arguments_file_path = f"arguments_{datafile_prefix}_{min_seed}-{max_seed}.json"
     save_to_json(os_path.join(output_folder_path, arguments_file_path), vars(args))
 
-    # split up shapes between tasks(cores)
-    seed_range_per_task = split_seed_range((min_seed, max_seed), total_seeds// req_cores)
-    task_data_paths = [f"{data_path}/{datafile_prefix}_{seed_range[0]}-{seed_range[1]}.{DEFAULT_DATAFILE_EXT}" for seed_range in seed_range_per_task]
+    # only schedule the seeds that are not in the dataset yet, seeds excluded by an earlier run count as done
+    if extend:
+        existing_file = find_existing_dataset(data_path, datafile_prefix)
+        existing_seeds = set(read_record_index(existing_file)["random_seed"].tolist())
+        excluded_seeds = set(read_excluded_seeds(existing_file).tolist())
+        seeds = [seed for seed in seeds if seed not in existing_seeds and seed not in excluded_seeds]
+        logger.info(f"Extending {existing_file}: {len(existing_seeds)} seeds exist, {len(excluded_seeds)} seeds were excluded, "
+                    f"{len(seeds)} seeds to simulate")
+        if not seeds:
+            return
+
+    # persistent workers append the seed chunks they pull to one file each, combined in seed order afterwards
+    final_file_path = f"{data_path}/{datafile_prefix}_{min_seed}-{max_seed}.{DEFAULT_DATAFILE_EXT}"
+    run_file = final_file_path if not extend else f"{data_path}/{datafile_prefix}_{seeds[0]}-{seeds[-1]}.{DEFAULT_DATAFILE_EXT}"
 
     # start process tasks
     logger.info(f"PID[{current_process().pid}]: parent process")
@@ -97,21 +414,70 @@ def create_dataset(args):
         "max_iterations": max_iterations,
         "patch_radius": patch_radius,
         "patch_prob": patch_prob,
-        "save_states": save_states
+        "save_states": save_states,
+        "diagnostics": diagnostics,
+        "spectral_features": spectral_features,
+        "health_check_every": health_check_every,
+        "unhealthy": unhealthy,
+        "max_resamples": max_resamples,
+        "replay_every": replay_every,
+        "cache_dir": cache_dir,
+        "cache_max_bytes": int(cache_size * (1 << 30))
     }
 
-    global_stats = run_processes(task_data_paths, seed_range_per_task, seed_step, simulation_kwargs)
+    recovery_kwargs = {
+        "resume": resume,
+        "checkpoint_every": checkpoint_every
+    }
 
-    # combine process results
-    if req_cores > 1:
-        final_file_path = f"{data_path}/{datafile_prefix}_{min_seed}-{max_seed}.{DEFAULT_DATAFILE_EXT}"
-        gather_task_results(task_data_paths, final_file_path, seed_step)
-    else:
-        final_file_path = task_data_paths[0]
+    output_kwargs = {
+        "histogram_bins": histogram_bins,
+        "thumbnail_levels": thumbnail_levels,
+        "output_resolutions": output_resolutions,
+        "frame_encoding": frame_encoding,
+        "keyframe_every": keyframe_every
+    }
+
+    profile_kwargs = {
+        "profile": profile,
+        "profile_dir": data_path if profile_dump else None
+    }
+
+    monitor_kwargs = {
+        "progress_every": progress_every,
+        "status_file": status_file
+    }
+
+    global_stats, worker_timings = run_processes(run_file, seeds, seed_step, req_cores, simulation_kwargs, recovery_kwargs, output_kwargs, profile_kwargs, monitor_kwargs)
+
+    # combine process results, an extended dataset only adds the bytes it grew by
+    with timer.phase('merge'):
+        if extend:
+            existing_bytes = os_path.getsize(existing_file)
+            final_file_path, global_stats = extend_dataset(existing_file, run_file, global_stats, data_path, datafile_prefix)
+            timer.count('bytes_written', os_path.getsize(final_file_path) - existing_bytes)
+        elif gather_task_results(run_file, final_file_path):
+            timer.count('bytes_written', os_path.getsize(final_file_path))
+
+    with timer.phase('statistics'):
+        global_stats = finalize_statistics(global_stats, final_step=max_iterations)
+    with timer.phase('json_save'):
+        save_to_json(get_statistics_file_path(final_file_path), global_stats)
+
+    # second pass once the global statistics are known
+    if normalize:
+        logger.info(f"Writing {normalize} normalized images to {final_file_path}")
+        with timer.phase('normalize'):
+            write_normalized_images(final_file_path, global_stats, normalize)
 
-    global_stats_file_name = os_path.basename(final_file_path).split('.')[0]
-    global_stats_file_path = f"global_statistics_{DEFAULT_DATAFILE_EXT}_{global_stats_file_name}.json"
-    save_to_json(os_path.join(output_folder_path, global_stats_file_path), global_stats)
+    if profile:
+        for timings in worker_timings:
+            timer.merge(timings)
+        report = build_profile_report(timer, perf_counter() - start_time, worker_timings)
+        save_to_json(get_profile_file_path(final_file_path), report)
+        throughput = report['throughput']
+        logger.info(f"Profile: {throughput['records_per_second']:.2f} records/s, {throughput['cell_updates_per_second']:.3e} cell updates/s, "
+                    f"{throughput['bytes_written_per_second'] / (1 << 20):.2f} MiB/s → {get_profile_file_path(final_file_path)}")
 
 
 if __name__ == "__main__":
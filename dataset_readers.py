@@ -0,0 +1,261 @@
+from setup_logger import setup_logger
+logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
+from collections import OrderedDict
+from utilities import (Any, Dict, List, Optional, Tuple, np, h5py, re, record_key, record_number,
+                       list_record_keys, read_from_hdf5)
+from greyscott_solvers import update_gray_scott
+
+###############################################################################
+# Replay store
+###############################################################################
+
+REPLAY_GROUP = "replay"
+SOLVER_PARAM_KEYS = ['du', 'dv', 'feed', 'kill']
+
+class ReplayStore:
+    """Read any step of a record written with replay states, re-simulating from the nearest stored state
+
+    Each record is deterministic given its parameters, so intermediate steps are rebuilt by running the
+    solver forward from the closest replay state (or an already rebuilt state) at or before the step.
+    Rebuilt states are kept in an LRU cache, so playing a trajectory forward costs one solver step per frame.
+
+    Args:
+        file_path (str): HDF5 dataset written with --replay-every
+        cache_size (int, optional): number of rebuilt (u, v) states kept in memory. Defaults to 64.
+    """
+
+    def __init__(self, file_path: str, cache_size: int = 64):
+        self.file_path = file_path
+        self.cache_size = cache_size
+        self._file = h5py.File(file_path, 'r')
+        self._cache: "OrderedDict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._anchors: Dict[int, Dict[str, Any]] = {}
+
+    def __enter__(self) -> "ReplayStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the dataset file and drop the cache"""
+        self._cache.clear()
+        self._file.close()
+
+    def _record_anchors(self, record: int) -> Dict[str, Any]:
+        # stored steps and solver parameters of a record, read once
+        if record not in self._anchors:
+            group = self._file[record_key(record)]
+            meta = group['meta'].attrs
+            steps = {0: ('image', 'initial'), int(meta['total_iterations']): ('image', 'final')}
+            if REPLAY_GROUP in group:
+                for key in group[REPLAY_GROUP].keys():
+                    m = re.match(r"v_state_(\d+)$", key)
+                    if m:
+                        steps[int(m.group(1))] = (REPLAY_GROUP, m.group(1))
+            self._anchors[record] = {
+                'steps': steps,
+                # python floats keep the float32 arithmetic of the original run
+                'params': {key: float(meta[key]) for key in SOLVER_PARAM_KEYS},
+                'total_iterations': int(meta['total_iterations'])
+            }
+        return self._anchors[record]
+
+    def steps(self, record: int) -> List[int]:
+        """Return the stored steps of a record, any step in between can be requested too"""
+        return sorted(self._record_anchors(record)['steps'])
+
+    def _cache_put(self, record: int, step: int, u: np.ndarray, v: np.ndarray) -> None:
+        self._cache[(record, step)] = (u, v)
+        self._cache.move_to_end((record, step))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get_state(self, record: int, step: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return copies of U and V of a record after the given number of iterations
+
+        Args:
+            record (int): record number
+            step (int): iteration between 0 and the total iterations of the record
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: u, v
+
+        Raises:
+            ValueError: If step is outside the simulated iterations.
+        """
+        anchors = self._record_anchors(record)
+        if not (0 <= step <= anchors['total_iterations']):
+            raise ValueError(f"Step {step} outside of the {anchors['total_iterations']} iterations of record {record}")
+
+        if (record, step) in self._cache:
+            self._cache.move_to_end((record, step))
+            u, v = self._cache[(record, step)]
+            return u.copy(), v.copy()
+
+        # start from the closest stored or cached state at or before the step
+        start = max(s for s in anchors['steps'] if s <= step)
+        cached = [s for (r, s) in self._cache if r == record and start < s <= step]
+        if cached:
+            start = max(cached)
+            u, v = (array.copy() for array in self._cache[(record, start)])
+        else:
+            group_name, suffix = anchors['steps'][start]
+            group = self._file[record_key(record)][group_name]
+            u, v = group[f"u_state_{suffix}"][()], group[f"v_state_{suffix}"][()]
+
+        for _ in range(start, step):
+            update_gray_scott(u, v, **anchors['params'])
+
+        self._cache_put(record, step, u, v)
+        return u.copy(), v.copy()
+
+    def get_frames(self, record: int, steps: List[int], prefix: str = 'v') -> np.ndarray:
+        """Return the U or V states of a record at the given steps, rebuilt in increasing step order
+
+        Args:
+            record (int): record number
+            steps (List[int]): iterations to read
+            prefix (str, optional): 'u' or 'v'. Defaults to 'v'.
+
+        Returns:
+            np.ndarray: frames with shape (len(steps), H, W)
+        """
+        frames = {step: self.get_state(record, step)[0 if prefix == 'u' else 1] for step in sorted(set(steps))}
+        return np.stack([frames[step] for step in steps])
+
+
+###############################################################################
+# Symmetry augmentation
+###############################################################################
+
+NUM_DIHEDRAL = 8
+
+def apply_symmetry(frames: np.ndarray, rotation: int = 0, flip: bool = False, shift: Tuple[int, int] = (0, 0)) -> np.ndarray:
+    """Transform the last two axes of a frame or stack of frames by a symmetry of the periodic square grid
+
+    Rotations and flips return views, only a non-zero shift copies the frames.
+
+    Args:
+        frames (np.ndarray): frames with shape (..., L, L)
+        rotation (int, optional): number of quarter turns counterclockwise. Defaults to 0.
+        flip (bool, optional): mirror along the x axis after rotating. Defaults to False.
+        shift (Tuple[int, int], optional): periodic offsets along y and x. Defaults to (0, 0).
+
+    Returns:
+        np.ndarray: transformed frames with the same shape
+    """
+    view = np.rot90(frames, k=rotation % 4, axes=(-2, -1))
+    if flip:
+        view = view[..., ::-1]
+    if any(shift):
+        view = np.roll(view, shift, axis=(-2, -1))
+    return view
+
+
+class AugmentedRecords:
+    """Virtual records made of the stored records under the translations and 8 dihedral symmetries of the grid
+
+    Gray-Scott with isotropic diffusion on a periodic grid is equivariant under these symmetries, so each
+    transformed trajectory is as valid as a simulated one. Virtual record (record, augmentation) applies the
+    same transform to every image of the record. Augmentation 0 is the stored record, augmentations 1-7 are
+    the other dihedral symmetries and beyond that the symmetry and periodic offsets are drawn from a generator
+    seeded with (seed, record, augmentation), so every view is reproducible.
+
+    Args:
+        file_path (str): HDF5 dataset
+        num_augmentations (int, optional): virtual records per stored record. Defaults to 8.
+        translate (bool, optional): also shift augmentations 1-7 by random periodic offsets. Defaults to False.
+        seed (int, optional): seed of the drawn transforms. Defaults to 0.
+        level (Optional[int], optional): read the thumbnails of this level. Defaults to None.
+        resolution (Optional[int], optional): read the images of this resolution. Defaults to None.
+        cache_size (int, optional): number of stored records kept in memory. Defaults to 8.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        num_augmentations: int = NUM_DIHEDRAL,
+        translate: bool = False,
+        seed: int = 0,
+        level: Optional[int] = None,
+        resolution: Optional[int] = None,
+        cache_size: int = 8
+    ):
+        if num_augmentations < 1:
+            raise ValueError(f"num_augmentations must be at least 1, got {num_augmentations}")
+        self.file_path = file_path
+        self.num_augmentations = num_augmentations
+        self.translate = translate
+        self.seed = seed
+        self.level = level
+        self.resolution = resolution
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        with h5py.File(file_path, 'r') as f:
+            self.records = [record_number(key) for key in list_record_keys(f)]
+
+    def __len__(self) -> int:
+        return len(self.records) * self.num_augmentations
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if not (-len(self) <= index < len(self)):
+            raise IndexError(f"Index {index} outside of {len(self)} augmented records")
+        position, augmentation = divmod(index % len(self), self.num_augmentations)
+        return self.get_record(self.records[position], augmentation)
+
+    def _load_record(self, record: int) -> Dict[str, Any]:
+        if record in self._cache:
+            self._cache.move_to_end(record)
+        else:
+            self._cache[record] = read_from_hdf5(self.file_path, flatten=False, records=[record],
+                                                 groups=['image', 'meta', 'metric'],
+                                                 level=self.level, resolution=self.resolution)[0]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return self._cache[record]
+
+    def transform(self, record: int, augmentation: int, grid_length: int) -> Dict[str, Any]:
+        """Return the symmetry of a virtual record
+
+        Args:
+            record (int): record number
+            augmentation (int): augmentation number, 0 is the stored record
+            grid_length (int): length of the grid the offsets are drawn for
+
+        Returns:
+            Dict[str, Any]: 'rotation', 'flip' and 'shift' arguments of apply_symmetry
+        """
+        if augmentation == 0:
+            return {'rotation': 0, 'flip': False, 'shift': (0, 0)}
+        rng = np.random.default_rng([self.seed, record, augmentation])
+        if augmentation < NUM_DIHEDRAL:
+            symmetry = augmentation
+            shifted = self.translate
+        else:
+            symmetry = int(rng.integers(NUM_DIHEDRAL))
+            shifted = True
+        shift = tuple(int(s) for s in rng.integers(grid_length, size=2)) if shifted else (0, 0)
+        return {'rotation': symmetry % 4, 'flip': symmetry >= 4, 'shift': shift}
+
+    def get_record(self, record: int, augmentation: int = 0) -> Dict[str, Any]:
+        """Return a virtual record, every frame transformed by the same symmetry
+
+        Args:
+            record (int): record number
+            augmentation (int, optional): augmentation number, 0 is the stored record. Defaults to 0.
+
+        Returns:
+            Dict[str, Any]: 'image', 'meta' and 'metric' of the record plus the applied 'augmentation',
+                images can be views of cached arrays and should be copied before writing to them
+        """
+        if not (0 <= augmentation < self.num_augmentations):
+            raise ValueError(f"Augmentation {augmentation} outside of the {self.num_augmentations} augmentations")
+        stored = self._load_record(record)
+        grid_length = next(iter(stored['image'].values())).shape[-1]
+        symmetry = self.transform(record, augmentation, grid_length)
+        return {
+            **stored,
+            'image': {key: apply_symmetry(frame, **symmetry) for key, frame in stored['image'].items()},
+            'augmentation': {'id': augmentation, **symmetry}
+        }
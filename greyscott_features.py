@@ -0,0 +1,184 @@
+from utilities import Any, Dict, List, Optional, Tuple, np
+
+###############################################################################
+# Spectral features
+###############################################################################
+
+FEATURE_KEYS = ['dominant_wavelength', 'spot_count', 'anisotropy']
+# cells with more activator than this belong to a spot
+SPOT_V_THRESHOLD = 0.1
+
+def _wavenumbers(grid_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the integer wavenumbers along y and x of an unshifted 2D FFT
+
+    Args:
+        grid_length (int): length of grid in pixels
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: ky with shape (L, 1), kx with shape (1, L)
+    """
+    k = np.fft.fftfreq(grid_length, d=1.0 / grid_length)
+    return k[:, None], k[None, :]
+
+
+def power_spectra(fields: np.ndarray) -> np.ndarray:
+    """Return the 2D power spectrum of each mean-removed field, all fields in one FFT
+
+    Args:
+        fields (np.ndarray): stack of square fields with shape (N, L, L)
+
+    Returns:
+        np.ndarray: |FFT|² with shape (N, L, L)
+    """
+    centered = fields - fields.mean(axis=(-2, -1), keepdims=True, dtype=np.float64)
+    spectrum = np.fft.fft2(centered, axes=(-2, -1))
+    return spectrum.real ** 2 + spectrum.imag ** 2
+
+
+def radial_power_spectrum(power: np.ndarray) -> np.ndarray:
+    """Average 2D power spectra over rings of integer wavenumber magnitude
+
+    Args:
+        power (np.ndarray): power spectra with shape (N, L, L)
+
+    Returns:
+        np.ndarray: radially averaged power with shape (N, L // 2 + 1), index k is the ring |k| ≈ k
+    """
+    num_fields, grid_length = power.shape[0], power.shape[-1]
+    ky, kx = _wavenumbers(grid_length)
+    rings = np.rint(np.hypot(ky, kx)).astype(np.int64).ravel()
+    num_rings = grid_length // 2 + 1
+
+    # corner wavenumbers beyond the Nyquist ring are dropped
+    keep = rings < num_rings
+    rings = rings[keep]
+    counts = np.bincount(rings, minlength=num_rings)
+
+    # one bincount for the whole batch, each field gets its own block of rings
+    offsets = (np.arange(num_fields) * num_rings)[:, None]
+    sums = np.bincount((rings[None, :] + offsets).ravel(),
+                        weights=power.reshape(num_fields, -1)[:, keep].ravel(),
+                        minlength=num_fields * num_rings)
+    return sums.reshape(num_fields, num_rings) / np.maximum(counts, 1)
+
+
+def dominant_wavelength(radial_power: np.ndarray, grid_length: int) -> np.ndarray:
+    """Return the wavelength in pixels of the strongest non-zero ring, NaN for flat fields
+
+    Args:
+        radial_power (np.ndarray): radially averaged power with shape (N, K)
+        grid_length (int): length of grid in pixels
+
+    Returns:
+        np.ndarray: wavelengths with shape (N,)
+    """
+    peak = np.argmax(radial_power[:, 1:], axis=1) + 1
+    flat = radial_power[:, 1:].max(axis=1) <= 0.0
+    return np.where(flat, np.nan, grid_length / peak)
+
+
+def spectral_anisotropy(power: np.ndarray) -> np.ndarray:
+    """Return 1 - λmin / λmax of the power weighted second moments of the wavevectors
+
+    0 means the pattern has no preferred direction, values close to 1 mean parallel stripes.
+
+    Args:
+        power (np.ndarray): power spectra with shape (N, L, L)
+
+    Returns:
+        np.ndarray: anisotropy with shape (N,), NaN for flat fields
+    """
+    ky, kx = _wavenumbers(power.shape[-1])
+    total = power.sum(axis=(-2, -1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mxx = (power * kx ** 2).sum(axis=(-2, -1)) / total
+        myy = (power * ky ** 2).sum(axis=(-2, -1)) / total
+        mxy = (power * (kx * ky)).sum(axis=(-2, -1)) / total
+
+        # eigenvalues of the symmetric 2x2 moment tensor
+        half_trace = 0.5 * (mxx + myy)
+        radius = np.sqrt((0.5 * (mxx - myy)) ** 2 + mxy ** 2)
+        return 1.0 - (half_trace - radius) / (half_trace + radius)
+
+
+def count_spots(fields: np.ndarray, threshold: float = SPOT_V_THRESHOLD) -> np.ndarray:
+    """Count 4-connected components above threshold, components wrap around the periodic boundaries
+
+    All fields are labeled together: every active cell starts with its own flat index as label,
+    then labels take the minimum of their neighbors and jump to the label of the cell they point to
+    until nothing changes.
+
+    Args:
+        fields (np.ndarray): stack of fields with shape (N, H, W)
+        threshold (float, optional): minimum value of a spot cell. Defaults to SPOT_V_THRESHOLD.
+
+    Returns:
+        np.ndarray: number of spots per field with shape (N,)
+    """
+    mask = fields > threshold
+    background = np.iinfo(np.int64).max
+    cell_ids = np.arange(mask.size, dtype=np.int64).reshape(mask.shape)
+    labels = np.where(mask, cell_ids, background)
+
+    while True:
+        neighbors = labels
+        for shift, axis in ((1, -2), (-1, -2), (1, -1), (-1, -1)):
+            neighbors = np.minimum(neighbors, np.roll(labels, shift, axis=axis))
+        updated = np.where(mask, neighbors, background)
+
+        # pointer jumping, a label is the id of a cell of the same component
+        active = updated[mask]
+        updated[mask] = np.minimum(active, updated.ravel()[active])
+
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    roots = mask & (labels == cell_ids)
+    return roots.sum(axis=(-2, -1))
+
+
+def compute_spectral_features(fields: np.ndarray) -> Dict[str, np.ndarray]:
+    """Compute the pattern features of a batch of final V states
+
+    Args:
+        fields (np.ndarray): stack of square fields with shape (N, L, L)
+
+    Returns:
+        Dict[str, np.ndarray]: 'radial_power_spectrum' with shape (N, L // 2 + 1) and one value per field
+            for 'dominant_wavelength', 'spot_count' and 'anisotropy'
+    """
+    power = power_spectra(fields)
+    radial_power = radial_power_spectrum(power)
+    return {
+        'radial_power_spectrum': radial_power,
+        'dominant_wavelength': dominant_wavelength(radial_power, fields.shape[-1]),
+        'spot_count': count_spots(fields),
+        'anisotropy': spectral_anisotropy(power)
+    }
+
+
+def add_spectral_features(results: List[Dict[str, Any]], image_key: str = 'v_state_final') -> List[Dict[str, Any]]:
+    """Write the spectral features of each record to its 'metric' group, records of equal grid size share one batch
+
+    Args:
+        results (List[Dict[str, Any]]): simulation records
+        image_key (str, optional): image the features are computed from. Defaults to 'v_state_final'.
+
+    Returns:
+        List[Dict[str, Any]]: the same records
+    """
+    batches: Dict[Tuple[int, ...], List[int]] = {}
+    for idx, result in enumerate(results):
+        batches.setdefault(result['image'][image_key].shape, []).append(idx)
+
+    for indices in batches.values():
+        features = compute_spectral_features(np.stack([results[idx]['image'][image_key] for idx in indices]))
+        for row, idx in enumerate(indices):
+            metric = results[idx].setdefault('metric', {})
+            metric['radial_power_spectrum'] = features['radial_power_spectrum'][row]
+            metric['dominant_wavelength'] = float(features['dominant_wavelength'][row])
+            metric['spot_count'] = int(features['spot_count'][row])
+            metric['anisotropy'] = float(features['anisotropy'][row])
+
+    return results
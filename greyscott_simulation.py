@@ -1,9 +1,89 @@
 from setup_logger import setup_logger
 logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
-from utilities import Any, Dict, List, Optional, Tuple, np, create_save_states_predicate
+from utilities import (Any, Dict, List, Optional, Tuple, np, os_path, create_save_states_predicate, 
+                        save_to_npz, read_from_npz)
 from greyscott_solvers import *
 from greyscott_patterns import *
-from visualize_dataset import *
+from greyscott_features import add_spectral_features
+from simulation_cache import SimulationCache, simulation_cache_key, find_restart_step, DEFAULT_CACHE_BYTES
+from profiling import PhaseTimer, NULL_TIMER
+from telemetry import WorkerProgress, NULL_PROGRESS, PROGRESS_UPDATE_EVERY
+
+###############################################################################
+# Diagnostics
+###############################################################################
+
+DIAGNOSTIC_KEYS = ['u_mean', 'u_min', 'u_max', 'v_mean', 'v_min', 'v_max', 'v_mass', 'l2_change', 'active_fraction']
+# cells with more activator than this count as active
+ACTIVE_V_THRESHOLD = 0.1
+
+def allocate_diagnostics(max_iterations: int) -> Dict[str, np.ndarray]:
+    """Preallocate one scalar per step, step 0 is the initial state
+
+    Args:
+        max_iterations (int): maximum euler steps
+
+    Returns:
+        Dict[str, np.ndarray]: NaN filled float64 arrays of length max_iterations + 1 per diagnostic
+    """
+    return {key: np.full(max_iterations + 1, np.nan) for key in DIAGNOSTIC_KEYS}
+
+
+def record_diagnostics(
+    diagnostics: Dict[str, np.ndarray],
+    step: int,
+    u: np.ndarray,
+    v: np.ndarray,
+    delta_u: Optional[np.ndarray] = None,
+    delta_v: Optional[np.ndarray] = None
+) -> None:
+    """Write the scalar diagnostics of one step in-place, the L2 change reuses the increments of the update
+
+    Args:
+        diagnostics (Dict[str, np.ndarray]): arrays from allocate_diagnostics
+        step (int): iteration the fields belong to
+        u (np.ndarray): concentration U
+        v (np.ndarray): concentration V
+        delta_u (Optional[np.ndarray], optional): increment of U returned by update_gray_scott. Defaults to None.
+        delta_v (Optional[np.ndarray], optional): increment of V returned by update_gray_scott. Defaults to None.
+    """
+    num_cells = u.size
+    v_mass = v.sum(dtype=np.float64)
+
+    diagnostics['u_mean'][step] = u.sum(dtype=np.float64) / num_cells
+    diagnostics['u_min'][step] = u.min()
+    diagnostics['u_max'][step] = u.max()
+    diagnostics['v_mean'][step] = v_mass / num_cells
+    diagnostics['v_min'][step] = v.min()
+    diagnostics['v_max'][step] = v.max()
+    diagnostics['v_mass'][step] = v_mass
+    diagnostics['l2_change'][step] = np.sqrt(np.vdot(delta_u, delta_u) + np.vdot(delta_v, delta_v)) if delta_u is not None else 0.0
+    diagnostics['active_fraction'][step] = np.count_nonzero(v > ACTIVE_V_THRESHOLD) / num_cells
+
+###############################################################################
+# Health checks
+###############################################################################
+
+SIMULATION_STATUSES = ['ok', 'diverged', 'dead']
+UNHEALTHY_POLICIES = ['keep', 'exclude', 'resample']
+# a run whose activator never exceeds this anywhere has decayed to the trivial u=1, v=0 state
+DEAD_V_THRESHOLD = 1e-6
+
+def check_simulation_health(u: np.ndarray, v: np.ndarray) -> str:
+    """Classify the current fields with two reductions, NaN and Inf propagate into the sums
+
+    Args:
+        u (np.ndarray): concentration U
+        v (np.ndarray): concentration V
+
+    Returns:
+        str: 'diverged' for non-finite values, 'dead' if v died out, otherwise 'ok'
+    """
+    if not np.isfinite(u.sum(dtype=np.float64) + v.sum(dtype=np.float64)):
+        return 'diverged'
+    if v.max() < DEAD_V_THRESHOLD:
+        return 'dead'
+    return 'ok'
 
 ###############################################################################
 # Single simulation 
@@ -17,6 +97,15 @@ def run_grayscott_simulation(
     patch_radius: int = 2,
     patch_prob: float = 0.5,
     save_states: Optional[Tuple[str, int]|Tuple[str]] = [("first", 20), ("interval", 10)],
+    checkpoint_path: Optional[str] = None,
+    checkpoint_every: Optional[int] = None,
+    diagnostics: bool = False,
+    health_check_every: Optional[int] = None,
+    attempt: int = 0,
+    replay_every: Optional[int] = None,
+    cache: Optional[SimulationCache] = None,
+    timer: Optional[PhaseTimer] = None,
+    progress: Optional[WorkerProgress] = None,
 ) -> Dict[str, Any]:
     """Run a single Gray-Scott simulation given sim_config and a random seed
 
@@ -27,46 +116,152 @@ def run_grayscott_simulation(
         patch_radius (int): radius in pixels per patch
         patch_prob (float): probability a patch is placed or not
         save_states (Optional[Tuple[str, int] | Tuple[str]], optional): save states predicate config list. Defaults to [("first", 20), ("interval", 10)].
+        checkpoint_path (Optional[str], optional): npz file to resume from and write checkpoints to. Defaults to None.
+        checkpoint_every (Optional[int], optional): iterations between checkpoints of u, v and saved frames. Defaults to None.
+        diagnostics (bool, optional): record per-iteration scalars of u and v. Defaults to False.
+        health_check_every (Optional[int], optional): iterations between checks that stop diverged or dead runs early. Defaults to None.
+        attempt (int, optional): resample number of the seed, attempt > 0 draws new initial fields and parameters. Defaults to 0.
+        replay_every (Optional[int], optional): iterations between sparse replay states that intermediate steps are re-simulated from. Defaults to None.
+        cache (Optional[SimulationCache], optional): cache of earlier runs to serve or continue states from, unused with diagnostics. Defaults to None.
+        timer (Optional[PhaseTimer], optional): collects the time per phase and the cell updates when profiling. Defaults to None.
+        progress (Optional[WorkerProgress], optional): shared counters the iterations are published to. Defaults to None.
 
     Returns:
         Dict[str, Any]: 
-            - 'meta': configuration and seed
+            - 'meta': configuration, seed, attempt and status, total_iterations is the last iteration run
             - 'image': contains u_init, v_init, optional v_frames, and u_final/v_final
+            - 'metric': per-iteration diagnostics time series, only if diagnostics is on
+            - 'replay': u and v every replay_every iterations, only if replay_every is set
     """
+    timer = timer or NULL_TIMER
+    progress = progress or NULL_PROGRESS
     rng = np.random.default_rng(seed) if seed is not None else np.random.default_rng(seed)
+    if attempt:
+        rng = np.random.default_rng([seed, attempt])
 
     # Generate initial conditions
-    u_init, v_init = create_initial_fields(
-        grid_length,
-        patch_radius,
-        patch_prob,
-        rng=rng
-    )
+    with timer.phase('initial_conditions'):
+        u_init, v_init = create_initial_fields(
+            grid_length,
+            patch_radius,
+            patch_prob,
+            rng=rng
+        )
 
-    pattern, params = get_random_pattern(rng)   
+        pattern, params = get_random_pattern(rng)   
 
     # Prepare to collect intermediate v-frames
     v_frames: Dict[str, np.ndarray] = {}
     u_frames: Dict[str, np.ndarray] = {}
+    replay_frames: Dict[str, np.ndarray] = {}
     u, v = u_init.copy(), v_init.copy()
 
     save_states_predicate = create_save_states_predicate(save_states)
 
-    for iteration in range(1,max_iterations+1):
-        update_gray_scott(
-            u,
-            v,
-            **params
-        )
+    series = allocate_diagnostics(max_iterations) if diagnostics else None
+    if series is not None:
+        record_diagnostics(series, 0, u, v)
+
+    is_replay_step = lambda i: bool(replay_every) and i % replay_every == 0 and i < max_iterations
+
+    # continue from the last checkpoint, the initial fields and pattern are reproduced by the seed
+    start_iteration = 1
+    if checkpoint_path is not None and os_path.exists(checkpoint_path):
+        u, v, start_iteration, saved = load_simulation_checkpoint(checkpoint_path)
+        u_frames, v_frames, replay_frames = saved.get('u_frames', {}), saved.get('v_frames', {}), saved.get('replay', {})
+        if series is not None:
+            for key, values in saved.get('metric', {}).items():
+                series[key][:len(values)] = values
 
-        if save_states_predicate(iteration):
-            v_frames[f"v_state_{int(iteration)}"] = v.copy()
-            u_frames[f"u_state_{int(iteration)}"] = u.copy()
+    # otherwise continue from the furthest cached state that has every state needed before it,
+    # diagnostics need every step so they always simulate
+    cache_key = None
+    if cache is not None and series is None:
+        cache_key = simulation_cache_key(seed, attempt=attempt, grid_length=grid_length, patch_radius=patch_radius, patch_prob=patch_prob)
+    if cache_key is not None and start_iteration == 1:
+        with timer.phase('cache'):
+            cached_states = cache.load(cache_key)
+        needed_steps = [i for i in range(1, max_iterations + 1) if save_states_predicate(i) or is_replay_step(i)]
+        restart = find_restart_step(list(cached_states), needed_steps, max_iterations)
+        for step in (s for s in needed_steps if s <= restart):
+            cached_u, cached_v = cached_states[step]
+            if save_states_predicate(step):
+                v_frames[f"v_state_{step}"], u_frames[f"u_state_{step}"] = cached_v, cached_u
+            if is_replay_step(step):
+                replay_frames[f"u_state_{step}"], replay_frames[f"v_state_{step}"] = cached_u, cached_v
+        if restart:
+            u, v = (array.copy() for array in cached_states[restart])
+            start_iteration = restart + 1
+            logger.debug("Seed %d attempt %d: continuing from cached iteration %d", seed, attempt, restart)
 
-    u_final, v_final = u.copy(), v.copy()
+    status = 'ok'
+    iteration = start_iteration - 1
+    reported = iteration
+    # nested phases are not counted as solver time
+    with timer.phase('solver'):
+        for iteration in range(start_iteration, max_iterations+1):
+            delta_u, delta_v = update_gray_scott(
+                u,
+                v,
+                **params
+            )
+
+            if series is not None:
+                record_diagnostics(series, iteration, u, v, delta_u, delta_v)
+
+            if health_check_every and iteration % health_check_every == 0:
+                status = check_simulation_health(u, v)
+                if status != 'ok':
+                    logger.debug("Seed %d attempt %d: simulation %s at iteration %d, stopping early", seed, attempt, status, iteration)
+                    break
+
+            if save_states_predicate(iteration):
+                with timer.phase('frame_copies'):
+                    v_frames[f"v_state_{int(iteration)}"] = v.copy()
+                    u_frames[f"u_state_{int(iteration)}"] = u.copy()
+
+            if is_replay_step(iteration):
+                with timer.phase('frame_copies'):
+                    replay_frames[f"u_state_{int(iteration)}"] = u.copy()
+                    replay_frames[f"v_state_{int(iteration)}"] = v.copy()
+
+            if checkpoint_every and checkpoint_path is not None and iteration % checkpoint_every == 0 and iteration < max_iterations:
+                saved = {'u_frames': u_frames, 'v_frames': v_frames, 'replay': replay_frames}
+                if series is not None:
+                    saved['metric'] = {key: values[:iteration + 1] for key, values in series.items()}
+                with timer.phase('checkpoints'):
+                    save_simulation_checkpoint(checkpoint_path, u, v, iteration, saved)
+
+            if iteration % PROGRESS_UPDATE_EVERY == 0:
+                progress.advance(iteration - reported)
+                reported = iteration
+    timer.count('cell_updates', u.size * (iteration - start_iteration + 1))
+    progress.advance(iteration - reported)
+
+    # one last check covers the iterations after the last periodic check
+    if status == 'ok':
+        status = check_simulation_health(u, v)
+
+    with timer.phase('frame_copies'):
+        u_final, v_final = u.copy(), v.copy()
+
+    # only healthy trajectories are worth continuing
+    if cache_key is not None and status == 'ok':
+        states = {iteration: (u_final, v_final)}
+        for key, frame in u_frames.items():
+            step = int(key.rsplit('_', 1)[1])
+            states[step] = (frame, v_frames[f"v_state_{step}"])
+        for key, frame in replay_frames.items():
+            step = int(key.rsplit('_', 1)[1])
+            if key.startswith('u_'):
+                states[step] = (frame, replay_frames[f"v_state_{step}"])
+        with timer.phase('cache'):
+            cache.store(cache_key, states)
 
     meta: Dict[str, Any] = {
         'random_seed': seed,
+        'attempt': attempt,
+        'status': status,
         'grid_length': grid_length,
         'max_iterations': max_iterations,
         'total_iterations': iteration,
@@ -85,7 +280,63 @@ def run_grayscott_simulation(
         **v_frames
     }
 
-    return {'image': images, 'meta': meta}
+    result = {'image': images, 'meta': meta}
+    if series is not None:
+        result['metric'] = {key: values[:iteration + 1] for key, values in series.items()}
+    if replay_every:
+        meta['replay_every'] = replay_every
+        result['replay'] = replay_frames
+
+    return result
+
+###############################################################################
+# Checkpoints
+###############################################################################
+
+def save_simulation_checkpoint(
+    file_path: str,
+    u: np.ndarray,
+    v: np.ndarray,
+    iteration: int,
+    saved: Dict[str, Dict[str, np.ndarray]]
+) -> None:
+    """Atomically write the simulation state after an iteration, including everything saved so far
+
+    Args:
+        file_path (str): npz checkpoint file
+        u (np.ndarray): concentration U
+        v (np.ndarray): concentration V
+        iteration (int): last completed iteration
+        saved (Dict[str, Dict[str, np.ndarray]]): arrays saved so far by name, e.g. 'u_frames', 'v_frames', 'metric' and 'replay'
+    """
+    arrays = {f"{name}/{key}": value for name, values in saved.items() for key, value in values.items()}
+    save_to_npz(file_path, {'u': u, 'v': v, 'iteration': np.array(iteration), **arrays})
+
+
+def load_simulation_checkpoint(file_path: str) -> Tuple[np.ndarray, np.ndarray, int, Dict[str, Dict[str, np.ndarray]]]:
+    """Read a checkpoint written by save_simulation_checkpoint
+
+    Args:
+        file_path (str): npz checkpoint file
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int, Dict[str, Dict[str, np.ndarray]]]: u, v, next iteration and the saved arrays by name
+    """
+    arrays = read_from_npz(file_path)
+    u, v, iteration = arrays.pop('u'), arrays.pop('v'), int(arrays.pop('iteration'))
+    saved: Dict[str, Dict[str, np.ndarray]] = {}
+    for array_name, value in arrays.items():
+        name, key = array_name.split('/', 1)
+        saved.setdefault(name, {})[key] = value
+    return u, v, iteration + 1, saved
+
+
+def get_checkpoint_path(checkpoint_dir: Optional[str], seed: int, attempt: int = 0) -> Optional[str]:
+    """Return the checkpoint file of a seed attempt inside checkpoint_dir, or None if checkpoints are off"""
+    if checkpoint_dir is None:
+        return None
+    file_name = f"seed_{seed}.npz" if attempt == 0 else f"seed_{seed}_attempt{attempt}.npz"
+    return os_path.join(checkpoint_dir, file_name)
 
 ###############################################################################
 # Generate batches
@@ -99,7 +350,19 @@ def generate_grayscott_maps(
     max_iterations: int,
     patch_radius: int,
     patch_prob: float,
-    save_states: Optional[List]
+    save_states: Optional[List],
+    checkpoint_dir: Optional[str] = None,
+    checkpoint_every: Optional[int] = None,
+    diagnostics: bool = False,
+    spectral_features: bool = False,
+    health_check_every: Optional[int] = None,
+    unhealthy: str = 'keep',
+    max_resamples: int = 3,
+    replay_every: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: int = DEFAULT_CACHE_BYTES,
+    timer: Optional[PhaseTimer] = None,
+    progress: Optional[WorkerProgress] = None
 ) -> List[Dict[str, Any]]:
     """Run a batch of several Gray-Scott simulation given sim_config and a random seed
 
@@ -110,6 +373,18 @@ def generate_grayscott_maps(
         max_iterations (int, optional): maximum euler steps. Defaults to 1000.
         patch_radius (int): radius in pixels per patch
         patch_prob (float): probability a patch is placed or not
+        checkpoint_dir (Optional[str], optional): folder for per seed checkpoints. Defaults to None.
+        checkpoint_every (Optional[int], optional): iterations between checkpoints. Defaults to None.
+        diagnostics (bool, optional): record per-iteration scalars of u and v. Defaults to False.
+        spectral_features (bool, optional): add power spectrum, wavelength, spot count and anisotropy of the final v. Defaults to False.
+        health_check_every (Optional[int], optional): iterations between health checks of each run. Defaults to None.
+        unhealthy (str, optional): 'keep', 'exclude' or 'resample' diverged and dead runs. Defaults to 'keep'.
+        max_resamples (int, optional): new attempts per seed before an unhealthy seed is excluded. Defaults to 3.
+        replay_every (Optional[int], optional): iterations between sparse replay states. Defaults to None.
+        cache_dir (Optional[str], optional): folder of the simulation cache. Defaults to None.
+        cache_max_bytes (int, optional): size the simulation cache is trimmed to. Defaults to DEFAULT_CACHE_BYTES.
+        timer (Optional[PhaseTimer], optional): collects the time per phase when profiling. Defaults to None.
+        progress (Optional[WorkerProgress], optional): shared counters of finished seeds and iterations. Defaults to None.
 
     Returns:
         List[Dict[str, Any]]: List of simulation records
@@ -119,12 +394,36 @@ def generate_grayscott_maps(
         'max_iterations': max_iterations,
         'patch_radius': patch_radius,
         'patch_prob': patch_prob,
-        'save_states': save_states
+        'save_states': save_states,
+        'diagnostics': diagnostics,
+        'health_check_every': health_check_every,
+        'replay_every': replay_every,
+        'cache': SimulationCache(cache_dir, cache_max_bytes) if cache_dir else None,
+        'timer': timer,
+        'progress': progress
     }
 
+    num_attempts = max_resamples + 1 if unhealthy == 'resample' else 1
+
     results: List[Dict[str, Any]] = []
     for seed in range(min_seed, max_seed + 1):
-        result = run_grayscott_simulation(seed, **sim_config)
+        for attempt in range(num_attempts):
+            checkpoint_path = get_checkpoint_path(checkpoint_dir, seed, attempt)
+            result = run_grayscott_simulation(seed, checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every, attempt=attempt, **sim_config)
+            status = result['meta']['status']
+            if status == 'ok':
+                break
+            logger.warning(f"Seed {seed} attempt {attempt}: simulation {status} at iteration {result['meta']['total_iterations']}")
+
+        (progress or NULL_PROGRESS).seed_done()
+        if status != 'ok' and unhealthy != 'keep':
+            logger.warning(f"Seed {seed}: excluded from the dataset after {num_attempts} unhealthy attempt(s)")
+            continue
         results.append(result)
 
+    # one batched pass over the final states while they are still in memory
+    if spectral_features:
+        with (timer or NULL_TIMER).phase('features'):
+            add_spectral_features(results)
+
     return results
@@ -1,5 +1,9 @@
 from utilities import Any, Dict, List, Optional, Tuple, np
 
+# bump whenever a change to the initial fields or the update step changes simulated states,
+# cached simulation results of other versions are then never reused
+SOLVER_VERSION = 1
+
 ###############################################################################
 # Initial conditions
 ###############################################################################
@@ -174,7 +178,7 @@ def update_gray_scott(
     dv: float,
     feed: float,
     kill: float,
-) -> None:
+) -> Tuple[np.ndarray, np.ndarray]:
     """Advance the concentrations one Euler step in-place on U and V.
 
     Args:
@@ -184,16 +188,24 @@ def update_gray_scott(
         dv (float): coefficient for V
         feed (float): feed rate
         kill (float): kill rate
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the increments added to U and V, free to reuse for step diagnostics
     """
     lap_u = compute_laplacian(conc_u)
     lap_v = compute_laplacian(conc_v)
 
     reaction = conc_u * (conc_v**2)     # u·v²
 
-    conc_u += (du * lap_u               # D_u ∇²u
+    delta_u = (du * lap_u               # D_u ∇²u
             - reaction                  # – u·v²
             + feed * (1.0 - conc_u))    # + F(1−u)
 
-    conc_v += (dv * lap_v               # D_v ∇²v
+    delta_v = (dv * lap_v               # D_v ∇²v
             + reaction                  # + u·v²
-            - (feed + kill) * conc_v)   # – (F+k)·v
\ No newline at end of file
+            - (feed + kill) * conc_v)   # – (F+k)·v
+
+    conc_u += delta_u
+    conc_v += delta_v
+
+    return delta_u, delta_v
\ No newline at end of file
@@ -0,0 +1,141 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from utilities import Any, Dict, List, Optional, os_path, DEFAULT_DATAFILE_EXT
+
+###############################################################################
+# Phase timers
+###############################################################################
+
+PROFILE_PHASES = ['initial_conditions', 'solver', 'frame_copies', 'checkpoints', 'cache', 'features',
+                  'statistics', 'hdf5_write', 'merge', 'normalize', 'json_save']
+
+class PhaseTimer:
+    """Accumulate wall time and calls per phase plus counters such as cell updates and bytes written
+
+    Phases can be nested, a phase only keeps the time not spent in the phases inside it,
+    so the solver loop does not count the frame copies it makes.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._nested: List[float] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the body of a with statement as one call of a phase
+
+        Args:
+            name (str): phase name, see PROFILE_PHASES
+        """
+        self._nested.append(0.0)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self.seconds[name] += elapsed - self._nested.pop()
+            self.calls[name] += 1
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Add value to a counter"""
+        self.counters[name] += int(value)
+
+    def merge(self, timings: Dict[str, Dict[str, Any]]) -> "PhaseTimer":
+        """Add the timings of another timer, e.g. one returned by a worker
+
+        Args:
+            timings (Dict[str, Dict[str, Any]]): output of as_dict
+
+        Returns:
+            PhaseTimer: this timer
+        """
+        for name, seconds in timings['seconds'].items():
+            self.seconds[name] += seconds
+        for name, calls in timings['calls'].items():
+            self.calls[name] += calls
+        for name, value in timings['counters'].items():
+            self.counters[name] += value
+        return self
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Return the picklable and JSON serializable 'seconds', 'calls' and 'counters'"""
+        return {'seconds': dict(self.seconds), 'calls': dict(self.calls), 'counters': dict(self.counters)}
+
+
+class NullTimer:
+    """Timer that records nothing, phases cost one shared no-op context"""
+
+    _context = nullcontext()
+
+    def phase(self, name: str):
+        return self._context
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+###############################################################################
+# Report
+###############################################################################
+
+def get_profile_file_path(data_file: str) -> str:
+    """Return the profile report that belongs to a dataset file, next to its global statistics"""
+    data_name = os_path.basename(data_file).split('.')[0]
+    return os_path.join(os_path.dirname(data_file), f"profile_{DEFAULT_DATAFILE_EXT}_{data_name}.json")
+
+
+def get_worker_profile_path(output_folder: str, worker_name: str) -> str:
+    """Return the cProfile dump of a worker process, readable with pstats or snakeviz"""
+    return os_path.join(output_folder, f"profile_{worker_name}.prof")
+
+
+def build_profile_report(
+    timer: PhaseTimer,
+    wall_seconds: float,
+    worker_timings: Optional[List[Dict[str, Dict[str, Any]]]] = None
+) -> Dict[str, Any]:
+    """Summarize aggregated timings into throughput rates and per-phase shares
+
+    Worker phases run in parallel, so their seconds add up to more than the wall time of a run with
+    several workers; percentages are shares of the summed phase time.
+
+    Args:
+        timer (PhaseTimer): timings of the parent with the worker timings merged in
+        wall_seconds (float): wall time of the whole run
+        worker_timings (Optional[List[Dict[str, Dict[str, Any]]]], optional): per worker timings. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: 'wall_seconds', 'throughput', 'counters', 'phases' and 'workers'
+    """
+    total_seconds = sum(timer.seconds.values()) or 1.0
+    ordered = [name for name in PROFILE_PHASES if name in timer.seconds]
+    ordered += sorted(name for name in timer.seconds if name not in PROFILE_PHASES)
+    phases = {
+        name: {
+            'seconds': timer.seconds[name],
+            'calls': timer.calls[name],
+            'percent': 100.0 * timer.seconds[name] / total_seconds
+        }
+        for name in ordered
+    }
+
+    rate = lambda value: value / wall_seconds if wall_seconds > 0 else 0.0
+    counters = dict(timer.counters)
+    return {
+        'wall_seconds': wall_seconds,
+        'throughput': {
+            'cell_updates_per_second': rate(counters.get('cell_updates', 0)),
+            'records_per_second': rate(counters.get('records', 0)),
+            'bytes_written_per_second': rate(counters.get('bytes_written', 0))
+        },
+        'counters': counters,
+        'phases': phases,
+        'workers': worker_timings or []
+    }
@@ -1,42 +1,45 @@
 from os import getppid, path, makedirs
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Queue, parent_process
 from sys import exit, stderr, stdout
-from inspect import stack
-import pandas as pd
+from datetime import datetime
+from time import monotonic
 
 global_logger = None
 global_logger_handler = None
+global_log_listener = None
+
+# minimum seconds between two progress messages with the same key
+PROGRESS_INTERVAL = 30.0
+last_progress_times = {}
 
 class LoggerHandler:
     def __init__(self, logger):
         self.logger = logger
 
-    def _log_message(self, log_func, msg, stack_level=2, exc_info=False):
-        if stack_level:
-            frame=stack()[stack_level]
-            filename = path.basename(frame.filename)
-            function_name = frame.function
-            lineno = frame.lineno
-            log_func(f"[{filename}:{function_name}:{lineno}] || {msg}", exc_info=exc_info)
-        else:
-            log_func(msg, exc_info=exc_info)
-
-    def critical(self, msg: str = "unknown critical msg"):
-        self._log_message(self.logger.critical, msg, exc_info=True)
+    def _log_message(self, level, msg, *args, stack_level=2, exc_info=False):
+        # disabled levels return before any formatting, %-style args are only formatted by enabled handlers
+        if self.logger.isEnabledFor(level):
+            # stacklevel makes the record report the caller stack_level frames up instead of this method
+            self.logger.log(level, msg, *args, exc_info=exc_info, stacklevel=stack_level + 1)
+
+    def critical(self, msg: str = "unknown critical msg", *args):
+        self._log_message(logging.CRITICAL, msg, *args, exc_info=True)
         exit(-1)
 
-    def error(self, msg: str = "unknown error msg"):
-        self._log_message(self.logger.error, msg, exc_info=True)
+    def error(self, msg: str = "unknown error msg", *args):
+        self._log_message(logging.ERROR, msg, *args, exc_info=True)
         exit(-1)
 
-    def warning(self, msg: str = "unknown warning msg"):
-        self._log_message(self.logger.warning, msg)
+    def warning(self, msg: str = "unknown warning msg", *args):
+        self._log_message(logging.WARNING, msg, *args)
 
-    def info(self, msg: str = "unknown info msg"):
-        self._log_message(self.logger.info, msg)
+    def info(self, msg: str = "unknown info msg", *args):
+        self._log_message(logging.INFO, msg, *args)
 
-    def debug(self, msg: str = "unknown debug msg"):
-        self._log_message(self.logger.debug, msg)
+    def debug(self, msg: str = "unknown debug msg", *args):
+        self._log_message(logging.DEBUG, msg, *args)
 
 
 def setup_logger(program_file, log_stdout=False, log_stderr=True):
@@ -48,19 +51,22 @@ def setup_logger(program_file, log_stdout=False, log_stderr=True):
 
     module_name = path.basename(program_file).replace(".py", "")
     
-    unique_id = f"{module_name}_ppid{getppid()}_{pd.Timestamp.now().strftime('%Y%m%d-%H%M%S')}"
+    unique_id = f"{module_name}_ppid{getppid()}_{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     log_file = f"{unique_id}.log"
-    makedirs("logs", exist_ok=True)
     logs_path = f"logs/{log_file}"
+    if parent_process() is None:
+        makedirs("logs", exist_ok=True)
 
     logger = logging.getLogger(module_name)
     logger.setLevel(logging.INFO)
-    
-    handler = logging.FileHandler(logs_path)
-    handler.setLevel(logging.INFO)
     formatter = logging.Formatter('[%(asctime)s] || [%(levelname)s] || [%(filename)s:%(funcName)s:%(lineno)d] || %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+
+    # spawned children log through the queue of the parent, see attach_log_queue
+    if parent_process() is None:
+        handler = logging.FileHandler(logs_path)
+        handler.setLevel(logging.INFO)
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
     
     if log_stdout:
         stdout_handler = logging.StreamHandler(stdout)
@@ -88,4 +94,53 @@ def set_logger_level(level:int=20):
             if isinstance(handler, logging.FileHandler):
                 handler.setLevel(level)
             #global_logger.info(f"Handler: {handler}, Level: {handler.level}")
-        global_logger.info(f"Logger level set to {logging._levelToName[level]}")
\ No newline at end of file
+        global_logger.info(f"Logger level set to {logging._levelToName[level]}")
+
+
+# logs an info message at most once per interval seconds for each key, the others are dropped unformatted
+def log_progress(msg, *args, key="progress", interval=None):
+    now = monotonic()
+    interval = PROGRESS_INTERVAL if interval is None else interval
+    if now - last_progress_times.get(key, float("-inf")) >= interval:
+        last_progress_times[key] = now
+        global_logger.info(msg, *args, stacklevel=2)
+
+
+def get_logger_level():
+    return global_logger.level
+
+
+# moves the handlers of the parent logger behind one listener thread, records of the parent and of every
+# worker attached to the returned queue are written in the order they arrive to a single log
+def start_log_listener():
+    global global_log_listener
+    if global_log_listener is None:
+        handlers = list(global_logger.handlers)
+        log_queue = Queue()
+        global_log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        for handler in handlers:
+            global_logger.removeHandler(handler)
+        global_logger.addHandler(QueueHandler(log_queue))
+        global_log_listener.start()
+    return global_log_listener.queue
+
+
+# flushes the queued records and gives the handlers back to the parent logger
+def stop_log_listener():
+    global global_log_listener
+    if global_log_listener is not None:
+        for handler in list(global_logger.handlers):
+            if isinstance(handler, QueueHandler):
+                global_logger.removeHandler(handler)
+        global_log_listener.stop()
+        for handler in global_log_listener.handlers:
+            global_logger.addHandler(handler)
+        global_log_listener = None
+
+
+# replaces the handlers a worker inherited or created with one that sends its records to the parent listener
+def attach_log_queue(log_queue, level=logging.INFO):
+    for handler in list(global_logger.handlers):
+        global_logger.removeHandler(handler)
+    global_logger.addHandler(QueueHandler(log_queue))
+    global_logger.setLevel(level)
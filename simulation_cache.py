@@ -0,0 +1,170 @@
+from setup_logger import setup_logger
+logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
+from hashlib import sha256
+from json import dumps
+from os import utime, stat
+from utilities import (Any, Dict, List, Optional, Tuple, np, glob, os_path, makedirs,
+                        save_to_npz, read_from_npz, remove_if_exists)
+from greyscott_solvers import SOLVER_VERSION
+from greyscott_patterns import GREY_SCOTT_PATTERNS
+
+###############################################################################
+# Simulation cache
+###############################################################################
+
+DEFAULT_CACHE_BYTES = 10 * (1 << 30)
+# stores between two full scans of the cache folder, catches up with entries written by other processes
+EVICT_SCAN_EVERY = 64
+
+def simulation_cache_key(
+    seed: int,
+    *,
+    attempt: int = 0,
+    grid_length: int,
+    patch_radius: int,
+    patch_prob: float
+) -> str:
+    """Hash everything that determines a trajectory, the pattern parameters are drawn from the seed
+
+    Args:
+        seed (int): random seed
+        attempt (int, optional): resample number of the seed. Defaults to 0.
+        grid_length (int): length of grid in pixels
+        patch_radius (int): radius in pixels per patch
+        patch_prob (float): probability a patch is placed or not
+
+    Returns:
+        str: hex digest naming the cache entry
+    """
+    config = {
+        'seed': seed,
+        'attempt': attempt,
+        'grid_length': grid_length,
+        'patch_radius': patch_radius,
+        'patch_prob': patch_prob,
+        'patterns': GREY_SCOTT_PATTERNS,
+        'solver_version': SOLVER_VERSION
+    }
+    return sha256(dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class SimulationCache:
+    """On-disk cache of simulated states by step, one npz file per trajectory with LRU eviction by size
+
+    Every cached step holds both U and V, so any cached step is a point the simulation can continue from.
+    Entries are rewritten atomically, hits refresh the modification time that eviction orders by.
+    Each process keeps a running total of the cache size and only scans the folder when the total
+    exceeds max_bytes or every scan_every stores.
+
+    Args:
+        cache_dir (str): folder of the cache entries, created if needed
+        max_bytes (int, optional): total size the cache is trimmed to. Defaults to 10 GiB.
+        scan_every (int, optional): stores between two full scans. Defaults to EVICT_SCAN_EVERY.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_BYTES, scan_every: int = EVICT_SCAN_EVERY):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.scan_every = scan_every
+        # unknown until the first scan
+        self._total_bytes: Optional[int] = None
+        self._stores_since_scan = 0
+        makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os_path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key: str) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Return the cached (u, v) states by step, empty on a miss
+
+        Args:
+            key (str): entry from simulation_cache_key
+
+        Returns:
+            Dict[int, Tuple[np.ndarray, np.ndarray]]: u and v after each cached step
+        """
+        entry_path = self._entry_path(key)
+        try:
+            arrays = read_from_npz(entry_path)
+            utime(entry_path)
+        except (OSError, ValueError):
+            # missing, evicted by another task or partially written
+            return {}
+        steps = sorted(int(name[2:]) for name in arrays if name.startswith('u_'))
+        return {step: (arrays[f"u_{step}"], arrays[f"v_{step}"]) for step in steps}
+
+    def store(self, key: str, states: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> None:
+        """Merge states into the entry and trim the cache once it may exceed its size limit
+
+        Args:
+            key (str): entry from simulation_cache_key
+            states (Dict[int, Tuple[np.ndarray, np.ndarray]]): u and v after each step to keep
+        """
+        merged = self.load(key)
+        if all(step in merged for step in states):
+            return
+        merged.update(states)
+        arrays = {}
+        for step, (u, v) in merged.items():
+            arrays[f"u_{step}"], arrays[f"v_{step}"] = u, v
+        entry_path = self._entry_path(key)
+        old_bytes = self._entry_size(entry_path)
+        save_to_npz(entry_path, arrays)
+
+        self._stores_since_scan += 1
+        if self._total_bytes is not None:
+            self._total_bytes += self._entry_size(entry_path) - old_bytes
+        if self._total_bytes is None or self._total_bytes > self.max_bytes or self._stores_since_scan >= self.scan_every:
+            self.evict()
+
+    @staticmethod
+    def _entry_size(entry_path: str) -> int:
+        try:
+            return stat(entry_path).st_size
+        except OSError:
+            return 0
+
+    def evict(self) -> None:
+        """Scan the cache and remove the least recently used entries until it fits in max_bytes"""
+        entries = []
+        for entry_path in glob(os_path.join(self.cache_dir, "*.npz")):
+            try:
+                info = stat(entry_path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, entry_path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                remove_if_exists(entry_path)
+            except OSError:
+                continue
+            total_bytes -= size
+            logger.debug("Evicted simulation cache entry %s", entry_path)
+
+        self._total_bytes = total_bytes
+        self._stores_since_scan = 0
+
+
+def find_restart_step(cached_steps: List[int], needed_steps: List[int], max_iterations: int) -> int:
+    """Return the furthest cached step to continue from so that every needed step before it is cached
+
+    Args:
+        cached_steps (List[int]): steps with cached u and v
+        needed_steps (List[int]): steps whose states the run has to return
+        max_iterations (int): last step of the run
+
+    Returns:
+        int: restart step, 0 means simulating from the initial fields
+    """
+    cached = set(cached_steps)
+    restart = 0
+    for step in sorted(s for s in cached if s <= max_iterations):
+        if all(s in cached for s in needed_steps if s <= step):
+            restart = step
+        else:
+            break
+    return restart
@@ -0,0 +1,196 @@
+from setup_logger import setup_logger
+logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
+from datetime import datetime
+from multiprocessing.sharedctypes import RawArray
+from threading import Event, Thread
+from time import perf_counter
+from utilities import Any, Dict, List, Optional, save_to_json
+
+###############################################################################
+# Shared progress counters
+###############################################################################
+
+PROGRESS_FIELDS = ['seeds_completed', 'iterations_done', 'bytes_written', 'run_iterations']
+# solver iterations between two updates of the shared counters
+PROGRESS_UPDATE_EVERY = 100
+DEFAULT_PROGRESS_EVERY = 60.0
+
+class WorkerProgress:
+    """Counters of one worker in a shared array, only this worker writes its slot so no lock is needed
+
+    Args:
+        values (RawArray): shared int64 array with one slot of PROGRESS_FIELDS per worker
+        worker (int): slot of the worker
+    """
+
+    def __init__(self, values, worker: int):
+        self.values = values
+        self.offset = worker * len(PROGRESS_FIELDS)
+
+    def advance(self, iterations: int) -> None:
+        """Count solver iterations of the run in progress"""
+        self.values[self.offset + 1] += iterations
+        self.values[self.offset + 3] += iterations
+
+    def seed_done(self) -> None:
+        """Count a finished seed, kept or excluded, and start the next run at zero"""
+        self.values[self.offset] += 1
+        self.values[self.offset + 3] = 0
+
+    def wrote(self, num_bytes: int) -> None:
+        """Count bytes written to disk"""
+        self.values[self.offset + 2] += num_bytes
+
+
+class NullProgress:
+    """Progress that publishes nothing"""
+
+    def advance(self, iterations: int) -> None:
+        pass
+
+    def seed_done(self) -> None:
+        pass
+
+    def wrote(self, num_bytes: int) -> None:
+        pass
+
+
+NULL_PROGRESS = NullProgress()
+
+
+class ProgressCounters:
+    """Shared memory counters of a pool of workers, workers get their slot from worker()
+
+    Args:
+        num_workers (int): number of worker slots
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self.values = RawArray('q', num_workers * len(PROGRESS_FIELDS))
+
+    def worker(self, worker: int) -> WorkerProgress:
+        """Return the counters a worker publishes to, picklable as a Process argument"""
+        return WorkerProgress(self.values, worker)
+
+    def read(self) -> List[Dict[str, int]]:
+        """Return a snapshot of the counters of every worker"""
+        num_fields = len(PROGRESS_FIELDS)
+        values = self.values[:]
+        return [dict(zip(PROGRESS_FIELDS, values[w * num_fields:(w + 1) * num_fields])) for w in range(self.num_workers)]
+
+###############################################################################
+# Monitor
+###############################################################################
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Format seconds as e.g. '2h05m' or '4m12s', '?' if unknown"""
+    if seconds is None:
+        return "?"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class ProgressMonitor:
+    """Thread in the parent that periodically logs the aggregate rate and ETA and writes a status file
+
+    Work is measured in iterations, a finished seed counts as max_iterations no matter how many it ran
+    (cache hits, early stops), so the ETA stays right when runs end early.
+
+    Args:
+        counters (ProgressCounters): counters the workers publish to
+        total_seeds (int): seeds the workers have to simulate
+        max_iterations (int): iterations per seed
+        interval (float, optional): seconds between reports, 0 only writes the final status. Defaults to 60.
+        status_file (Optional[str], optional): JSON file rewritten atomically with every report. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        counters: ProgressCounters,
+        total_seeds: int,
+        max_iterations: int,
+        interval: float = DEFAULT_PROGRESS_EVERY,
+        status_file: Optional[str] = None
+    ):
+        self.counters = counters
+        self.total_seeds = total_seeds
+        self.max_iterations = max_iterations
+        self.interval = interval
+        self.status_file = status_file
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._started_at = datetime.now()
+        self._start = perf_counter()
+
+    def status(self, state: str = 'running') -> Dict[str, Any]:
+        """Return the aggregate progress, rates and ETA
+
+        Args:
+            state (str, optional): 'running', 'done' or 'failed'. Defaults to 'running'.
+
+        Returns:
+            Dict[str, Any]: machine-readable status
+        """
+        workers = self.counters.read()
+        elapsed = perf_counter() - self._start
+        seeds_completed = sum(w['seeds_completed'] for w in workers)
+        iterations_done = sum(w['iterations_done'] for w in workers)
+        bytes_written = sum(w['bytes_written'] for w in workers)
+
+        total_work = self.total_seeds * self.max_iterations
+        work_done = seeds_completed * self.max_iterations + sum(min(w['run_iterations'], self.max_iterations) for w in workers)
+        work_done = min(work_done, total_work)
+        work_rate = work_done / elapsed if elapsed > 0 else 0.0
+        eta = (total_work - work_done) / work_rate if work_rate > 0 else None
+        if state == 'done':
+            eta = 0.0
+
+        return {
+            'state': state,
+            'started_at': self._started_at.isoformat(timespec='seconds'),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_seconds': elapsed,
+            'total_seeds': self.total_seeds,
+            'seeds_completed': seeds_completed,
+            'iterations_done': iterations_done,
+            'bytes_written': bytes_written,
+            'percent': 100.0 * work_done / total_work if total_work else 100.0,
+            'iterations_per_second': iterations_done / elapsed if elapsed > 0 else 0.0,
+            'seeds_per_second': seeds_completed / elapsed if elapsed > 0 else 0.0,
+            'bytes_written_per_second': bytes_written / elapsed if elapsed > 0 else 0.0,
+            'eta_seconds': eta,
+            'workers': workers
+        }
+
+    def report(self, state: str = 'running') -> Dict[str, Any]:
+        """Log the status and write the status file"""
+        status = self.status(state)
+        logger.info(f"Progress: {status['seeds_completed']}/{status['total_seeds']} seeds ({status['percent']:.1f}%), "
+                    f"{status['iterations_per_second']:.0f} it/s, {status['bytes_written_per_second'] / (1 << 20):.2f} MiB/s, "
+                    f"elapsed {format_duration(status['elapsed_seconds'])}, ETA {format_duration(status['eta_seconds'])}")
+        if self.status_file is not None:
+            save_to_json(self.status_file, status, atomic=True)
+        return status
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self) -> "ProgressMonitor":
+        """Start the reporting thread, nothing is reported periodically if interval is 0"""
+        if self.status_file is not None:
+            save_to_json(self.status_file, self.status(), atomic=True)
+        if self.interval > 0:
+            self._thread = Thread(target=self._run, name="progress_monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, state: str = 'done') -> Dict[str, Any]:
+        """Stop the thread and report the final status"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.report(state)
@@ -141,4 +141,620 @@ def test_all_patterns(seed, samples):
     for record in sample_records:
         file_paths = visualize_patterns(record, output_folder)
         for fp in file_paths:
-            assert os_path.exists(fp), f"Cannot find file path '{fp}'"
\ No newline at end of file
+            assert os_path.exists(fp), f"Cannot find file path '{fp}'"
+
+def test_record_index_query(tmp_path):
+    dataset_file = str(tmp_path / f"{DATATYPE_NAME}_test_index.hdf5")
+
+    result_records = simulate_patterns(7, grid_length=16, max_iterations=20, patch_radius=2, save_states=[("interval", 10)])
+    save_to_hdf5(result_records[:2], dataset_file)
+    save_to_hdf5(result_records[2:], dataset_file)
+
+    index = read_record_index(dataset_file)
+    assert len(index) == len(GREY_SCOTT_PATTERNS), "Index does not cover every record"
+    assert list(index["record"]) == list(range(len(GREY_SCOTT_PATTERNS)))
+    assert all(index["num_frames"] == 4), "Expected initial, 2 saved and final frames per record"
+
+    worms = query_record_index(index, patterns=["worms"])
+    assert len(worms) == 1
+    worms_record = read_from_hdf5(dataset_file, flatten=False, records=worms)[0]
+    assert worms_record["meta"]["pattern_name"] == "worms"
+
+    assert len(query_record_index(index, seed_range=(8, 100))) == 0
+    assert len(query_record_index(index, seed_range=(7, 7), feed=(0.0, 0.04))) == 3
+
+
+def test_split_missing_seed_chunks():
+    existing_seeds = {1, 2, 3, 7}
+    missing_seeds = [seed for seed in range(1, 13) if seed not in existing_seeds]
+    assert compress_seed_ranges(missing_seeds) == [(4, 6), (8, 12)]
+    assert split_seed_chunks(missing_seeds, 3) == [(4, 6), (8, 10), (11, 12)]
+
+
+def test_create_dataset_workers_keep_seed_order_and_resume(monkeypatch, tmp_path):
+    from argparse import Namespace
+    import create_dataset
+    from profiling import get_profile_file_path
+
+    output_path = str(tmp_path)
+    data_path = os_path.join(output_path, "create_dataset_workers")
+    run_args = Namespace(debug_on=False, num_tasks=2, min_seed=1, max_seed=7, seed_step=2, grid_length=16, patch_radius=2,
+                         patch_prob=0.5, max_iterations=20, save_states=[("interval", 10)], output_path=output_path,
+                         output_folder="create_dataset_workers", extend=False, progress_every=0, profile=True)
+    final_file = os_path.join(data_path, f"{DATATYPE_NAME}_16x16_1-7.{DEFAULT_DATAFILE_EXT}")
+
+    # the worker that pulls seeds 3-4 dies, the other one finishes the remaining chunks
+    process_seed_chunk = create_dataset.process_seed_chunk
+    def crash_on_seed_3(data_file, seed_range, *args, **kwargs):
+        if seed_range[0] == 3:
+            raise RuntimeError("worker crashed")
+        return process_seed_chunk(data_file, seed_range, *args, **kwargs)
+    monkeypatch.setattr(create_dataset, 'process_seed_chunk', crash_on_seed_3)
+    with pytest.raises(RuntimeError, match="rerun with --resume"):
+        create_dataset.create_dataset(run_args)
+    monkeypatch.undo()
+
+    worker_files = create_dataset.list_worker_files(final_file)
+    assert 1 <= len(worker_files) <= run_args.num_tasks, "Expected at most one file per worker"
+    assert [chunk['seed_range'] for chunk in create_dataset.list_completed_chunks(final_file)] == [[1, 2], [5, 6], [7, 7]]
+
+    # the manifests were written with other settings
+    run_args.resume, run_args.max_iterations = True, 30
+    with pytest.raises(ValueError, match="Cannot resume"):
+        create_dataset.create_dataset(run_args)
+
+    # only the seeds missing from the manifests are simulated again, also with another seed step
+    run_args.max_iterations, run_args.seed_step = 20, 3
+    create_dataset.create_dataset(run_args)
+    assert read_from_json(get_profile_file_path(final_file))['counters']['records'] == 2
+    assert list(read_record_index(final_file)['random_seed']) == list(range(1, 8)), "Expected records in seed order"
+    assert read_from_json(get_statistics_file_path(final_file))['image']['v_state_final']['shape'][0] == 7
+    assert not glob(os_path.join(data_path, "*_part*")), "Expected worker files and manifests to be removed"
+
+
+def test_simulation_checkpoint_resume(tmp_path):
+    from greyscott_simulation import run_grayscott_simulation
+
+    checkpoint_path = str(tmp_path / "seed_3_checkpoint.npz")
+    sim_args = {'grid_length': 16, 'max_iterations': 30, 'patch_radius': 2, 'save_states': [("interval", 10)]}
+
+    expected = run_grayscott_simulation(3, **sim_args)
+    run_grayscott_simulation(3, checkpoint_path=checkpoint_path, checkpoint_every=10, **sim_args)
+    assert os_path.exists(checkpoint_path), "No checkpoint was written"
+
+    # the last checkpoint is at iteration 20, so this run only simulates the last 10 iterations
+    resumed = run_grayscott_simulation(3, checkpoint_path=checkpoint_path, checkpoint_every=10, **sim_args)
+    assert resumed['image'].keys() == expected['image'].keys()
+    for key, value in expected['image'].items():
+        assert np.array_equal(resumed['image'][key], value), f"'{key}' differs after resuming"
+
+
+def test_pooled_statistics_match_full_data():
+    rng = np.random.default_rng(5)
+    records = [{'image': {'v_state_final': rng.random((8, 8), dtype=np.float32)}, 'metric': {'mass': float(i)}} for i in range(9)]
+    chunks = [compute_local_stats(records[i:i + 4], histogram_bins=20) for i in range(0, len(records), 4)]
+    global_stats = finalize_statistics(reduce_statistics(chunks))
+
+    values = np.stack([r['image']['v_state_final'] for r in records]).astype(np.float64)
+    image_stats = global_stats['image']['v_state_final']
+    assert image_stats['count'] == values.size and image_stats['shape'] == [9, 8, 8]
+    assert np.isclose(image_stats['mean'], values.mean()) and np.isclose(image_stats['std'], values.std())
+    assert (image_stats['min'], image_stats['max']) == (values.min(), values.max())
+    assert sum(image_stats['histogram']) == values.size
+    assert abs(image_stats['percentiles']['p50'] - np.median(values)) < 0.05
+    assert np.isclose(global_stats['metric']['mass']['std'], np.arange(9).std())
+
+
+def _exit_without_result():
+    raise SystemExit(1)
+
+
+def test_worker_results_reduce_to_full_statistics(tmp_path):
+    from create_dataset import process_image_maps
+    from greyscott_simulation import generate_grayscott_maps
+
+    sim_args = {'grid_length': 16, 'max_iterations': 20, 'patch_radius': 2, 'patch_prob': 0.5, 'save_states': [("interval", 10)]}
+    worker_files = [str(tmp_path / f"worker_results_part{i}.hdf5") for i in range(2)]
+
+    task_queue, result_queue = Queue(), Queue()
+    for seed_range in [(1, 2), (3, 3), (4, 5)]:
+        task_queue.put(seed_range)
+    for _ in worker_files:
+        task_queue.put(None)
+
+    # two workers accumulate their chunks, a third one dies without sending a result
+    procs_list = [Process(target=process_image_maps, args=[worker_file, task_queue, result_queue], kwargs=sim_args) for worker_file in worker_files]
+    procs_list.append(Process(target=_exit_without_result))
+    for p in procs_list:
+        p.start()
+    worker_results = collect_worker_results(result_queue, procs_list, timeout=0.2)
+    for p in procs_list:
+        p.join()
+
+    assert len(worker_results) == 2 and procs_list[-1].exitcode == 1
+    pooled = reduce_statistics([worker_stats for worker_stats, _ in worker_results])['image']['v_state_final']
+    expected = compute_local_stats(generate_grayscott_maps(1, 5, **sim_args))['image']['v_state_final']
+    assert pooled['shape'] == expected['shape'] == [5, 16, 16]
+    assert (pooled['min'], pooled['max']) == (expected['min'], expected['max'])
+    assert np.isclose(pooled['mean'], expected['mean']) and np.isclose(pooled['std'], expected['std'])
+
+
+def test_compute_statistics_matches_creation_statistics(tmp_path):
+    from argparse import Namespace
+    from create_dataset import create_dataset
+    from compute_statistics import compute_dataset_statistics
+
+    output_path = str(tmp_path)
+    data_path = os_path.join(output_path, "compute_statistics")
+    create_dataset(Namespace(debug_on=False, num_tasks=1, min_seed=1, max_seed=5, seed_step=5, grid_length=16, patch_radius=2,
+                             patch_prob=0.5, max_iterations=20, save_states=[("interval", 10)], output_path=output_path,
+                             output_folder="compute_statistics", extend=False, progress_every=0, histogram_bins=16,
+                             spectral_features=True))
+    data_file = os_path.join(data_path, f"{DATATYPE_NAME}_16x16_1-5.{DEFAULT_DATAFILE_EXT}")
+    created = read_from_json(get_statistics_file_path(data_file))
+
+    # other chunks and workers than at creation time
+    computed = finalize_statistics(compute_dataset_statistics(data_file, num_workers=2, chunk_size=2, histogram_bins=16), final_step=20)
+    for category in ['image', 'metric']:
+        assert sorted(computed[category]) == sorted(created[category])
+        for key, expected in created[category].items():
+            stats = computed[category][key]
+            assert stats['count'] == expected['count'] and list(stats['shape']) == expected['shape'], f"'{key}' differs"
+            assert (stats['min'], stats['max']) == (expected['min'], expected['max']), f"'{key}' differs"
+            assert np.isclose(stats['mean'], expected['mean']) and np.isclose(stats['std'], expected['std']), f"'{key}' differs"
+            assert stats.get('histogram') == expected.get('histogram'), f"'{key}' histogram differs"
+    assert computed['image']['v_state_final']['percentiles'] == created['image']['v_state_final']['percentiles']
+    assert np.allclose(computed['timestep']['v']['mean'], created['timestep']['v']['mean'])
+
+
+def test_timestep_statistics_table():
+    records = simulate_patterns(11, grid_length=16, max_iterations=20, patch_radius=2, save_states=[("interval", 10)])
+    global_stats = finalize_statistics(compute_local_stats(records), final_step=20)
+
+    v_table = global_stats['timestep']['v']
+    assert v_table['step'] == [0, 10, 20], "Expected the initial, saved and final steps once each"
+    assert v_table['max'][0] == global_stats['image']['v_state_initial']['max']
+    assert v_table['mean'][1] == global_stats['image']['v_state_10']['mean']
+
+
+def test_normalized_images_follow_global_statistics(tmp_path):
+    data_file = str(tmp_path / "normalized_images.hdf5")
+    records = simulate_patterns(31, grid_length=16, max_iterations=20, patch_radius=2, save_states=[("interval", 10)])
+
+    save_to_hdf5(records[:3], data_file, 3)
+    write_normalized_images(data_file, finalize_statistics(compute_local_stats(records[:3])), "minmax")
+    with h5py.File(data_file, 'r') as f:
+        normalized = np.stack([f[key][NORMALIZED_IMAGE_GROUP]['v_state_10'][()] for key in list_record_keys(f)])
+    assert normalized.min() == 0.0 and np.isclose(normalized.max(), 1.0)
+
+    # extending the dataset changes the statistics, every record is normalized again with the merged ones
+    save_to_hdf5(records[3:], data_file, len(records) - 3)
+    global_stats = finalize_statistics(merge_statistics(compute_local_stats(records[:3]), compute_local_stats(records[3:])))
+    write_normalized_images(data_file, global_stats, "standard")
+    with h5py.File(data_file, 'r') as f:
+        assert all(f[key][NORMALIZED_IMAGE_GROUP].attrs['normalization'] == "standard" for key in list_record_keys(f))
+        for image_key in ['u_state_initial', 'v_state_10', 'v_state_final']:
+            normalized = np.stack([f[key][NORMALIZED_IMAGE_GROUP][image_key][()] for key in list_record_keys(f)]).astype(np.float64)
+            assert normalized.shape[0] == len(records)
+            assert abs(normalized.mean()) < 1e-5 and np.isclose(normalized.std(), 1.0, atol=1e-5), f"'{image_key}' is not standardized"
+
+
+def test_fast_gif_renderer(tmp_path):
+    from PIL import Image
+
+    output_folder = str(tmp_path)
+    record = simulate_patterns(13, grid_length=16, max_iterations=25, patch_radius=2, save_states=[("interval", 10)])[0]
+    frames, steps = extract_record_frames(record, prefix="v")
+
+    gif_path = os_path.join(output_folder, f"{DATATYPE_NAME}_fast_renderer_v.gif")
+    save_record_frames_fast(frames, steps, fps=10, delay=1, cmap="turbo", title="Fast renderer", file_path=gif_path)
+
+    with Image.open(gif_path) as gif:
+        assert gif.n_frames == len(steps), "Expected one gif frame per state"
+        assert min(gif.size) >= 256, "Frames should be upscaled to at least 256 pixels"
+
+
+def test_visualize_records_reuses_figure(monkeypatch, tmp_path):
+    import visualize_dataset
+
+    created = []
+    create_figure = visualize_dataset._create_compare_figure
+    monkeypatch.setattr(visualize_dataset, '_create_compare_figure', lambda *args: created.append(create_figure(*args)) or created[-1])
+
+    output_folder = str(tmp_path)
+    records = simulate_patterns(17, grid_length=16, max_iterations=25, patch_radius=2, save_states=[("interval", 10)])[:2]
+    data_file = os_path.join(output_folder, "visualize_records.hdf5")
+    save_to_hdf5(records, data_file, len(records))
+
+    tasks = [(int(row['record']), row['pattern_name'].decode('utf-8'), int(row['random_seed'])) for row in read_record_index(data_file)]
+    options = {'gif_fps': 10, 'gif_delay': 1, 'gif_cmap': 'viridis', 'image_cmap': 'seismic', 'gif_renderer': 'fast'}
+    visualize_records(data_file, tasks, output_folder=output_folder, statistics=None, options=options)
+
+    for _, pattern, seed in tasks:
+        assert os_path.exists(os_path.join(output_folder, f"{DATATYPE_NAME}_{pattern}_{seed}_compare.png"))
+    assert len(created) == 1, "Expected one comparison figure reused across records"
+    assert visualize_dataset._FIGURE_CACHE == {} and not plt.fignum_exists(created[0]['fig'].number), "Expected the cached figure to be closed"
+
+
+def test_compose_montage_layout():
+    tiles = np.stack([np.full((8, 8), value) for value in np.linspace(0.0, 1.0, 5)])
+    image = compose_montage(tiles, columns=3, tile_size=16, gap=2)
+
+    assert image.mode == "P" and image.size == (3 * 18, 2 * 18), "Expected 2 rows of 3 upscaled and padded tiles"
+    sheet = np.asarray(image)
+    assert sheet[0, 0] == 0 and sheet[18, 18] == LUT_COLORS - 1, "Expected tiles laid out row by row"
+    assert (sheet[18:, 36:] == BACKGROUND_INDEX).all(), "Expected empty cells to stay background"
+
+
+def test_thumbnail_levels_read_back(tmp_path):
+    records = simulate_patterns(19, grid_length=16, max_iterations=20, patch_radius=2, save_states=[("interval", 10)])[:2]
+    full_final = records[0]['image']['v_state_final'].copy()
+    add_thumbnail_images(records, [2, 4])
+
+    data_file = str(tmp_path / "thumbnail_levels.hdf5")
+    save_to_hdf5(records, data_file, len(records))
+
+    thumbnail = read_from_hdf5(data_file, flatten=False, records=[0], level=4)[0]
+    assert image_group_name(2) not in thumbnail, "Expected only the requested level to be read"
+    assert thumbnail['image']['v_state_final'].shape == (4, 4)
+    assert np.isclose(thumbnail['image']['v_state_final'][0, 0], full_final[:4, :4].mean())
+    assert np.isclose(thumbnail['image']['v_state_final'].mean(), full_final.mean(), atol=1e-6)
+
+
+def test_output_resolutions_periodic_coarsening():
+    records = simulate_patterns(23, grid_length=32, max_iterations=20, patch_radius=3, save_states=[("interval", 10)])[:1]
+    add_resolution_images(records, [32, 16, 8])
+    fine = records[0]['image']['v_state_final']
+
+    assert resolution_group_name(32) not in records[0], "The simulated resolution stays in 'image'"
+    coarse = records[0][resolution_group_name(8)]['v_state_final']
+    assert coarse.shape == (8, 8) and coarse.dtype == fine.dtype
+    assert np.isclose(coarse.mean(), fine.mean(), atol=1e-6), "Coarsening should preserve the field mean"
+
+    # a periodic shift of the fine field by one block shifts the coarse field by one cell
+    shifted = downsample_periodic(np.roll(fine, 4, axis=1), 4)
+    assert np.allclose(shifted, np.roll(records[0][resolution_group_name(8)]['v_state_final'], 1, axis=1), atol=1e-6)
+
+
+def test_simulation_diagnostics_series(tmp_path):
+    from greyscott_simulation import run_grayscott_simulation, DIAGNOSTIC_KEYS
+
+    checkpoint_path = str(tmp_path / "seed_5_diagnostics.npz")
+    sim_args = {'grid_length': 16, 'max_iterations': 30, 'patch_radius': 2, 'save_states': [], 'diagnostics': True}
+
+    result = run_grayscott_simulation(5, **sim_args)
+    series = result['metric']
+    assert sorted(series) == sorted(DIAGNOSTIC_KEYS) and all(len(values) == 31 for values in series.values())
+    assert np.isclose(series['v_mass'][-1], result['image']['v_state_final'].sum(dtype=np.float64))
+    assert np.isclose(series['u_max'][0], result['image']['u_state_initial'].max()) and series['l2_change'][0] == 0.0
+    assert (series['v_min'] <= series['v_mean']).all() and (series['v_mean'] <= series['v_max']).all()
+
+    # resumed runs keep the diagnostics recorded before the checkpoint
+    run_grayscott_simulation(5, checkpoint_path=checkpoint_path, checkpoint_every=10, **sim_args)
+    resumed = run_grayscott_simulation(5, checkpoint_path=checkpoint_path, checkpoint_every=10, **sim_args)
+    for key, values in series.items():
+        assert np.array_equal(resumed['metric'][key], values), f"'{key}' differs after resuming"
+
+
+def test_spectral_features():
+    from greyscott_features import compute_spectral_features
+
+    y, x = np.mgrid[:32, :32]
+    stripes = (0.5 + 0.5 * np.sin(2 * np.pi * x / 8)).astype(np.float32)
+    spots = np.zeros((32, 32), dtype=np.float32)
+    # the first two spots touch across the periodic boundary
+    for cy, cx in [(2, 1), (2, 30), (16, 16), (25, 8)]:
+        spots[(y - cy) ** 2 + (x - cx) ** 2 <= 4] = 0.5
+
+    features = compute_spectral_features(np.stack([stripes, spots]))
+    assert features['radial_power_spectrum'].shape == (2, 17)
+    assert features['dominant_wavelength'][0] == 8.0
+    assert list(features['spot_count']) == [4, 3]
+    assert np.isclose(features['anisotropy'][0], 1.0) and features['anisotropy'][1] < 0.5
+
+    # a dead simulation has no features, its NaNs are left out of the metric statistics
+    flat = compute_spectral_features(np.zeros((1, 32, 32), dtype=np.float32))
+    assert np.isnan(flat['dominant_wavelength'][0]) and np.isnan(flat['anisotropy'][0])
+    records = [{'metric': {'dominant_wavelength': wavelength, 'anisotropy': np.nan}} for wavelength in [8.0, np.nan, 4.0]]
+    metric_stats = compute_local_stats(records)['metric']
+    assert (metric_stats['dominant_wavelength']['count'], metric_stats['dominant_wavelength']['mean']) == (2, 6.0)
+    assert 'anisotropy' not in metric_stats
+
+
+def test_unhealthy_simulations_stop_early(monkeypatch):
+    import greyscott_simulation as sim
+
+    sim_args = {'grid_length': 16, 'max_iterations': 50, 'patch_radius': 2, 'save_states': [], 'health_check_every': 5}
+
+    def blow_up(u, v, **params):
+        with np.errstate(over='ignore'):
+            v *= 1e30
+        return np.zeros_like(u), np.zeros_like(v)
+
+    def die_out(u, v, **params):
+        v *= 0.0
+        return np.zeros_like(u), np.zeros_like(v)
+
+    with monkeypatch.context() as m:
+        m.setattr(sim, 'update_gray_scott', blow_up)
+        diverged = sim.run_grayscott_simulation(7, **sim_args)
+        excluded = sim.generate_grayscott_maps(1, 3, patch_prob=0.5, unhealthy='exclude', **sim_args)
+    assert (diverged['meta']['status'], diverged['meta']['total_iterations']) == ('diverged', 5)
+    assert excluded == []
+
+    with monkeypatch.context() as m:
+        m.setattr(sim, 'update_gray_scott', die_out)
+        dead = sim.run_grayscott_simulation(7, **sim_args)
+    assert (dead['meta']['status'], dead['meta']['total_iterations']) == ('dead', 5)
+
+    # resampled attempts draw new initial fields, reproducible from the seed and attempt
+    first = sim.run_grayscott_simulation(7, attempt=1, **sim_args)
+    again = sim.run_grayscott_simulation(7, attempt=1, **sim_args)
+    assert first['meta']['status'] == 'ok' and first['meta']['attempt'] == 1
+    assert np.array_equal(first['image']['v_state_initial'], again['image']['v_state_initial'])
+    assert not np.array_equal(first['image']['v_state_initial'], diverged['image']['v_state_initial'])
+
+
+def test_extend_skips_excluded_seeds(monkeypatch, tmp_path):
+    from argparse import Namespace
+    import greyscott_simulation as sim
+    from create_dataset import create_dataset
+
+    output_path = str(tmp_path)
+    data_path = os_path.join(output_path, "extend_excluded")
+    run_args = Namespace(debug_on=False, num_tasks=1, min_seed=1, max_seed=3, seed_step=2, grid_length=16, patch_radius=2,
+                         patch_prob=0.5, max_iterations=20, save_states=[], output_path=output_path, output_folder="extend_excluded",
+                         extend=False, progress_every=0, unhealthy='exclude')
+
+    # seed 2 dies in every run it is simulated in
+    simulate = sim.run_grayscott_simulation
+    def seed_2_dies(seed, **kwargs):
+        result = simulate(seed, **kwargs)
+        if seed == 2:
+            result['meta']['status'] = 'dead'
+        return result
+    monkeypatch.setattr(sim, 'run_grayscott_simulation', seed_2_dies)
+
+    create_dataset(run_args)
+    data_file = os_path.join(data_path, f"{DATATYPE_NAME}_16x16_1-3.{DEFAULT_DATAFILE_EXT}")
+    assert list(read_record_index(data_file)['random_seed']) == [1, 3] and list(read_excluded_seeds(data_file)) == [2]
+
+    run_args.max_seed, run_args.extend = 5, True
+    create_dataset(run_args)
+    data_file = os_path.join(data_path, f"{DATATYPE_NAME}_16x16_1-5.{DEFAULT_DATAFILE_EXT}")
+    assert list(read_record_index(data_file)['random_seed']) == [1, 3, 4, 5]
+    assert list(read_excluded_seeds(data_file)) == [2], "The excluded seed should not be simulated again"
+
+    # seeds 6-7 are missing, so the dataset keeps the name of the range it fully covers
+    run_args.min_seed, run_args.max_seed = 8, 9
+    create_dataset(run_args)
+    assert list(read_record_index(data_file)['random_seed']) == [1, 3, 4, 5, 8, 9]
+    assert not glob(os_path.join(data_path, f"{DATATYPE_NAME}_16x16_1-9.{DEFAULT_DATAFILE_EXT}"))
+
+
+def test_replay_store_rebuilds_intermediate_states(tmp_path):
+    from greyscott_simulation import run_grayscott_simulation
+    from dataset_readers import ReplayStore
+
+    data_file = str(tmp_path / "replay_store.hdf5")
+    sim_args = {'grid_length': 16, 'max_iterations': 30, 'patch_radius': 2}
+
+    expected = run_grayscott_simulation(9, save_states=[("interval", 1)], **sim_args)
+    sparse = run_grayscott_simulation(9, save_states=[], replay_every=10, **sim_args)
+    assert sorted(sparse['replay']) == ['u_state_10', 'u_state_20', 'v_state_10', 'v_state_20']
+    save_to_hdf5([sparse], data_file)
+
+    with ReplayStore(data_file, cache_size=4) as store:
+        assert store.steps(0) == [0, 10, 20, 30]
+        for step in [13, 14, 27, 5, 30]:
+            u, v = store.get_state(0, step)
+            assert np.array_equal(u, expected['image'][f"u_state_{step}"]), f"U differs at step {step}"
+            assert np.array_equal(v, expected['image'][f"v_state_{step}"]), f"V differs at step {step}"
+        frames = store.get_frames(0, [2, 1], prefix='u')
+        assert np.array_equal(frames[0], expected['image']['u_state_2'])
+        assert len(store._cache) <= 4
+
+
+def test_augmented_records_are_symmetric_trajectories(tmp_path):
+    from greyscott_simulation import run_grayscott_simulation
+    from dataset_readers import AugmentedRecords
+
+    data_file = str(tmp_path / "augmented_records.hdf5")
+    record = run_grayscott_simulation(5, grid_length=16, max_iterations=30, patch_radius=2, save_states=[("interval", 10)])
+    save_to_hdf5([record], data_file)
+    params = {key: float(record['meta'][key]) for key in ['du', 'dv', 'feed', 'kill']}
+
+    augmented = AugmentedRecords(data_file, num_augmentations=12, translate=True, seed=3)
+    assert len(augmented) == 12
+    stored = augmented[0]['image']['v_state_final']
+    for augmentation in range(12):
+        view = augmented.get_record(0, augmentation)
+        assert view['augmentation'] == augmented[augmentation]['augmentation']
+        # evolving the transformed initial state reaches the transformed final state
+        u, v = (view['image'][f"{prefix}_state_initial"].copy() for prefix in ['u', 'v'])
+        for _ in range(30):
+            update_gray_scott(u, v, **params)
+        assert np.allclose(v, view['image']['v_state_final'], atol=1e-5)
+    # flips and rotations alone are views of the stored frames
+    dihedral = AugmentedRecords(data_file)
+    assert np.shares_memory(dihedral.get_record(0, 5)['image']['v_state_final'], dihedral[0]['image']['v_state_final'])
+    assert not np.array_equal(augmented.get_record(0, 9)['image']['v_state_final'], stored)
+
+
+def test_simulation_cache_hits_and_continues(monkeypatch, tmp_path):
+    import greyscott_simulation as sim
+    from simulation_cache import SimulationCache, simulation_cache_key
+
+    cache_dir = str(tmp_path / "simulation_cache")
+    cache = SimulationCache(cache_dir)
+    sim_args = {'grid_length': 16, 'patch_radius': 2, 'save_states': [("interval", 10)]}
+
+    short = sim.run_grayscott_simulation(4, max_iterations=20, cache=cache, **sim_args)
+    expected = sim.run_grayscott_simulation(4, max_iterations=40, **sim_args)
+
+    # count solver steps of the cached runs
+    steps = []
+    update = sim.update_gray_scott
+    monkeypatch.setattr(sim, 'update_gray_scott', lambda u, v, **params: steps.append(1) or update(u, v, **params))
+
+    hit = sim.run_grayscott_simulation(4, max_iterations=20, cache=cache, **sim_args)
+    assert len(steps) == 0, "An exact hit should not simulate"
+    for key, value in short['image'].items():
+        assert np.array_equal(hit['image'][key], value), f"'{key}' differs on a cache hit"
+
+    longer = sim.run_grayscott_simulation(4, max_iterations=40, cache=cache, **sim_args)
+    assert len(steps) == 20, "A longer run should continue from the cached final state"
+    for key, value in expected['image'].items():
+        assert np.array_equal(longer['image'][key], value), f"'{key}' differs after continuing"
+
+    # a file another worker is still writing is not an entry
+    with open(os_path.join(cache_dir, f"{simulation_cache_key(4, grid_length=16, patch_radius=2, patch_prob=0.5)}.npz.tmp"), 'wb'):
+        pass
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.load("missing") == {}
+    assert not glob(os_path.join(cache_dir, "*.npz")), "Eviction should trim the cache to its size limit"
+    assert len(glob(os_path.join(cache_dir, "*.tmp"))) == 1, "Eviction should leave in-flight writes alone"
+
+    # the folder is only scanned on the first store, every scan_every stores and once the running total is too big
+    scans = []
+    counted = SimulationCache(cache_dir, scan_every=3)
+    evict = counted.evict
+    monkeypatch.setattr(counted, 'evict', lambda: scans.append(1) or evict())
+    state = {10: (np.zeros((4, 4), dtype=np.float32), np.zeros((4, 4), dtype=np.float32))}
+    for key in range(7):
+        counted.store(f"entry_{key}", state)
+    assert len(scans) == 3 and len(glob(os_path.join(cache_dir, "*.npz"))) == 7
+    counted.max_bytes = counted._total_bytes
+    counted.store("entry_7", state)
+    assert len(scans) == 4 and len(glob(os_path.join(cache_dir, "*.npz"))) == 7, "Going over the limit should evict right away"
+
+
+def test_delta_encoded_frames_round_trip(tmp_path):
+    output_folder = str(tmp_path)
+    records = simulate_patterns(29, grid_length=16, max_iterations=60, patch_radius=2, save_states=[("interval", 5)])[:2]
+    data_file = os_path.join(output_folder, "delta_encoded.hdf5")
+    save_to_hdf5(encode_record_frames(records, keyframe_every=4), data_file, len(records), compression="gzip")
+    assert 'v_state_10' in records[0]['image'], "Encoding should not change the given records"
+
+    decoded = read_from_hdf5(data_file, flatten=False, records=[0])[0]
+    for key, value in records[0]['image'].items():
+        scale = max(np.abs(value).max(), 1e-6)
+        assert np.allclose(decoded['image'][key], value, atol=scale / 2 ** 14), f"'{key}' differs after decoding"
+
+    # the error does not build up over the deltas of a keyframe segment
+    frames = np.stack([records[0]['image'][f"v_state_{step}"] for step in range(5, 61, 5)])
+    encoded = encode_frame_sequence(frames, keyframe_every=12)
+    restored = decode_frame_sequence(encoded['keyframes'], encoded['deltas'], encoded['scales'], keyframe_every=12)
+    max_step = np.abs(np.diff(frames, axis=0)).max()
+    assert np.abs(restored - frames).max() <= max_step / DELTA_QUANTIZATION_LEVELS + 1e-7
+
+    v_frames, steps = extract_record_frames(encode_record_frames(records, keyframe_every=4)[0], prefix="v")
+    assert v_frames.shape[0] == len(steps) == 14 and steps[0] == 0, "Expected the initial, 12 decoded and final states"
+    assert read_record_index(data_file)['num_frames'][0] == 14
+
+    # contact sheets of intermediate states read the decoded frames
+    tasks = [(0, "encoded", 29), (1, "encoded", 29)]
+    sheet_path = save_dataset_montages(data_file, tasks, output_folder=output_folder, image_key="v_state_10", tile_size=16)[0]
+    assert os_path.exists(sheet_path) and sheet_path.endswith("montage_v_state_10_000.png")
+
+
+def test_simulation_imports_no_plotting():
+    import subprocess
+    import sys
+
+    # a fresh interpreter, like a spawned worker
+    code = ("import sys, greyscott_simulation; "
+            "print(','.join(m for m in ('matplotlib', 'pandas', 'PIL') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=os_path.dirname(os_path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    assert output[-1] == "", f"Simulation workers should not import {output[-1]}"
+
+
+def _log_from_worker(log_queue, log_level):
+    from setup_logger import attach_log_queue
+    attach_log_queue(log_queue, log_level)
+    logger.debug("worker debug message %d", 7)
+    logger.info("worker info message %d", 7)
+
+
+def test_workers_log_through_parent_listener():
+    import logging
+    import setup_logger
+
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    capture = ListHandler()
+    setup_logger.global_logger.addHandler(capture)
+    try:
+        log_queue = setup_logger.start_log_listener()
+        assert capture not in setup_logger.global_logger.handlers
+        p = Process(target=_log_from_worker, args=(log_queue, logging.INFO))
+        p.start()
+        p.join()
+        logger.info("parent message")
+        setup_logger.stop_log_listener()
+        assert capture in setup_logger.global_logger.handlers
+        assert capture.messages == ["worker info message 7", "parent message"]
+    finally:
+        setup_logger.stop_log_listener()
+        setup_logger.global_logger.removeHandler(capture)
+
+
+def test_profile_timer_phases_and_counters():
+    from greyscott_simulation import run_grayscott_simulation
+    from profiling import PhaseTimer, build_profile_report
+
+    timer = PhaseTimer()
+    run_grayscott_simulation(3, grid_length=16, max_iterations=30, patch_radius=2, save_states=[("interval", 10)], timer=timer)
+    assert timer.counters['cell_updates'] == 16 * 16 * 30
+    assert timer.calls['solver'] == 1 and timer.calls['frame_copies'] == 4, "Expected 3 saved states and the final copy"
+
+    # worker timings add up in the parent
+    merged = PhaseTimer().merge(timer.as_dict()).merge(timer.as_dict())
+    assert merged.calls['solver'] == 2 and merged.counters['cell_updates'] == 2 * 16 * 16 * 30
+    report = build_profile_report(merged, wall_seconds=2.0)
+    assert abs(sum(phase['percent'] for phase in report['phases'].values()) - 100.0) < 1e-6
+    assert report['throughput']['cell_updates_per_second'] == 16 * 16 * 30
+
+
+def test_progress_counters_and_status_file(tmp_path):
+    from greyscott_simulation import generate_grayscott_maps
+    from telemetry import ProgressCounters, ProgressMonitor
+
+    status_file = str(tmp_path / "progress_status.json")
+    counters = ProgressCounters(2)
+    monitor = ProgressMonitor(counters, total_seeds=3, max_iterations=250, interval=0, status_file=status_file).start()
+    assert read_from_json(status_file)['state'] == 'running'
+
+    generate_grayscott_maps(1, 3, grid_length=16, max_iterations=250, patch_radius=2, patch_prob=0.5,
+                            save_states=[], progress=counters.worker(1))
+    assert counters.read()[0]['iterations_done'] == 0
+    assert counters.read()[1]['seeds_completed'] == 3 and counters.read()[1]['iterations_done'] == 3 * 250
+
+    monitor.stop()
+    status = read_from_json(status_file)
+    assert status['state'] == 'done' and status['percent'] == 100.0 and status['eta_seconds'] == 0.0
+
+
+def test_benchmark_compare_flags_regressions():
+    from benchmark_greyscott import benchmark_solver, compare_results
+
+    results = benchmark_solver([16], [2], ["float32"], repeats=2, steps=2)
+    assert sorted(results) == ["micro/compute_laplacian/grid=16/batch=2/dtype=float32",
+                               "micro/update_gray_scott/grid=16/batch=2/dtype=float32"]
+    assert all(timing['best'] <= timing['median'] and timing['cell_updates_per_second'] > 0 for timing in results.values())
+
+    baseline = {'results': {'a': {'best': 1.0}, 'b': {'best': 1.0}, 'c': {'best': 1.0}, 'd': {'best': 1.0}}}
+    current = {'results': {'a': {'best': 1.05}, 'b': {'best': 1.5}, 'c': {'best': 0.5}, 'e': {'best': 1.0}}}
+    comparison = compare_results(current, baseline, threshold=0.1)
+    assert [row['name'] for row in comparison['regressions']] == ['b']
+    assert [row['name'] for row in comparison['improvements']] == ['c']
+    assert [row['name'] for row in comparison['unchanged']] == ['a']
+    assert comparison['missing'] == ['d', 'e']
@@ -1,18 +1,16 @@
 from setup_logger import setup_logger, logging, global_logger as logger
 from json import loads, dump, load, dumps
-from multiprocessing import Process, Manager, Lock, current_process
-from os import makedirs, path as os_path, getpid, cpu_count, remove, listdir, environ, rename
-
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import matplotlib.animation as animate
+from multiprocessing import Process, Queue, current_process
+from queue import Empty
+from contextlib import ExitStack
+from os import makedirs, path as os_path, getpid, cpu_count, remove, listdir, environ, rename, replace
 
 import numpy as np
 import re
 import h5py
 import warnings
 from glob import glob
+from functools import reduce
 from pprint import pprint
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -84,8 +82,18 @@ def remove_if_exists(file_path=None):
         remove(file_path) 
 
 
+# imports matplotlib with the Agg backend on first use, workers that only simulate never pay for it
+def import_matplotlib():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animate
+    return plt, animate
+
+
 # converts dataframes to lists of dictionary records and vice versa
 def dataframe_dictrecord_converter(data):
+    import pandas as pd
     if isinstance(data, pd.DataFrame):
         dict_record = data.to_dict(orient='records')
         return dict_record
@@ -102,6 +110,22 @@ def split_seed_range(seed_range, seed_step):
     return [(start_seed, min(start_seed + seed_step - 1, max_seed)) for start_seed in range(min_seed, max_seed + 1, seed_step)]
 
 
+# compresses seeds into sorted inclusive (start, end) ranges of consecutive seeds
+def compress_seed_ranges(seeds):
+    ranges = []
+    for seed in sorted(set(seeds)):
+        if ranges and seed == ranges[-1][1] + 1:
+            ranges[-1][1] = seed
+        else:
+            ranges.append([seed, seed])
+    return [tuple(r) for r in ranges]
+
+
+# splits seeds into chunks of at most seed_step consecutive seeds, meant for batching simulations
+def split_seed_chunks(seeds, seed_step):
+    return [chunk for seed_range in compress_seed_ranges(seeds) for chunk in split_seed_range(seed_range, seed_step)]
+
+
 # flattens nested dictionaries, by appending top level key as a prefix
 def flatten_dict(d, parent_key='', sep='_'):
     items = []
@@ -114,109 +138,224 @@ def flatten_dict(d, parent_key='', sep='_'):
     return dict(items)
 
 
-# shared dictionary between processes
-def update_shared_data(new_data, shared_data, shared_lock):
-    with shared_lock:
-        shared_data_copy = shared_data.copy()
+# fixed value range of the optional histograms, concentrations of U and V stay inside [0, 1]
+HISTOGRAM_RANGE = (0.0, 1.0)
+DEFAULT_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+# maximum number of values stacked into one batch, bounds the float64 temporaries
+STATS_BATCH_SIZE = 1 << 22
+
+
+# pools the statistics of two disjoint sets of values with Chan's parallel formulas
+def merge_key_statistics(original_stats, new_stats):
+    # Calculate the new count (total number of elements)
+    original_count, new_count = original_stats['count'], new_stats['count']
+    total_count = original_count + new_count
+
+    # Calculate the pooled mean
+    delta = new_stats['mean'] - original_stats['mean']
+    pooled_mean = original_stats['mean'] + delta * new_count / total_count
+
+    # Calculate the pooled sum of squared differences and the population standard deviation
+    pooled_m2 = (original_stats['std'] ** 2 * original_count
+                    + new_stats['std'] ** 2 * new_count
+                    + delta ** 2 * original_count * new_count / total_count)
+
+    merged_stats = {
+        'min': min(original_stats['min'], new_stats['min']),
+        'max': max(original_stats['max'], new_stats['max']),
+        'mean': pooled_mean,
+        'std': float(np.sqrt(pooled_m2 / total_count)),
+        'count': total_count,
+        'shape': [original_stats['shape'][0] + new_stats['shape'][0]] + list(original_stats['shape'][1:])
+    }
+
+    # histograms with the same bins simply add up
+    if 'histogram' in original_stats and 'histogram' in new_stats and len(original_stats['histogram']) == len(new_stats['histogram']):
+        merged_stats['histogram'] = (np.asarray(original_stats['histogram']) + np.asarray(new_stats['histogram'])).tolist()
+        merged_stats['histogram_range'] = list(original_stats['histogram_range'])
+
+    return merged_stats
+
+
+# merges two statistics dictionaries with pooled formulas, e.g. new records into an existing dataset
+def merge_statistics(original_data, new_data):
+    merged_data = {category: dict(values) for category, values in original_data.items()}
 
     for category in ['image', 'metric']:
         if category not in new_data:
             continue
-        if category not in shared_data_copy:
-            shared_data_copy[category] = {}
+        if category not in merged_data:
+            merged_data[category] = {}
 
         for key, new_stats in new_data[category].items():
-            if key not in shared_data_copy[category]:
-                shared_data_copy[category][key] = new_stats
+            if key not in merged_data[category]:
+                merged_data[category][key] = new_stats
             else:
-                original_stats = shared_data_copy[category][key]
-
-                # Calculate new min and max
-                new_min = min(original_stats['min'], new_stats["min"])
-                new_max = max(original_stats['max'], new_stats["max"])
-
-                # Calculate the new count (total number of elements)
-                new_count = original_stats['count'] + new_stats["count"]
-
-                # Calculate the pooled mean
-                new_mean = (original_stats["count"] * original_stats["mean"] + new_stats["count"] * new_stats["mean"]) / new_count
+                merged_data[category][key] = merge_key_statistics(merged_data[category][key], new_stats)
+
+    return merged_data
+
+
+# statistics of a stacked batch of values (records first), one reduction per statistic
+# NaN and inf values, e.g. features of flat fields, are left out, None if no value is finite
+def compute_batch_stats(batch, histogram_bins=0, value_range=HISTOGRAM_RANGE):
+    shape = list(batch.shape) if batch.ndim > 1 else [batch.shape[0], 1]
+    with np.errstate(invalid='ignore', over='ignore'):
+        batch_mean = batch.mean(dtype=np.float64)
+    if not np.isfinite(batch_mean):
+        # only batches with a non-finite value pay for the mask
+        batch = batch[np.isfinite(batch)]
+        if batch.size == 0:
+            return None
+        batch_mean = batch.mean(dtype=np.float64)
+
+    deviation = np.subtract(batch, batch_mean, dtype=np.float64)
+    batch_stats = {
+        'min': batch.min(),
+        'max': batch.max(),
+        'mean': batch_mean,
+        'std': float(np.sqrt(np.vdot(deviation, deviation) / batch.size)),
+        'count': batch.size,
+        'shape': shape
+    }
+
+    if histogram_bins:
+        low, high = value_range
+        bins = ((batch.ravel() - low) * (histogram_bins / (high - low))).astype(np.int64)
+        np.clip(bins, 0, histogram_bins - 1, out=bins)
+        batch_stats['histogram'] = np.bincount(bins, minlength=histogram_bins).tolist()
+        batch_stats['histogram_range'] = [low, high]
+
+    return batch_stats
+
+
+# statistics of a chunk of simulation records, values of each key are stacked across records
+def compute_local_stats(sim_results_list, histogram_bins=0):
+    stats_dict = {}
+    data_groups = ['image', 'metric']  # Track image and metric data
 
-                # Calculate the pooled variance
-                pooled_variance = (
-                    (original_stats["count"] - 1) * original_stats["std"] ** 2 +
-                    (new_stats["count"] - 1) * new_stats["std"] ** 2 +
-                    (original_stats["count"] * new_stats["count"]) / (new_count) * (original_stats["mean"] - new_stats["mean"]) ** 2
-                ) / (new_count - 1)
+    for group in data_groups:
+        group_values = {}
+        for sim_results in sim_results_list:
+            for key, value in sim_results.get(group, {}).items():
+                group_values.setdefault(key, []).append(value)
 
-                # Calculate the pooled standard deviation
-                new_std = np.sqrt(pooled_variance)
+        if not group_values:
+            continue
 
-                new_shape = [original_stats['shape'][0] + new_stats['shape'][0]] + original_stats['shape'][1:]
+        stats_dict[group] = {}
+        for key, values in group_values.items():
+            # histograms use the fixed concentration range, so only images get one
+            bins = histogram_bins if group == 'image' else 0
+            batches = [compute_batch_stats(np.stack(batch), bins) for batch in _stack_batches(values)]
+            batches = [batch_stats for batch_stats in batches if batch_stats is not None]
+            if batches:
+                stats_dict[group][key] = reduce(merge_key_statistics, batches)
 
-                # Update the shared data dictionary with pooled values
-                shared_data_copy[category][key] = {
-                    'min': new_min,
-                    'max': new_max,
-                    'mean': new_mean,
-                    'std': new_std,
-                    'count': new_count,
-                    'shape': new_shape
-                }
+    return stats_dict
 
-    with shared_lock:
-        shared_data.update(shared_data_copy)
 
+# groups consecutive values of the same shape into batches of at most STATS_BATCH_SIZE elements
+def _stack_batches(values):
+    batch = []
+    for value in values:
+        if batch and (np.shape(value) != np.shape(batch[0]) or (len(batch) + 1) * np.size(value) > STATS_BATCH_SIZE):
+            yield batch
+            batch = []
+        batch.append(value)
+    if batch:
+        yield batch
 
-def compute_local_stats(sim_results_list):
-    stats_dict = {}
-    data_groups = ['image', 'metric']  # Track image and metric data
 
-    for sim_results in sim_results_list:
-        for group in data_groups:
-            if group not in sim_results:
+# approximate percentiles of every histogram for robust normalization, plus the per timestep table
+def finalize_statistics(global_stats, percentiles=DEFAULT_PERCENTILES, final_step=None):
+    for category in ['image', 'metric']:
+        for stats in global_stats.get(category, {}).values():
+            if 'histogram' not in stats:
                 continue
+            counts = np.asarray(stats['histogram'], dtype=np.float64)
+            edges = np.linspace(*stats['histogram_range'], len(counts) + 1)
+            cdf = np.concatenate([[0.0], np.cumsum(counts) / counts.sum()])
+            stats['percentiles'] = {f"p{q}": float(np.interp(q / 100, cdf, edges)) for q in percentiles}
+
+    if final_step is not None:
+        global_stats['timestep'] = compute_timestep_statistics(global_stats, final_step)
+    return global_stats
+
+
+# per field table of image statistics indexed by step, the initial state is step 0
+# and the final state is final_step unless that step was saved anyway
+def compute_timestep_statistics(global_stats, final_step):
+    image_stats = global_stats.get('image', {})
+    state_pattern = re.compile(r"([a-z]+)_state_(\d+|initial|final)$")
+    table = {}
+    for key, stats in image_stats.items():
+        m = state_pattern.match(key)
+        if not m:
+            continue
+        field, step = m.groups()
+        step = 0 if step == 'initial' else final_step if step == 'final' else int(step)
+        rows = table.setdefault(field, {})
+        if step not in rows or m.group(2) != 'final':
+            rows[step] = stats
 
-            if group not in stats_dict:
-                stats_dict[group] = {}
-
-            for key, value in sim_results[group].items():
-                data = np.array(value)
-                local_min = np.min(data)
-                local_max = np.max(data)
-                local_mean = np.mean(data)
-                local_std = np.std(data)
-                local_size = data.size 
-                local_shape = list(data.shape) if group == "image" else [1]
-
-                if key not in stats_dict[group]:
-                    stats_dict[group][key] = {
-                        'min': local_min,
-                        'max': local_max,
-                        'mean': local_mean,
-                        'std': local_std,
-                        'count': local_size,
-                        'shape': [1] + local_shape
-                    }
-                else:
-                    stats_dict[group][key]['min'] = min(stats_dict[group][key]['min'], local_min)
-                    stats_dict[group][key]['max'] = max(stats_dict[group][key]['max'], local_max)
-                    stats_dict[group][key]['mean'] = local_mean
-                    stats_dict[group][key]['std'] = local_std
-                    stats_dict[group][key]['count'] += local_size
-                    stats_dict[group][key]['shape'][0] += 1
+    return {
+        field: {
+            'step': sorted(rows),
+            **{name: [rows[step][name] for step in sorted(rows)] for name in ['min', 'max', 'mean', 'std']}
+        }
+        for field, rows in table.items()
+    }
 
-    return stats_dict
+
+# reads the per timestep table of a global statistics json as arrays, e.g. stats['v']['mean'][i] at stats['v']['step'][i]
+def read_timestep_statistics(json_file):
+    timestep_stats = read_from_json(json_file).get('timestep', {})
+    return {field: {name: np.asarray(values) for name, values in columns.items()} for field, columns in timestep_stats.items()}
 
 
 def extract_minmax_tuples(global_stats):
     min_max_dict = {}
     for category, values in global_stats.items():
+        if category not in ['image', 'metric']:
+            continue
         min_max_dict[category] = {}
         for key, stats in values.items():
             min_max_dict[category][key] = (stats["min"], stats["max"])
     return min_max_dict
 
 
+# merges a list of statistics dictionaries pairwise in rounds, e.g. the results of each worker
+def reduce_statistics(stats_list):
+    stats_list = [stats for stats in stats_list if stats]
+    if not stats_list:
+        return {}
+    while len(stats_list) > 1:
+        merged = [merge_statistics(a, b) for a, b in zip(stats_list[0::2], stats_list[1::2])]
+        if len(stats_list) % 2:
+            merged.append(stats_list[-1])
+        stats_list = merged
+    return stats_list[0]
+
+
+# collects one result per worker process, stops early if workers died without sending theirs
+def collect_worker_results(result_queue, procs_list, timeout=1.0):
+    results = []
+    while len(results) < len(procs_list):
+        try:
+            results.append(result_queue.get(timeout=timeout))
+        except Empty:
+            if not any(p.is_alive() for p in procs_list) and result_queue.empty():
+                break
+    return results
+
+
+# returns the global statistics json path that belongs to a dataset file
+def get_statistics_file_path(data_file):
+    data_name = os_path.basename(data_file).split('.')[0]
+    return os_path.join(os_path.dirname(data_file), f"global_statistics_{DEFAULT_DATAFILE_EXT}_{data_name}.json")
+
+
 # serializes numpy types bc ya know
 def serialize_numpy_types(obj):
     if isinstance(obj, dict):
@@ -233,12 +372,15 @@ def serialize_numpy_types(obj):
         return obj
 
 
-# writes or appends to a csv file
-def save_to_json(file_path, content_in:dict, mode='w', indent=4):
+# writes or appends to a csv file, atomic writes replace the file only once it is complete
+def save_to_json(file_path, content_in:dict, mode='w', indent=4, atomic=False):
     try:
         content_out = serialize_numpy_types(content_in)
-        with open(file_path, mode) as json_file:
+        write_path = f"{file_path}.tmp" if atomic else file_path
+        with open(write_path, mode) as json_file:
             dump(content_out, json_file, indent=indent)
+        if atomic:
+            replace(write_path, file_path)
     except Exception as e:
         logger.error(e, stacklevel=2)   
 
@@ -253,8 +395,208 @@ def read_from_json(file_path):
         logger.error(e, stacklevel=2)   
 
 
+###############################################################################
+# Record index
+###############################################################################
+
+RECORD_PREFIX = "record_"
+RECORD_INDEX_NAME = "index"
+
+# columns of the compact per-record index stored at the root of each dataset
+RECORD_INDEX_DTYPE = np.dtype([
+    ("record", np.int64),
+    ("random_seed", np.int64),
+    ("pattern_name", "S32"),
+    ("feed", np.float64),
+    ("kill", np.float64),
+    ("grid_length", np.int64),
+    ("total_iterations", np.int64),
+    ("num_frames", np.int64),
+    ("image_offset", np.int64),
+    ("image_nbytes", np.int64),
+    ("dominant_wavelength", np.float64),
+    ("spot_count", np.int64),
+    ("anisotropy", np.float64),
+    ("status", "S16"),
+])
+
+
+# returns the group name for a record number
+def record_key(record_number):
+    return f"{RECORD_PREFIX}{int(record_number)}"
+
+
+# returns the record number of a group name
+def record_number(key):
+    return int(key[len(RECORD_PREFIX):])
+
+
+# lists the record group names of an open hdf5 file in record order
+def list_record_keys(f):
+    return sorted((k for k in f.keys() if k.startswith(RECORD_PREFIX)), key=record_number)
+
+
+# builds one index row from the meta attributes and image layout of a record group
+def _record_index_row(key, group):
+    meta = group["meta"] if "meta" in group else {}
+    attrs = meta.attrs if isinstance(meta, h5py.Group) else {}
+    pattern = meta["pattern_name"][()] if "pattern_name" in meta else b""
+    if isinstance(pattern, str):
+        pattern = pattern.encode("utf-8")
+
+    metric = group["metric"].attrs if "metric" in group else {}
+    status = meta["status"][()] if "status" in meta else b""
+    if isinstance(status, str):
+        status = status.encode("utf-8")
+
+    num_frames = 0
+    offsets, nbytes = [], 0
+    for image_group in ["image", ENCODED_IMAGE_GROUP]:
+        if image_group not in group:
+            continue
+        for name, item in group[image_group].items():
+            if not isinstance(item, h5py.Dataset):
+                continue
+            if name.startswith("v_state_"):
+                num_frames += 1
+            elif name == "v_steps":
+                num_frames += item.shape[0]
+            offset = item.id.get_offset()
+            if offset is not None:
+                offsets.append(offset)
+            nbytes += item.id.get_storage_size()
+
+    return (
+        record_number(key),
+        attrs.get("random_seed", -1),
+        pattern,
+        attrs.get("feed", np.nan),
+        attrs.get("kill", np.nan),
+        attrs.get("grid_length", -1),
+        attrs.get("total_iterations", -1),
+        num_frames,
+        min(offsets) if offsets else -1,
+        nbytes,
+        metric.get("dominant_wavelength", np.nan),
+        metric.get("spot_count", -1),
+        metric.get("anisotropy", np.nan),
+        status,
+    )
+
+
+# appends index rows for the given record groups of an open hdf5 file
+def update_record_index(f, keys):
+    if not keys and RECORD_INDEX_NAME in f:
+        return
+    if RECORD_INDEX_NAME in f and f[RECORD_INDEX_NAME].dtype != RECORD_INDEX_DTYPE:
+        # an index with older columns is rebuilt for every record
+        del f[RECORD_INDEX_NAME]
+    if RECORD_INDEX_NAME not in f:
+        # files written before the index existed get every record indexed
+        keys = list_record_keys(f)
+    rows = np.array([_record_index_row(k, f[k]) for k in keys], dtype=RECORD_INDEX_DTYPE)
+    if RECORD_INDEX_NAME not in f:
+        f.create_dataset(RECORD_INDEX_NAME, data=rows, maxshape=(None,), chunks=True)
+        return
+    index = f[RECORD_INDEX_NAME]
+    start = index.shape[0]
+    index.resize((start + len(rows),))
+    index[start:] = rows
+
+
+# (re)builds the record index of an existing hdf5 file, e.g. for files written before the index existed
+def write_record_index(file_path):
+    try:
+        with h5py.File(file_path, 'a') as f:
+            if RECORD_INDEX_NAME in f:
+                del f[RECORD_INDEX_NAME]
+            keys = list_record_keys(f)
+            update_record_index(f, keys)
+            logger.debug("Indexed %d records in %s", len(keys), file_path, stacklevel=2)
+    except (OSError, IOError, TypeError) as e:
+        logger.error(f"Cannot write record index to HDF5 file {file_path}: {e}", stacklevel=2)
+
+
+# reads the record index without touching image data, builds it in memory if the file has none
+def read_record_index(file_path):
+    with h5py.File(file_path, 'r') as f:
+        if RECORD_INDEX_NAME in f:
+            return f[RECORD_INDEX_NAME][()]
+        logger.warning(f"No record index in {file_path}, scanning record groups instead", stacklevel=2)
+        rows = [_record_index_row(k, f[k]) for k in list_record_keys(f)]
+        return np.array(rows, dtype=RECORD_INDEX_DTYPE)
+
+
+EXCLUDED_SEEDS_NAME = "excluded_seeds"
+
+
+# appends seeds left out of the dataset, e.g. by --unhealthy exclude, so extending the dataset does not simulate them again
+def add_excluded_seeds(file_path, seeds):
+    seeds = np.asarray(sorted(seeds), dtype=np.int64)
+    if seeds.size == 0:
+        return
+    try:
+        with h5py.File(file_path, 'a') as f:
+            if EXCLUDED_SEEDS_NAME not in f:
+                f.create_dataset(EXCLUDED_SEEDS_NAME, data=seeds, maxshape=(None,), chunks=True)
+                return
+            excluded = f[EXCLUDED_SEEDS_NAME]
+            start = excluded.shape[0]
+            excluded.resize((start + seeds.size,))
+            excluded[start:] = seeds
+    except (OSError, IOError, TypeError) as e:
+        logger.error(f"Cannot write excluded seeds to HDF5 file {file_path}: {e}", stacklevel=2)
+
+
+# reads the seeds left out of the dataset, empty if none were
+def read_excluded_seeds(file_path):
+    with h5py.File(file_path, 'r') as f:
+        if EXCLUDED_SEEDS_NAME not in f:
+            return np.empty(0, dtype=np.int64)
+        return f[EXCLUDED_SEEDS_NAME][()]
+
+
+# returns the record numbers matching all filters
+#   patterns: pattern names to keep
+#   seed_range: inclusive (min, max) random seed range
+#   value_ranges: inclusive (min, max) ranges for any other index column, e.g. feed=(0.03, 0.04)
+def query_record_index(index, patterns=None, seed_range=None, **value_ranges):
+    if isinstance(index, str):
+        index = read_record_index(index)
+
+    mask = np.ones(index.shape[0], dtype=bool)
+    if patterns:
+        wanted = [p.encode("utf-8") if isinstance(p, str) else p for p in patterns]
+        mask &= np.isin(index["pattern_name"], wanted)
+    if seed_range is not None:
+        value_ranges["random_seed"] = seed_range
+
+    for column, (low, high) in value_ranges.items():
+        if column not in index.dtype.names:
+            raise KeyError(f"Unknown record index column '{column}', choose from: {index.dtype.names}")
+        mask &= (index[column] >= low) & (index[column] <= high)
+
+    return index["record"][mask]
+
+
+# atomically writes a dictionary of arrays to a npz file,
+# the temporary file does not end in .npz so globs over a folder of entries never match a file still being written
+def save_to_npz(file_path, arrays:dict):
+    write_path = f"{file_path}.tmp"
+    with open(write_path, 'wb') as f:
+        np.savez(f, **arrays)
+    replace(write_path, file_path)
+
+
+# reads a npz file into a dictionary of arrays
+def read_from_npz(file_path):
+    with np.load(file_path) as data:
+        return {key: data[key] for key in data.files}
+
+
 # writes or appends to a hdf5 file
-def save_to_hdf5(data_dict_list, file_path, chunk_size=None, flatten=False):
+# with compression, stacked (N, H, W) arrays are chunked one frame per chunk and compressed with byte shuffling
+def save_to_hdf5(data_dict_list, file_path, chunk_size=None, flatten=False, compression=None):
     def write_data_to_group(group, data):
         for key, value in data.items():
             if isinstance(value, (int, float)):
@@ -264,6 +606,8 @@ def save_to_hdf5(data_dict_list, file_path, chunk_size=None, flatten=False):
                 string_dt = h5py.string_dtype(encoding='utf-8')
                 group.create_dataset(key, data=value, dtype=string_dt)
                 #logger.debug(f"Saved string dataset: {key} => {value}")
+            elif isinstance(value, np.ndarray) and compression and value.ndim == 3 and value.shape[0] > 0:
+                group.create_dataset(key, data=value, chunks=(1,) + value.shape[1:], compression=compression, shuffle=True)
             elif isinstance(value, np.ndarray):
                 group.create_dataset(key, data=value)
                 #logger.debug(f"Saved array dataset: {key} => array with shape {value.shape}")
@@ -277,36 +621,57 @@ def save_to_hdf5(data_dict_list, file_path, chunk_size=None, flatten=False):
     mode = 'a' if os_path.exists(file_path) else 'w'  
     try:
         with h5py.File(file_path, mode) as f:
-            existing_indices = [int(k.split('_')[1]) for k in f.keys() if k.startswith("record_")]
+            existing_indices = [record_number(k) for k in f.keys() if k.startswith(RECORD_PREFIX)]
             current_max_index = max(existing_indices) + 1 if existing_indices else 0
             total_records = len(data_dict_list)
-            logger.debug(f"Saving {total_records} records to file starting at index {current_max_index}", stacklevel=2)
+            logger.debug("Saving %d records to file starting at index %d", total_records, current_max_index, stacklevel=2)
 
+            created_groups = []
             for i in range(0, total_records, chunk):
                 for idx in range(i, min(i + chunk, total_records)):
                     record_index = current_max_index + idx
-                    record_group_name = f"record_{record_index}"
+                    record_group_name = record_key(record_index)
 
                     if record_group_name in f:
-                        logger.debug(f"Skipping existing group: {record_group_name}", stacklevel=2)
+                        logger.debug("Skipping existing group: %s", record_group_name, stacklevel=2)
                         continue
 
                     record_dict = flatten_dict(data_dict_list[idx]) if flatten else data_dict_list[idx]
                     record_group = f.create_group(record_group_name)
                     write_data_to_group(record_group, record_dict)
-                    logger.debug(f"Created group: {record_group_name}", stacklevel=2)
+                    created_groups.append(record_group_name)
+                    logger.debug("Created group: %s", record_group_name, stacklevel=2)
+
+            update_record_index(f, created_groups)
+            return created_groups
 
     except (Exception, OSError, IOError, TypeError) as e:
         logger.error(f"Error writing to HDF5 file {file_path}: {e}", stacklevel=2)
 
 
-# read a hdf5 file in or a random # of samples 
-def read_from_hdf5(file_path, sample_size=None, chunk_size=None, flatten=True, random_seed=None):
-    def load_group_data(group):
+# read a hdf5 file in or a random # of samples, optionally restricted to the given record numbers
+# and to the given top level groups of each record, e.g. groups=['image', 'metric']
+# a thumbnail level > 1 or a coarser output resolution reads those images in place of 'image'
+def read_from_hdf5(file_path, sample_size=None, chunk_size=None, flatten=True, random_seed=None, records=None, groups=None, level=None, resolution=None):
+    source_image_group = image_group_name(level, resolution)
+
+    def load_group_data(group, top_level=False):
         group_dict = {}
         group_dict.update({k: v for k, v in group.attrs.items()})
 
-        for key, item in group.items():
+        for source_key, item in group.items():
+            key = source_key
+            if top_level and source_image_group != "image":
+                # the other image groups of the record are skipped
+                if source_key.startswith("image") and source_key != source_image_group:
+                    continue
+                if source_key == source_image_group:
+                    key = "image"
+            if top_level and groups is not None and key not in groups:
+                continue
+            if top_level and source_key == ENCODED_IMAGE_GROUP:
+                # encoded intermediate states are decoded into 'image' below
+                continue
             if isinstance(item, h5py.Group):
                 subgroup_data = load_group_data(item)
                 if flatten:
@@ -322,13 +687,23 @@ def read_from_hdf5(file_path, sample_size=None, chunk_size=None, flatten=True, r
 
                 group_dict[key] = value
 
+        if top_level and source_image_group == "image" and ENCODED_IMAGE_GROUP in group and (groups is None or "image" in groups):
+            decoded = decode_record_frames(group[ENCODED_IMAGE_GROUP])
+            if flatten:
+                group_dict.update(flatten_dict(decoded, parent_key="image"))
+            else:
+                group_dict.setdefault("image", {}).update(decoded)
+
         return group_dict
     
     chunk = chunk_size or 1
     data_dict_list = []
     try:
         with h5py.File(file_path, 'r') as f:
-            all_keys = list(f.keys())
+            if records is not None:
+                all_keys = [record_key(r) for r in records]
+            else:
+                all_keys = list_record_keys(f)
             if isinstance(sample_size, int) and (0 < sample_size < len(all_keys)):
                 if isinstance(random_seed, int):
                     rng = np.random.default_rng(random_seed)
@@ -342,7 +717,7 @@ def read_from_hdf5(file_path, sample_size=None, chunk_size=None, flatten=True, r
                 chunk_keys = selected_keys[i:i + chunk]
                 for key in chunk_keys:
                     group = f[key]
-                    data = load_group_data(group)
+                    data = load_group_data(group, top_level=True)
                     data_dict_list.append(data)
             return data_dict_list
 
@@ -350,11 +725,206 @@ def read_from_hdf5(file_path, sample_size=None, chunk_size=None, flatten=True, r
         logger.error(f"Cannot read from HDF5 file: {file_path} due to: {e}", stacklevel=2)
 
 
+THUMBNAIL_GROUP_PREFIX = "image_thumbnail_"
+
+
+# returns the record group holding images downsampled by the given level or coarsened to the given resolution,
+# level 1 and no resolution is the full resolution
+def image_group_name(level=None, resolution=None):
+    if resolution:
+        return resolution_group_name(resolution)
+    if level is None or level == 1:
+        return "image"
+    return f"{THUMBNAIL_GROUP_PREFIX}{level}x"
+
+
+# averages non-overlapping factor x factor blocks of the last two axes
+def downsample_block_mean(array, factor):
+    *lead, height, width = array.shape
+    if height % factor or width % factor:
+        raise ValueError(f"Image shape {(height, width)} is not divisible by the downsampling factor {factor}")
+    blocks = array.reshape(*lead, height // factor, factor, width // factor, factor)
+    return blocks.mean(axis=(-3, -1)).astype(array.dtype, copy=False)
+
+
+# adds a thumbnail group per level to every record, computed from one stack of all images of the record
+def add_thumbnail_images(sim_results_list, levels):
+    for sim_results in sim_results_list:
+        image_keys = list(sim_results['image'].keys())
+        stack = np.stack([sim_results['image'][key] for key in image_keys])
+        for level in levels:
+            thumbnails = downsample_block_mean(stack, level)
+            sim_results[image_group_name(level)] = dict(zip(image_keys, thumbnails))
+    return sim_results_list
+
+
+# returns the record group holding the images coarsened to a resolution x resolution grid
+def resolution_group_name(resolution):
+    return f"image_{resolution}x{resolution}"
+
+
+# coarsens periodic fields of the last two axes by an integer factor,
+# block means followed by a [1, 2, 1] / 4 filter that wraps around the edges, both preserve the field mean
+def downsample_periodic(array, factor):
+    coarse = downsample_block_mean(array.astype(np.float64), factor)
+    if factor > 1:
+        for axis in (-2, -1):
+            coarse = 0.25 * np.roll(coarse, 1, axis=axis) + 0.5 * coarse + 0.25 * np.roll(coarse, -1, axis=axis)
+    return coarse.astype(array.dtype, copy=False)
+
+
+# adds a group of coarsened images per output resolution to every record simulated at a higher resolution
+def add_resolution_images(sim_results_list, resolutions):
+    for sim_results in sim_results_list:
+        image_keys = list(sim_results['image'].keys())
+        stack = np.stack([sim_results['image'][key] for key in image_keys])
+        grid_length = stack.shape[-1]
+        for resolution in resolutions:
+            if resolution == grid_length:
+                continue
+            coarse = downsample_periodic(stack, grid_length // resolution)
+            sim_results[resolution_group_name(resolution)] = dict(zip(image_keys, coarse))
+    return sim_results_list
+
+
+ENCODED_IMAGE_GROUP = "image_encoded"
+FRAME_ENCODINGS = ["float32", "delta16"]
+DEFAULT_KEYFRAME_EVERY = 16
+DELTA_QUANTIZATION_LEVELS = np.iinfo(np.int16).max
+
+
+# encodes a (N, H, W) frame sequence as float32 keyframes every keyframe_every frames and int16 deltas in between,
+# each delta is quantized against the decoded previous frame, so the error stays below half a step of its scale
+def encode_frame_sequence(frames, keyframe_every=DEFAULT_KEYFRAME_EVERY):
+    num_frames = frames.shape[0]
+    is_keyframe = np.arange(num_frames) % keyframe_every == 0
+    deltas = np.empty((num_frames - is_keyframe.sum(),) + frames.shape[1:], dtype=np.int16)
+    scales = np.zeros(num_frames)
+
+    delta_idx = 0
+    decoded = None
+    for idx in range(num_frames):
+        if is_keyframe[idx]:
+            decoded = frames[idx].astype(np.float64)
+            continue
+        diff = frames[idx] - decoded
+        max_diff = np.abs(diff).max()
+        scale = max_diff / DELTA_QUANTIZATION_LEVELS if max_diff > 0 else 1.0
+        quantized = np.rint(diff / scale).astype(np.int16)
+        # same float64 operations in the same order as the cumulative sum of the decoder
+        decoded = decoded + quantized.astype(np.float64) * scale
+        deltas[delta_idx] = quantized
+        scales[idx] = scale
+        delta_idx += 1
+
+    return {'keyframes': frames[is_keyframe].astype(np.float32), 'deltas': deltas, 'scales': scales}
+
+
+# decodes a sequence from encode_frame_sequence with one cumulative sum over fixed length keyframe segments
+def decode_frame_sequence(keyframes, deltas, scales, keyframe_every=DEFAULT_KEYFRAME_EVERY):
+    num_frames = scales.shape[0]
+    is_keyframe = np.arange(num_frames) % keyframe_every == 0
+    num_segments = -(-num_frames // keyframe_every)
+
+    increments = np.zeros((num_segments * keyframe_every,) + keyframes.shape[1:])
+    increments[:num_frames][is_keyframe] = keyframes
+    increments[:num_frames][~is_keyframe] = deltas.astype(np.float64) * scales[~is_keyframe, None, None]
+
+    segments = increments.reshape((num_segments, keyframe_every) + keyframes.shape[1:])
+    frames = np.cumsum(segments, axis=1).reshape(increments.shape)[:num_frames]
+    return frames.astype(np.float32)
+
+
+# returns the records with their intermediate states moved from 'image' into an encoded 'image_encoded' group,
+# initial and final states stay float32 in 'image', the given records are not changed
+def encode_record_frames(sim_results_list, keyframe_every=DEFAULT_KEYFRAME_EVERY):
+    encoded_results = []
+    for sim_results in sim_results_list:
+        images = dict(sim_results['image'])
+        encoded = {'keyframe_every': keyframe_every}
+        for prefix in ['u', 'v']:
+            pattern = re.compile(fr"{prefix}_state_(\d+)$")
+            steps = sorted(int(m.group(1)) for m in map(pattern.match, images) if m)
+            if not steps:
+                continue
+            frames = np.stack([images.pop(f"{prefix}_state_{step}") for step in steps])
+            sequence = encode_frame_sequence(frames, keyframe_every)
+            encoded[f"{prefix}_steps"] = np.array(steps, dtype=np.int64)
+            encoded.update({f"{prefix}_{name}": value for name, value in sequence.items()})
+        encoded_results.append({**sim_results, 'image': images, ENCODED_IMAGE_GROUP: encoded})
+    return encoded_results
+
+
+# decodes an 'image_encoded' group or dictionary into {'<prefix>_state_<step>': frame}
+def decode_record_frames(encoded):
+    keyframe_every = int(encoded.attrs['keyframe_every'] if isinstance(encoded, h5py.Group) else encoded['keyframe_every'])
+    decoded = {}
+    for prefix in ['u', 'v']:
+        if f"{prefix}_steps" not in encoded:
+            continue
+        steps = encoded[f"{prefix}_steps"][()]
+        frames = decode_frame_sequence(encoded[f"{prefix}_keyframes"][()], encoded[f"{prefix}_deltas"][()],
+                                        encoded[f"{prefix}_scales"][()], keyframe_every)
+        decoded.update({f"{prefix}_state_{int(step)}": frame for step, frame in zip(steps, frames)})
+    return decoded
+
+
+# returns the images of an open record group, decoded intermediate states are merged in for encoded records
+# and other images stay lazy h5py datasets
+def open_record_images(record_group, image_group="image"):
+    if image_group != "image" or ENCODED_IMAGE_GROUP not in record_group:
+        return record_group[image_group]
+    return {**{key: record_group["image"][key] for key in record_group["image"]},
+            **decode_record_frames(record_group[ENCODED_IMAGE_GROUP])}
+
+
+# reads one image of an open record group, encoded records are only decoded if the key is not stored as float32
+def read_record_image(record_group, image_key, image_group="image"):
+    if image_key in record_group[image_group]:
+        return record_group[image_group][image_key][()]
+    return open_record_images(record_group, image_group)[image_key]
+
+
+NORMALIZED_IMAGE_GROUP = "image_normalized"
+NORMALIZATION_MODES = ["minmax", "standard"]
+
+
+# writes a normalized float32 copy of every image of every record with the global statistics of its key
+#   minmax:   (x - min) / (max - min), scaled to [0, 1]
+#   standard: (x - mean) / std
+def write_normalized_images(file_path, global_stats, mode="minmax"):
+    if mode not in NORMALIZATION_MODES:
+        raise ValueError(f"Unknown normalization '{mode}', choose from: {NORMALIZATION_MODES}")
+
+    image_stats = global_stats.get('image', {})
+    try:
+        with h5py.File(file_path, 'a') as f:
+            for key in list_record_keys(f):
+                record_group = f[key]
+                if NORMALIZED_IMAGE_GROUP in record_group:
+                    del record_group[NORMALIZED_IMAGE_GROUP]
+                normalized_group = record_group.create_group(NORMALIZED_IMAGE_GROUP)
+                normalized_group.attrs['normalization'] = mode
+
+                for image_key, dataset in open_record_images(record_group).items():
+                    stats = image_stats[image_key]
+                    if mode == "minmax":
+                        offset, scale = stats['min'], stats['max'] - stats['min']
+                    else:
+                        offset, scale = stats['mean'], stats['std']
+                    scale = scale if scale > 0 else 1.0
+                    normalized = (dataset[()] - np.float32(offset)) * np.float32(1.0 / scale)
+                    normalized_group.create_dataset(image_key, data=normalized.astype(np.float32, copy=False))
+            logger.debug("Wrote %s normalized images to %s", mode, file_path, stacklevel=2)
+    except (OSError, IOError, TypeError, KeyError) as e:
+        logger.error(f"Cannot write normalized images to HDF5 file {file_path}: {e}", stacklevel=2)
+
+
 # copies attributes from a HDF5 file
 def _copy_attributes(src, dst):
     for attr_key, attr_value in src.attrs.items():
         dst.attrs[attr_key] = attr_value
-        logger.debug(f"Copied attribute for {src.name}: {attr_key} => {attr_value}")
+        logger.debug("Copied attribute for %s: %s => %s", src.name, attr_key, attr_value)
 
 
 # copies datasets from a HDF5 file
@@ -363,6 +933,10 @@ def _copy_dataset(src_dataset, dst_group, dataset_name):
     if isinstance(data, str):
         dtype = h5py.string_dtype(encoding="utf-8")
         dst_dataset = dst_group.create_dataset(dataset_name, data=data, dtype=dtype)
+    elif src_dataset.chunks is not None:
+        # keep the chunk layout and filters of compressed datasets
+        dst_dataset = dst_group.create_dataset(dataset_name, data=data, chunks=src_dataset.chunks, compression=src_dataset.compression,
+                                                compression_opts=src_dataset.compression_opts, shuffle=src_dataset.shuffle)
     else:
         dst_dataset = dst_group.create_dataset(dataset_name, data=data)
     _copy_attributes(src_dataset, dst_dataset)
@@ -383,26 +957,50 @@ def _copy_group(src_group, dst_group, group_name_prefix=""):
             logger.warning(f"Unexpected item type: {type(item)} for key '{key}'", stacklevel=2)
 
 
+# copies records of an open HDF5 file to the end of an open destination file, returns the new group names
+def _copy_records(src_file, record_names, dst_file, record_index):
+    combined_groups = []
+    for record_name in record_names:
+        logger.debug("Combining record: %s", record_name)
+
+        unique_record_name = record_key(record_index + len(combined_groups))
+        dst_group = dst_file.create_group(unique_record_name)
+
+        _copy_attributes(src_file[record_name], dst_group)
+        _copy_group(src_file[record_name], dst_group)
+        combined_groups.append(unique_record_name)
+    update_record_index(dst_file, combined_groups)
+    return combined_groups
+
+
 # combines HDF5 files into a single file, meant for parallel IO
 def combine_hdf5_files(input_file_paths, output_file_path, chunk_size=None):
     chunk = chunk_size or 1
     try:   
         with h5py.File(output_file_path, 'a') as dst_file:
-            record_index = len(dst_file.keys())
+            record_index = len(list_record_keys(dst_file))
             
             for file_path in input_file_paths:
                 with h5py.File(file_path, 'r') as src_file:
-                    for record_name in src_file.keys():
-                        logger.debug(f"Combining record: {record_name}")
-
-                        unique_record_name = f"record_{record_index}"
-                        dst_group = dst_file.create_group(unique_record_name)
-
-                        _copy_attributes(src_file[record_name], dst_group)
-                        _copy_group(src_file[record_name], dst_group)
-
-                        record_index += 1
+                    record_index += len(_copy_records(src_file, list_record_keys(src_file), dst_file, record_index))
                 remove_if_exists(file_path)
                 
     except (OSError, IOError, TypeError) as e:
         logger.error(f"Cannot read HDF5 files and combine to one HDF5 file due to: {e}", stacklevel=2)
+
+
+# appends the given records of HDF5 files to a single file in the given order, the input files are kept
+#   record_sources: (file path, record numbers) pairs, e.g. the seed chunks each worker appended to its own file
+def combine_hdf5_records(record_sources, output_file_path):
+    try:
+        with h5py.File(output_file_path, 'a') as dst_file, ExitStack() as src_files:
+            record_index = len(list_record_keys(dst_file))
+            open_files = {}
+            for file_path, record_numbers in record_sources:
+                if file_path not in open_files:
+                    open_files[file_path] = src_files.enter_context(h5py.File(file_path, 'r'))
+                record_names = [record_key(r) for r in record_numbers]
+                record_index += len(_copy_records(open_files[file_path], record_names, dst_file, record_index))
+
+    except (OSError, IOError, TypeError, KeyError) as e:
+        logger.error(f"Cannot combine records of HDF5 files into {output_file_path} due to: {e}", stacklevel=2)
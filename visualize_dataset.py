@@ -1,13 +1,27 @@
-from setup_logger import setup_logger, set_logger_level
+from setup_logger import (setup_logger, set_logger_level, get_logger_level, start_log_listener,
+                          stop_log_listener, attach_log_queue, logging)
 logger = setup_logger(__file__, log_stdout=True, log_stderr=True)
 from utilities import (DATATYPE_NAME, DEFAULT_DATAFILE_EXT, 
                         Any, Dict, List, Optional, Tuple, 
-                        os_path, np, re, plt, animate, 
-                        read_from_hdf5, read_from_json, create_folder, create_file_path)
+                        os_path, np, re, import_matplotlib, 
+                        read_from_json, create_folder, create_file_path,
+                        read_record_index, query_record_index, get_statistics_file_path,
+                        record_key, image_group_name, open_record_images, read_record_image, decode_record_frames,
+                        ENCODED_IMAGE_GROUP, h5py, Process, Queue)
 from arguments import process_args
 
+from PIL import Image, ImageDraw, ImageFont
+
+plt, animate = import_matplotlib()
+
 DEFAULT_FPS = 20
 DEFAULT_DELAY = 3
+GIF_RENDERERS = ["fast", "matplotlib"]
+
+# palette layout of the fast renderer: colormap colors first, then background and text
+LUT_COLORS = 254
+BACKGROUND_INDEX = 254
+TEXT_INDEX = 255
 
 def extract_record_frames(record, prefix:str) -> Tuple[np.ndarray, List[int]]:
     """
@@ -24,6 +38,9 @@ def extract_record_frames(record, prefix:str) -> Tuple[np.ndarray, List[int]]:
 
     image_dict = record.get("image", {})
     meta_dict = record.get("meta", {})
+    # delta encoded intermediate states are decoded in one pass
+    if ENCODED_IMAGE_GROUP in record:
+        image_dict = {**image_dict, **decode_record_frames(record[ENCODED_IMAGE_GROUP])}
 
     pattern = re.compile(fr"{prefix}_state_(\d+)$")
     initial_image_key = f"{prefix}_state_initial"
@@ -160,13 +177,290 @@ def save_record_frames(
     plt.close(fig)
 
 
+def create_colormap_lut(cmap: str, num_colors: int = LUT_COLORS) -> np.ndarray:
+    """
+    Sample a matplotlib colormap into a lookup table of uint8 RGB colors.
+
+    Returns:
+        A NumPy array of shape (num_colors, 3).
+    """
+    colors = plt.colormaps[cmap](np.linspace(0.0, 1.0, num_colors))[:, :3]
+    return np.round(colors * 255).astype(np.uint8)
+
+
+def colorize_frames(frames: np.ndarray, vmin: float = 0.0, vmax: float = 1.0, num_colors: int = LUT_COLORS) -> np.ndarray:
+    """
+    Map frames to colormap lookup table indices in one vectorized operation.
+
+    Returns:
+        A uint8 NumPy array with the same shape as `frames`.
+    """
+    scale = (num_colors - 1) / (vmax - vmin) if vmax > vmin else 0.0
+    indices = np.clip((frames - vmin) * scale, 0, num_colors - 1)
+    return np.round(indices).astype(np.uint8)
+
+
+def create_palette(cmap: str) -> List[int]:
+    """
+    Build the flat 256 color Pillow palette: colormap colors, then a white background and black text.
+    """
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    palette[:LUT_COLORS] = create_colormap_lut(cmap)
+    palette[BACKGROUND_INDEX] = 255
+    palette[TEXT_INDEX] = 0
+    return palette.ravel().tolist()
+
+
+def _plain_text(text: str) -> str:
+    # the default Pillow font has no math text and a limited character set
+    for old, new in (("$", ""), ("\\", ""), ("{", ""), ("}", ""), ("—", "-")):
+        text = text.replace(old, new)
+    return text
+
+
+def _load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # older Pillow versions only have the fixed size bitmap font
+        return ImageFont.load_default()
+
+
+def save_record_frames_fast(
+    frames: np.ndarray,
+    steps: list,
+    *,
+    file_path: str,
+    fps: int = DEFAULT_FPS,
+    delay: int = DEFAULT_DELAY,
+    cmap: str = "turbo",
+    title: str = "Grey-Scott Simulation",
+    vmin: float = 0.0,
+    vmax: float = 1.0,
+    min_size: int = 256,
+) -> None:
+    """
+    Create and save a GIF from a sequence of 2D frames without matplotlib figures.
+
+    Frames are mapped through a colormap lookup table into palette indices, upscaled
+    to at least `min_size` pixels and written with Pillow using one shared palette.
+    
+    Args:
+        frames:    np.ndarray of shape (N, H, W).
+        steps:     List of length num_frames; steps[i] is the “step index” for frames[i].
+        file_path:  Path or filename where the GIF will be written.
+        fps:       Playback frames per second (default: 20).
+        delay:     Seconds the last frame is held before the loop restarts (default: 3).
+        cmap:      Matplotlib colormap (default: "turbo").
+        title:     Main title for the GIF, math text markers are dropped (default: "Grey-Scott Simulation").
+        vmin:      Value mapped to the first color (default: 0.0).
+        vmax:      Value mapped to the last color (default: 1.0).
+        min_size:  Minimum frame side length in pixels (default: 256).
+
+    Raises:
+        ValueError: If `frames` is not 3D.
+    """
+    if frames.ndim != 3:
+        raise ValueError("frames must be a 3D array of shape (N, H, W)")
+
+    N, H, W = frames.shape
+    zoom = max(1, int(np.ceil(min_size / min(H, W))))
+
+    # all frames are colorized and upscaled at once
+    indices = colorize_frames(frames, vmin, vmax)
+    indices = indices.repeat(zoom, axis=1).repeat(zoom, axis=2)
+
+    title_font = _load_font(max(12, W * zoom // 24))
+    label_font = _load_font(max(10, W * zoom // 28))
+    band = int(title_font.size * 2.2) if hasattr(title_font, "size") else 24
+    margin = band // 2
+
+    palette = create_palette(cmap)
+
+    # the title is drawn once onto the shared background
+    canvas = np.full((H * zoom + 2 * band, W * zoom + 2 * margin), BACKGROUND_INDEX, dtype=np.uint8)
+    template = Image.fromarray(canvas, mode="P")
+    draw = ImageDraw.Draw(template)
+    draw.text((canvas.shape[1] // 2, band // 2), _plain_text(title), fill=TEXT_INDEX, font=title_font, anchor="mm")
+    canvas = np.asarray(template).copy()
+
+    images = []
+    for idx in range(N):
+        canvas[band:band + H * zoom, margin:margin + W * zoom] = indices[idx]
+        image = Image.fromarray(canvas, mode="P")
+        ImageDraw.Draw(image).text((canvas.shape[1] // 2, canvas.shape[0] - band // 2), f"t = {steps[idx]}",
+                                    fill=TEXT_INDEX, font=label_font, anchor="mm")
+        image.putpalette(palette)
+        images.append(image)
+
+    frame_ms = int(round(1000 / fps))
+    durations = [frame_ms] * N
+    durations[-1] += int(delay * 1000)
+    images[0].save(file_path, save_all=True, append_images=images[1:], duration=durations, loop=0, optimize=False)
+
+
+def compose_montage(
+    tiles: np.ndarray,
+    labels: Optional[List[str]] = None,
+    *,
+    cmap: str = "turbo",
+    vmin: float = 0.0,
+    vmax: float = 1.0,
+    columns: int = 16,
+    tile_size: int = 96,
+    gap: int = 2,
+) -> Image.Image:
+    """
+    Tile a stack of 2D states into one palette image without matplotlib axes.
+
+    Tiles are colorized through the colormap lookup table, upscaled and padded as one
+    array, then laid out row by row with a reshape and transpose.
+
+    Args:
+        tiles:      np.ndarray of shape (N, H, W).
+        labels:     Optional text drawn above each tile (default: None).
+        cmap:       Matplotlib colormap (default: "turbo").
+        vmin:       Value mapped to the first color (default: 0.0).
+        vmax:       Value mapped to the last color (default: 1.0).
+        columns:    Number of tiles per montage row (default: 16).
+        tile_size:  Minimum tile side length in pixels (default: 96).
+        gap:        Background pixels between tiles (default: 2).
+
+    Returns:
+        A Pillow image in "P" mode.
+
+    Raises:
+        ValueError: If `tiles` is not 3D.
+    """
+    if tiles.ndim != 3:
+        raise ValueError("tiles must be a 3D array of shape (N, H, W)")
+
+    N, H, W = tiles.shape
+    zoom = max(1, int(np.ceil(tile_size / min(H, W))))
+    columns = max(1, min(columns, N))
+    rows = -(-N // columns)
+
+    font = _load_font(max(8, W * zoom // 10)) if labels else None
+    band = (int(font.size * 1.4) if hasattr(font, "size") else 12) if labels else 0
+
+    indices = colorize_frames(tiles, vmin, vmax).repeat(zoom, axis=1).repeat(zoom, axis=2)
+    # empty cells of the last row and the label band use the background color
+    cells = np.full((rows * columns, band + H * zoom + gap, W * zoom + gap), BACKGROUND_INDEX, dtype=np.uint8)
+    cells[:N, band:band + H * zoom, :W * zoom] = indices
+    cell_h, cell_w = cells.shape[1:]
+    sheet = cells.reshape(rows, columns, cell_h, cell_w).transpose(0, 2, 1, 3).reshape(rows * cell_h, columns * cell_w)
+
+    image = Image.fromarray(np.ascontiguousarray(sheet), mode="P")
+    if labels:
+        draw = ImageDraw.Draw(image)
+        for idx, label in enumerate(labels[:N]):
+            row, col = divmod(idx, columns)
+            draw.text((col * cell_w + W * zoom // 2, row * cell_h + band // 2), _plain_text(label),
+                        fill=TEXT_INDEX, font=font, anchor="mm")
+    image.putpalette(create_palette(cmap))
+    return image
+
+
+def save_dataset_montages(
+    data_file: str,
+    tasks: List[Tuple[int, str, int]],
+    *,
+    output_folder: str,
+    image_key: str = "v_state_final",
+    statistics: Optional[dict] = None,
+    cmap: str = "turbo",
+    columns: int = 16,
+    tiles_per_sheet: int = 256,
+    tile_size: int = 96,
+    label: str = "pattern",
+    level: int = 1,
+    resolution: Optional[int] = None,
+) -> List[str]:
+    """
+    Stream one image of many records into contact sheets, one chunk of records per sheet.
+
+    Args:
+        data_file:        Path to the HDF5 dataset.
+        tasks:            List of (record number, pattern, seed) from the record index.
+        output_folder:    Directory where the sheets are written.
+        image_key:        Image of each record to tile (default: "v_state_final").
+        statistics:       Global statistics, the color limits of `image_key` are used if present (default: None).
+        cmap:             Matplotlib colormap (default: "turbo").
+        columns:          Number of tiles per montage row (default: 16).
+        tiles_per_sheet:  Number of records read and tiled per sheet (default: 256).
+        tile_size:        Minimum tile side length in pixels (default: 96).
+        label:            Annotate tiles with their "pattern", "seed", or "none" (default: "pattern").
+        level:            Thumbnail level to read, 1 reads the full resolution images (default: 1).
+        resolution:       Coarsened output resolution to read instead of a level (default: None).
+
+    Returns:
+        The paths of the written sheets.
+    """
+    stats = (statistics or {}).get('image', {}).get(image_key, {})
+    vmin, vmax = stats.get('min', 0.0), stats.get('max', 1.0)
+
+    image_group = image_group_name(level, resolution)
+    sheet_paths = []
+    with h5py.File(data_file, 'r') as f:
+        for sheet_num, start in enumerate(range(0, len(tasks), tiles_per_sheet)):
+            chunk = tasks[start:start + tiles_per_sheet]
+            # only the tiled image of each record in this chunk is read, intermediate states of encoded records are decoded
+            tiles = np.stack([read_record_image(f[record_key(record_number)], image_key, image_group) for record_number, _, _ in chunk])
+
+            if label == "pattern":
+                labels = [pattern for _, pattern, _ in chunk]
+            elif label == "seed":
+                labels = [f"#{seed}" for _, _, seed in chunk]
+            else:
+                labels = None
+
+            image = compose_montage(tiles, labels, cmap=cmap, vmin=vmin, vmax=vmax, columns=columns, tile_size=tile_size)
+            sheet_path = os_path.join(output_folder, f"{DATATYPE_NAME}_montage_{image_key}_{sheet_num:03d}.png")
+            image.save(sheet_path)
+            sheet_paths.append(sheet_path)
+            logger.info(f"Saved montage of {len(chunk)} records → {sheet_path}")
+
+    return sheet_paths
+
+
+# figures kept per process and reused across records, keyed by colormap
+_FIGURE_CACHE: Dict[str, Dict[str, Any]] = {}
+
+COMPARE_FIELDS = ["u_state_initial", "u_state_final", "v_state_initial", "v_state_final"]
+
+
+def _create_compare_figure(cmap: str, shape: Tuple[int, int]) -> Dict[str, Any]:
+    fig, axes = plt.subplots(2, 2, figsize=(8, 8))
+    flat_axes = axes.flatten()
+
+    images = []
+    for ax in flat_axes:
+        im = ax.imshow(np.zeros(shape), vmin=0.0, vmax=1.0, cmap=cmap)
+        plt.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
+
+        ax.grid(False)
+        ax.set_xticks([])
+        ax.set_yticks([])
+        images.append(im)
+
+    return {'fig': fig, 'axes': flat_axes, 'images': images}
+
+
+def close_cached_figures() -> None:
+    """Close the comparison figures kept open by save_record_images(reuse_figure=True)."""
+    for figure in _FIGURE_CACHE.values():
+        plt.close(figure['fig'])
+    _FIGURE_CACHE.clear()
+
+
 def save_record_images(
     record: dict,
     *,
     file_path: str,
     cmap:str = "seismic",
     title:str = "Grey-Scott Simulation",
-    statistics:Optional[dict]=None
+    statistics:Optional[dict]=None,
+    reuse_figure:bool = False
 ) -> None:
     """
     Create and save a GIF from a sequence of 2D frames.
@@ -177,41 +471,93 @@ def save_record_images(
         cmap:       Matplotlib colormap (default: "seismic").
         title:      Main title for the GIF (default: "Grey-Scott Simulation").
         statistics: Global statistics for each frame (default: None).
+        reuse_figure: Keep the figure open and only update its data on the next call (default: False).
     """
-
-    fig, axes = plt.subplots(2, 2, figsize=(8, 8))
-    flat_axes = axes.flatten()
     image_dict = record['image']
     total_iterations = record['meta']["total_iterations"]
     stats_dict = statistics.get('image', {}) if statistics else {}
-    
 
-    fields = [
-        ("u_state_initial", r"$U_0$: Initial State"),
-        ("u_state_final", fr"$U_{{{total_iterations}}}$: Final State"),
-        ("v_state_initial", r"$V_0$: Initial State"),
-        ("v_state_final", fr"$V_{{{total_iterations}}}$: Final State"),
+    arrays = [image_dict[img_key][()] for img_key in COMPARE_FIELDS]
+    figure = _FIGURE_CACHE.get(cmap) if reuse_figure else None
+    if figure is None:
+        figure = _create_compare_figure(cmap, arrays[0].shape)
+        if reuse_figure:
+            _FIGURE_CACHE[cmap] = figure
+
+    labels = [
+        r"$U_0$: Initial State",
+        fr"$U_{{{total_iterations}}}$: Final State",
+        r"$V_0$: Initial State",
+        fr"$V_{{{total_iterations}}}$: Final State",
     ]
 
-    for idx, (img_key, img_label) in enumerate(fields):
-        arr = image_dict[img_key]
+    for img_key, img_label, arr, ax, im in zip(COMPARE_FIELDS, labels, arrays, figure['axes'], figure['images']):
         stats = stats_dict.get(img_key, {})
-        ax = flat_axes[idx]
-
-        im = ax.imshow(arr , vmin=stats.get('min', 0.0), vmax=stats.get('max', 1.0), cmap=cmap)
+        im.set_data(arr)
+        im.set_extent((-0.5, arr.shape[1] - 0.5, arr.shape[0] - 0.5, -0.5))
+        im.set_clim(stats.get('min', 0.0), stats.get('max', 1.0))
         ax.set_title(img_label, fontsize=12, pad=10)
-        plt.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
-
-        ax.grid(False)
-        ax.set_xticks([])
-        ax.set_yticks([])
 
+    fig = figure['fig']
     fig.suptitle(fr"Concentration $U_t$ vs $V_t$: {title}", fontsize=14)
-    plt.tight_layout()
+    fig.tight_layout()
     fig.savefig(file_path)
-    plt.close(fig)
+    if not reuse_figure:
+        plt.close(fig)
 
 
+def visualize_records(data_file: str, tasks, *, output_folder: str, statistics: Optional[dict], options: Dict[str, Any]) -> None:
+    """
+    Render the comparison image and both gifs of each record, reading only the keys they need.
+
+    Args:
+        data_file:      Path to the HDF5 dataset.
+        tasks:          Iterable of (record number, pattern, seed).
+        output_folder:  Directory where visualizations are written.
+        statistics:     Global statistics for each frame.
+        options:        gif_fps, gif_delay, gif_cmap, image_cmap, gif_renderer, the thumbnail level and output resolution.
+    """
+    save_frames = save_record_frames_fast if options['gif_renderer'] == 'fast' else save_record_frames
+
+    try:
+        with h5py.File(data_file, 'r') as f:
+            for record_number, pattern, seed in tasks:
+                group = f[record_key(record_number)]
+                # image datasets stay on disk until a frame is read
+                record = {'image': open_record_images(group, image_group_name(options.get('level'), options.get('resolution'))),
+                            'meta': dict(group['meta'].attrs)}
+
+                title = f"{pattern.title().replace('_',' ')} — Seed #{seed}"
+                file_prefix = f"{DATATYPE_NAME}_{pattern}_{seed}"
+
+                image_path = os_path.join(output_folder,  f"{file_prefix}_compare.png")
+                save_record_images(record, statistics=statistics, title=rf"Substrate $U_t$ vs Activator $V_t$: {title}", 
+                                    cmap=options['image_cmap'], file_path=image_path, reuse_figure=True)
+                logger.info(f"Saved test images → {image_path}")
+
+                for prefix, label in zip(['u', 'v'], ['substrate', 'activator']):
+                    frames, steps = extract_record_frames(record, prefix=prefix)
+                    gif_path = os_path.join(output_folder,  f"{file_prefix}_{label}_{prefix}.gif")
+                    gif_title = rf"{label.title()} ${prefix.upper()}_t$: {title}"
+                    save_frames(frames, 
+                                    steps, 
+                                    fps=options['gif_fps'], 
+                                    delay=options['gif_delay'], 
+                                    title=gif_title, 
+                                    cmap=options['gif_cmap'], 
+                                    file_path=gif_path)
+                    logger.info(f"Saved test {label} {prefix} gif → {gif_path}")
+    finally:
+        # the figures are only reused within one call
+        close_cached_figures()
+
+
+# persistent worker that renders records from the shared queue until it gets a stop sentinel
+def process_visualize_queue(task_queue, data_file, output_folder, statistics, options, log_queue=None, log_level=logging.INFO):
+    if log_queue is not None:
+        attach_log_queue(log_queue, log_level)
+    visualize_records(data_file, iter(task_queue.get, None), output_folder=output_folder, statistics=statistics, options=options)
+
 
 def visualize_samples(args):
     if args.debug_on:
@@ -221,51 +567,94 @@ def visualize_samples(args):
 
     data_file = getattr(args, 'data_file') 
     output_folder = getattr(args, 'output_folder') 
-    
+    req_cores = getattr(args, 'num_tasks', 1)
 
     random_seed = getattr(args, 'random_seed') 
     num_samples = getattr(args, 'num_samples') 
-
-    fps = getattr(args, 'gif_fps')
-    delay = getattr(args, 'gif_delay')
-    gif_cmap = getattr(args, 'gif_cmap')
-    image_cmap = getattr(args, 'image_cmap')
+    patterns = getattr(args, 'patterns', None)
+    seed_range = getattr(args, 'seed_range', None)
+
+    options = {
+        'gif_fps': getattr(args, 'gif_fps'),
+        'gif_delay': getattr(args, 'gif_delay'),
+        'gif_cmap': getattr(args, 'gif_cmap'),
+        'image_cmap': getattr(args, 'image_cmap'),
+        'gif_renderer': getattr(args, 'gif_renderer', 'fast'),
+        'level': getattr(args, 'level', 1),
+        'resolution': getattr(args, 'resolution', None)
+    }
+
+    montage = getattr(args, 'montage', False)
+    montage_kwargs = {
+        'image_key': getattr(args, 'montage_key', 'v_state_final'),
+        'columns': getattr(args, 'montage_columns', 16),
+        'tiles_per_sheet': getattr(args, 'montage_tiles', 256),
+        'tile_size': getattr(args, 'montage_tile_size', 96),
+        'label': getattr(args, 'montage_label', 'pattern'),
+        'level': getattr(args, 'level', 1),
+        'resolution': getattr(args, 'resolution', None)
+    }
 
     output_folder = create_folder(output_folder)
 
-    data_filename = os_path.basename(data_file)
-    json_filename = f"global_statistics_{DEFAULT_DATAFILE_EXT}_{data_filename.replace(DEFAULT_DATAFILE_EXT, 'json')}"
-    json_file = data_file.replace(data_filename, json_filename)
-
-    global_statistics = read_from_json(json_file)
-    sample_records = read_from_hdf5(data_file, sample_size=num_samples, flatten=False, random_seed=random_seed)
-
-    for record in sample_records:
-
-        meta_dict = record['meta']
-
-        pattern = meta_dict['pattern_name']
-        seed = meta_dict['random_seed']
-
-        title = f"{pattern.title().replace('_',' ')} — Seed #{seed}"
-        file_prefix = f"{DATATYPE_NAME}_{pattern}_{seed}"
+    json_file = get_statistics_file_path(data_file)
+    if os_path.exists(json_file):
+        global_statistics = read_from_json(json_file)
+    else:
+        global_statistics = None
+        logger.warning(f"No global statistics at {json_file}, color limits default to [0, 1]. "
+                        f"Run compute_statistics.py --data-file {data_file} to create them")
+
+    # select from the record index so only the sampled records are read
+    record_index = read_record_index(data_file)
+    records = query_record_index(record_index, patterns=patterns, seed_range=seed_range)
+    if len(records) == 0:
+        logger.warning(f"No records in {data_file} match patterns={patterns} and seed_range={seed_range}")
+        return
+    if num_samples < len(records) and not montage:
+        rng = np.random.default_rng(random_seed)
+        records = np.sort(rng.choice(records, num_samples, replace=False))
+
+    # titles come from the index, the records themselves are only read by the renderers
+    index_rows = {int(row['record']): row for row in record_index}
+    tasks = [(int(r), index_rows[int(r)]['pattern_name'].decode('utf-8'), int(index_rows[int(r)]['random_seed'])) for r in records]
+
+    # contact sheets cover every selected record instead of a sample
+    if montage:
+        save_dataset_montages(data_file, tasks, output_folder=output_folder, statistics=global_statistics, cmap=options['gif_cmap'], **montage_kwargs)
+        return
+
+    num_workers = min(req_cores, len(tasks))
+    if num_workers == 1:
+        visualize_records(data_file, tasks, output_folder=output_folder, statistics=global_statistics, options=options)
+        return
+
+    task_queue = Queue()
+    for task in tasks:
+        task_queue.put(task)
+    for _ in range(num_workers):
+        task_queue.put(None)
+
+    # children send their records to one listener in the parent
+    log_queue = start_log_listener()
+    try:
+        procs_list = []
+        for i in range(num_workers):
+            p_args = [task_queue, data_file, output_folder, global_statistics, options, log_queue, get_logger_level()]
+            p = Process(target=process_visualize_queue, name=f"esp_visualize_p{i}", args=p_args)
+            procs_list.append(p)
+            p.start()
+            logger.info(f"PID[{p.pid}]: child started rendering records from the sample queue")
 
-        image_path = os_path.join(output_folder,  f"{file_prefix}_compare.png")
-        save_record_images(record, statistics=global_statistics, title=rf"Substrate $U_t$ vs Activator $V_t$: {title}", cmap=image_cmap, file_path=image_path)
-        logger.info(f"Saved test images → {image_path}")
+        for p in procs_list:
+            p.join()
+            logger.info(f"PID[{p.pid}]: child joined parent")
+    finally:
+        stop_log_listener()
 
-        for prefix, label in zip(['u', 'v'], ['substrate', 'activator']):
-            frames, steps = extract_record_frames(record, prefix=prefix)
-            gif_path = os_path.join(output_folder,  f"{file_prefix}_{label}_{prefix}.gif")
-            gif_title = rf"{label.title()} ${prefix.upper()}_t$: {title}"
-            save_record_frames(frames, 
-                            steps, 
-                            fps=fps, 
-                            delay=delay, 
-                            title=gif_title, 
-                            cmap=gif_cmap, 
-                            file_path=gif_path)
-            logger.info(f"Saved test {label} {prefix} gif → {gif_path}")
+    failed_procs = [p.pid for p in procs_list if p.exitcode != 0]
+    if failed_procs:
+        raise RuntimeError(f"{len(failed_procs)} visualization task(s) failed: {failed_procs}")
 
 
 if __name__ == "__main__":
@@ -273,4 +662,4 @@ if __name__ == "__main__":
         args = process_args(__file__)
         visualize_samples(args)
     except Exception as e:
-        logger.error(e)
\ No newline at end of file
+        logger.error(e)